@@ -0,0 +1,298 @@
+import contextlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import gen_world_ca
+from difficulty_quant import DifficultyMetrics
+
+# pipeline stages timed for every world, in order
+stages = ['build', 'plan', 'measure', 'save']
+
+# generates one world and returns the seconds spent in each stage it reached
+# args: (params, seed, data_dir); defined at module level so that pool workers can run it
+def time_world(args):
+  params, seed, data_dir = args
+  times = {}
+  world = gen_world_ca.World(seed, params['smooth_iter'], params['fill_pct'], params['rows'], params['cols'],
+                             robot_radius=params['robot_radius'], disp_radius=params['disp_radius'])
+
+  start = time.time()
+  connected = world.build()
+  times['build'] = time.time() - start
+  if not connected:
+    return times
+
+  start = time.time()
+  world.choose_points()
+  found = world.plan()
+  times['plan'] = time.time() - start
+  if not found:
+    return times
+
+  start = time.time()
+  world.measure()
+  times['measure'] = time.time() - start
+
+  start = time.time()
+  world.save(seed, data_dir)
+  times['save'] = time.time() - start
+  return times
+
+# generates num_worlds worlds with seeds first_seed, first_seed + 1, ... and times every stage
+# worlds are saved to a temporary folder that is removed afterwards
+# returns a dict with the number of worlds reaching each stage, the mean seconds per stage, and the
+# overall throughput
+def run_benchmark(rows=30, cols=30, fill_pct=0.2, smooth_iter=3, robot_radius=gen_world_ca.jackal_radius,
+                  disp_radius=3, num_worlds=20, first_seed=1, workers=1):
+  params = {'rows': rows, 'cols': cols, 'fill_pct': fill_pct, 'smooth_iter': smooth_iter,
+            'robot_radius': robot_radius, 'disp_radius': disp_radius}
+  data_dir = tempfile.mkdtemp() + '/'
+  gen_world_ca.make_dataset_dirs(data_dir)
+  tasks = [(params, seed, data_dir) for seed in range(first_seed, first_seed + num_worlds)]
+
+  start = time.time()
+  try:
+    if workers <= 1:
+      results = [time_world(task) for task in tasks]
+    else:
+      pool = multiprocessing.Pool(workers)
+      try:
+        results = pool.map(time_world, tasks)
+      finally:
+        pool.close()
+        pool.join()
+  finally:
+    shutil.rmtree(data_dir)
+  wall_time = time.time() - start
+
+  report = {'worlds': num_worlds, 'wall_time': wall_time, 'worlds_per_sec': num_worlds / wall_time}
+  for stage in stages:
+    times = [result[stage] for result in results if stage in result]
+    report[stage] = {'count': len(times), 'mean': sum(times) / len(times) if times else 0.0}
+
+  return report
+
+# stages of the memory profile, in order; overlays are the display copies made by gen_world_ca.main
+memory_stages = ['build', 'plan', 'measure', 'overlays', 'save']
+
+# allocations left out of the memory profile: the profiler's and tracemalloc's own, and the import
+# machinery's
+_ignored_traces = [
+  tracemalloc.Filter(False, __file__),
+  tracemalloc.Filter(False, tracemalloc.__file__),
+  tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+  tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+  tracemalloc.Filter(False, '<unknown>'),
+]
+
+# class to measure the memory of each stage of the pipeline with tracemalloc
+# tracing starts when the profiler is entered (unless it is already on) and stops when it exits
+# for every stage run, the peak is the most memory traced above what was traced when the stage
+# started, and the net is what is still traced when it ends; the allocation sites are the source
+# lines (or call stacks, with frames > 1) that grew the most over the stage, summed over every run
+# memory that a stage frees before it ends counts toward its peak but not toward its sites, so use
+# smaller stages to find where a peak comes from
+class StageProfiler:
+  # top: allocation sites kept per stage in the report
+  # frames: frames of call stack recorded per allocation
+  def __init__(self, top=10, frames=1):
+    self.top = top
+    self.frames = frames
+    self.stages = {}
+    self.order = []
+    self.started = False
+
+  def __enter__(self):
+    if not tracemalloc.is_tracing():
+      tracemalloc.start(self.frames)
+      self.started = True
+    return self
+
+  def __exit__(self, *exc):
+    if self.started:
+      tracemalloc.stop()
+      self.started = False
+
+  def _snapshot(self):
+    return tracemalloc.take_snapshot().filter_traces(_ignored_traces)
+
+  # context manager that profiles the code it wraps as one run of stage name
+  @contextlib.contextmanager
+  def stage(self, name):
+    before = self._snapshot()
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    try:
+      yield
+    finally:
+      current, peak = tracemalloc.get_traced_memory()
+      diffs = self._snapshot().compare_to(before, 'lineno' if self.frames <= 1 else 'traceback')
+      self._record(name, peak - base, current - base, diffs)
+
+  def _record(self, name, peak, net, diffs):
+    if name not in self.stages:
+      self.stages[name] = {'runs': 0, 'peaks': [], 'nets': [], 'sites': {}}
+      self.order.append(name)
+    stage = self.stages[name]
+    stage['runs'] += 1
+    stage['peaks'].append(peak)
+    stage['nets'].append(net)
+    for diff in diffs:
+      if diff.size_diff <= 0:
+        continue
+      site = _site_name(diff.traceback)
+      size, count = stage['sites'].get(site, (0, 0))
+      stage['sites'][site] = (size + diff.size_diff, count + diff.count_diff)
+
+  # returns a list with a dict per stage, in the order they first ran: runs, max and mean peak bytes,
+  # mean net bytes, and the top sites as (site, mean bytes, mean blocks) per run, largest first
+  def report(self):
+    report = []
+    for name in self.order:
+      stage = self.stages[name]
+      runs = stage['runs']
+      sites = sorted(stage['sites'].items(), key=lambda item: -item[1][0])[:self.top]
+      report.append({
+        'stage': name,
+        'runs': runs,
+        'max_peak': max(stage['peaks']),
+        'mean_peak': sum(stage['peaks']) / runs,
+        'mean_net': sum(stage['nets']) / runs,
+        'sites': [(site, size / runs, count / runs) for site, (size, count) in sites],
+      })
+    return report
+
+# returns file:line of every frame of an allocation's traceback, most recent call first
+def _site_name(traceback):
+  return ' < '.join('%s:%d' % (os.path.basename(frame.filename), frame.lineno) for frame in traceback)
+
+# generates one world under a StageProfiler, one profiled stage at a time (see memory_stages)
+def profile_world(params, seed, data_dir, profiler):
+  world = gen_world_ca.World(seed, params['smooth_iter'], params['fill_pct'], params['rows'], params['cols'],
+                             robot_radius=params['robot_radius'], disp_radius=params['disp_radius'])
+  with profiler.stage('build'):
+    connected = world.build()
+  if not connected:
+    return False
+
+  with profiler.stage('plan'):
+    world.choose_points()
+    found = world.plan()
+  if not found:
+    return False
+
+  with profiler.stage('measure'):
+    world.measure()
+  with profiler.stage('overlays'):
+    overlays = gen_world_ca.path_overlays(world.obstacle_map, world.jackal_map, world.path)
+  del overlays
+  with profiler.stage('save'):
+    world.save(seed, data_dir)
+  return True
+
+# generates num_worlds worlds with tracemalloc on and profiles the memory of every stage
+# worlds run one after the other in this process, since tracing is per process, and are saved to a
+# temporary folder that is removed afterwards
+# returns the StageProfiler report (see StageProfiler.report) and the overall traced peak in bytes
+def run_memory_profile(rows=30, cols=30, fill_pct=0.2, smooth_iter=3, robot_radius=gen_world_ca.jackal_radius,
+                       disp_radius=3, num_worlds=5, first_seed=1, top=10, frames=1):
+  params = {'rows': rows, 'cols': cols, 'fill_pct': fill_pct, 'smooth_iter': smooth_iter,
+            'robot_radius': robot_radius, 'disp_radius': disp_radius}
+  data_dir = tempfile.mkdtemp() + '/'
+  gen_world_ca.make_dataset_dirs(data_dir)
+  try:
+    with StageProfiler(top, frames) as profiler:
+      for seed in range(first_seed, first_seed + num_worlds):
+        profile_world(params, seed, data_dir, profiler)
+  finally:
+    shutil.rmtree(data_dir)
+
+  return profiler.report(), max([max(stage['peaks']) for stage in profiler.stages.values()] or [0])
+
+# prints a report from run_memory_profile
+def print_memory_report(report, peak):
+  print('largest stage peak %.2f MB' % (peak / 1e6))
+  for stage in report:
+    print('%-8s %4d runs  peak %9.1f KB (max %9.1f KB)  net %9.1f KB' % (
+      stage['stage'], stage['runs'], stage['mean_peak'] / 1e3, stage['max_peak'] / 1e3, stage['mean_net'] / 1e3))
+    for site, size, count in stage['sites']:
+      print('    %9.1f KB %8.0f blocks  %s' % (size / 1e3, count, site))
+
+# search modes compared by compare_search, as (mode, weight)
+search_configs = [('reference', 1.0), ('astar', 1.0), ('bidirectional', 1.0), ('weighted', 1.5), ('weighted', 3.0),
+                  ('hierarchical', 1.0)]
+
+# plans the path of one world with every search config and returns the stats of each
+# args: (params, seed, configs); defined at module level so that pool workers can run it
+def search_world(args):
+  params, seed, configs = args
+  world = gen_world_ca.World(seed, params['smooth_iter'], params['fill_pct'], params['rows'], params['cols'],
+                             robot_radius=params['robot_radius'], disp_radius=params['disp_radius'])
+  if not world.build():
+    return None
+
+  world.choose_points()
+  world.dist_map = DifficultyMetrics(world.jackal_map, [], world.disp_radius).closest_wall()
+  results = []
+  for mode, weight in configs:
+    path = world.jmap_gen.get_path([world.start, world.goal], world.dist_map, mode, weight)
+    results.append(world.jmap_gen.search_stats.as_dict() if path else None)
+  return results
+
+# plans the paths of num_worlds worlds with every search config in configs (see search_configs)
+# returns a list with a dict per config: worlds planned, mean nodes expanded, mean milliseconds, mean
+# and worst cost relative to the optimal cost, and mean guaranteed bound
+def compare_search(rows=30, cols=30, fill_pct=0.2, smooth_iter=3, robot_radius=gen_world_ca.jackal_radius,
+                   disp_radius=3, num_worlds=20, first_seed=1, workers=1, configs=search_configs):
+  params = {'rows': rows, 'cols': cols, 'fill_pct': fill_pct, 'smooth_iter': smooth_iter,
+            'robot_radius': robot_radius, 'disp_radius': disp_radius}
+  configs = list(configs)
+  tasks = [(params, seed, configs + [('astar', 1.0)]) for seed in range(first_seed, first_seed + num_worlds)]
+  if workers <= 1:
+    results = [search_world(task) for task in tasks]
+  else:
+    pool = multiprocessing.Pool(workers)
+    try:
+      results = pool.map(search_world, tasks)
+    finally:
+      pool.close()
+      pool.join()
+
+  # only worlds every config found a path for are compared
+  results = [result for result in results if result is not None and None not in result]
+  report = []
+  for i, (mode, weight) in enumerate(configs):
+    stats = [result[i] for result in results]
+    ratios = [s['cost'] / result[-1]['cost'] if result[-1]['cost'] > 0 else 1.0 for s, result in zip(stats, results)]
+    bounds = [s['bound'] for s in stats if s['bound'] is not None]
+    report.append({
+      'mode': mode,
+      'weight': weight,
+      'worlds': len(stats),
+      'nodes_expanded': sum(s['nodes_expanded'] for s in stats) / max(len(stats), 1),
+      'ms': 1000 * sum(s['runtime'] for s in stats) / max(len(stats), 1),
+      'cost_ratio': sum(ratios) / max(len(ratios), 1),
+      'worst_ratio': max(ratios) if ratios else None,
+      'bound': sum(bounds) / len(bounds) if bounds else None,
+    })
+
+  return report
+
+# prints a report from compare_search
+def print_search_report(report):
+  print('%-14s %6s %6s %10s %9s %10s %8s %8s' % ('mode', 'weight', 'worlds', 'expanded', 'ms', 'cost/opt', 'worst', 'bound'))
+  for row in report:
+    bound = '%8.3f' % row['bound'] if row['bound'] is not None else '       -'
+    worst = '%8.3f' % row['worst_ratio'] if row['worst_ratio'] is not None else '       -'
+    print('%-14s %6.2f %6d %10.0f %9.2f %10.4f %s %s' % (row['mode'], row['weight'], row['worlds'], row['nodes_expanded'],
+                                                        row['ms'], row['cost_ratio'], worst, bound))
+
+# prints a benchmark report from run_benchmark
+def print_report(report):
+  print('%d worlds in %.2f s (%.1f worlds/s)' % (report['worlds'], report['wall_time'], report['worlds_per_sec']))
+  for stage in stages:
+    print('%-8s %4d worlds %9.2f ms' % (stage, report[stage]['count'], 1000 * report[stage]['mean']))
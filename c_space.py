@@ -1,23 +1,48 @@
-import numpy as np
-from gen_world_ca import JackalMap
+import multiprocessing
+
+import grid_ops
+from occupancy import load_grid, save_grid
 
 
 jackal_radius = 2 # Jackal takes up 2 cells in each direction in addition to center (5x5)
 num_files = 300
 
+# creates the C-space file of one occupancy grid
+# the grid is unpacked to a uint8 array and inflated with grid_ops.inflate, the same C-space as JackalMap
+# without a list-of-lists copy of the map
+# args: (obs_map_dir, cspace_dir, index, robot_radius, packed, cache); defined at module level so that
+# pool workers can run it
+def create_cspace_file(args):
+    obs_map_dir, cspace_dir, i, robot_radius, packed, cache = args
+    output_file = cspace_dir + 'cspace_%d.npy' % i
+    input_file = obs_map_dir + 'grid_%d.npy' % i
+
+    obs_map = load_grid(input_file)
+    if cache is not None:
+        cspace_grid = cache.cspace(obs_map, robot_radius)
+    else:
+        cspace_grid = grid_ops.inflate(obs_map.to_array(), robot_radius)
+
+    # save c-space
+    save_grid(output_file, cspace_grid, packed)
+
 # creates C-space files from given occupancy grids and robot radius
-def create_cspace_files(obs_map_dir, num_files, cspace_dir, robot_radius):
-    for i in range(num_files):
-        output_file = cspace_dir + 'cspace_%d.npy' % i
-        input_file = obs_map_dir + 'grid_%d.npy' % i
-
-        obs_map = np.load(input_file)
-        jm = JackalMap(obs_map, robot_radius)
-        cspace_grid = jm.get_map()
-
-        # save c-space
-        cspace_grid = np.asarray(cspace_grid)
-        np.save(output_file, cspace_grid)
+# grids may be saved as .npy or bit-packed .npz; packed chooses the format of the C-space files
+# workers > 1 spreads the grids over a pool of processes
+# cache: optional WorldCache, so grids inflated before (e.g. while generating the worlds) are reused
+def create_cspace_files(obs_map_dir, num_files, cspace_dir, robot_radius, packed=False, workers=1, cache=None):
+    tasks = [(obs_map_dir, cspace_dir, i, robot_radius, packed, cache) for i in range(num_files)]
+    if workers <= 1:
+        for task in tasks:
+            create_cspace_file(task)
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        pool.map(create_cspace_file, tasks)
+    finally:
+        pool.close()
+        pool.join()
 
 if __name__ == "__main__":
     create_cspace_files('test_data/grid_files/', num_files, 'test_data/cspace_files/', jackal_radius)
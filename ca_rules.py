@@ -0,0 +1,179 @@
+import re
+
+import numpy as np
+
+import grid_ops
+
+# neighborhood shapes a rule can count over (see grid_ops.window_counts)
+neighborhoods = ['moore', 'von_neumann']
+
+# short names of the neighborhoods in rule strings, as in Larger than Life rules
+_neighborhood_codes = {'moore': 'NM', 'von_neumann': 'NN'}
+
+
+# returns the number of cells in a neighborhood, not counting the center
+def neighborhood_size(neighborhood, radius):
+  if neighborhood == 'moore':
+    return (2 * radius + 1) ** 2 - 1
+  return 2 * radius * (radius + 1)
+
+# returns a set of counts as rule string text: one digit per count if the neighborhood has at most
+# 9 cells, otherwise comma-separated counts and ranges, like 10-14,20
+def _counts_text(counts, size):
+  counts = sorted(counts)
+  if not counts or size <= 9:
+    return ''.join(str(n) for n in counts)
+
+  parts = []
+  first = prev = counts[0]
+  for n in counts[1:] + [None]:
+    if n is not None and n == prev + 1:
+      prev = n
+      continue
+    parts.append(str(first) if first == prev else '%d-%d' % (first, prev))
+    first = prev = n
+  return ','.join(parts)
+
+# reads counts written by _counts_text for a neighborhood of size cells
+# with more than 9 cells, a string of digits is one number, so B12 is 12 and not 1 and 2
+def _parse_counts(text, size):
+  if not text:
+    return []
+  if ',' not in text and '-' not in text and size <= 9:
+    return [int(ch) for ch in text]
+
+  counts = []
+  for part in text.split(','):
+    ends = [int(n) for n in part.split('-')]
+    counts.extend(range(ends[0], ends[-1] + 1))
+  return counts
+
+
+# class for a cellular automaton rule on occupancy grids, where 1 is filled and 0 is empty
+# an empty cell is filled if its number of filled neighbors is in birth, and a filled cell stays
+# filled if its number is in survival; every cell is updated at once from the same counts
+# neighbors are counted over a Moore or von Neumann neighborhood of radius cells, with the cells past
+# the edges following a boundary mode (see grid_ops.boundary_modes)
+# in the walls mode the first and last rows also stay filled, the wall convention of ObstacleMap
+# ObstacleMap's own rule is B5678/S2345678: fill with 5 or more filled neighbors, clear with 1 or less
+class CARule:
+  def __init__(self, birth, survival, neighborhood='moore', radius=1, boundary='walls'):
+    if neighborhood not in neighborhoods:
+      raise Exception('Unknown neighborhood %s' % neighborhood)
+    if boundary not in grid_ops.boundary_modes:
+      raise Exception('Unknown boundary mode %s' % boundary)
+    if radius < 1:
+      raise Exception('Rule radius must be at least 1')
+
+    self.birth = sorted(set(birth))
+    self.survival = sorted(set(survival))
+    self.neighborhood = neighborhood
+    self.radius = radius
+    self.boundary = boundary
+
+    size = neighborhood_size(neighborhood, radius)
+    if any(n < 0 or n > size for n in self.birth + self.survival):
+      raise Exception('Rule counts must be between 0 and %d for this neighborhood' % size)
+
+    # next state of an empty and of a filled cell, indexed by the number of filled neighbors
+    self.table = np.zeros((2, size + 1), dtype=np.uint8)
+    self.table[0, self.birth] = 1
+    self.table[1, self.survival] = 1
+
+  # returns a rule from a rule string, like B3/S12345 or R2/B10-14/S8-16/NN/wrap
+  # parts are separated by slashes, in any order: B and S give the counts, R the radius, NM or NN the
+  # Moore or von Neumann neighborhood, and a boundary mode name the boundary
+  @classmethod
+  def parse(cls, text):
+    options = {'neighborhood': 'moore', 'radius': 1, 'boundary': 'walls'}
+    counts = {}
+    for part in text.strip().split('/'):
+      if part in grid_ops.boundary_modes:
+        options['boundary'] = part
+      elif part.upper() in ['NM', 'NN']:
+        options['neighborhood'] = 'moore' if part.upper() == 'NM' else 'von_neumann'
+      elif re.match(r'^[Rr]\d+$', part):
+        options['radius'] = int(part[1:])
+      elif re.match(r'^[BbSs][\d,\-]*$', part):
+        counts['birth' if part[0] in 'Bb' else 'survival'] = part[1:]
+      else:
+        raise Exception('Cannot read rule %s' % text)
+
+    if len(counts) < 2:
+      raise Exception('Rule %s needs both B and S counts' % text)
+    # the counts are read last, since how they are written depends on the neighborhood size
+    size = neighborhood_size(options['neighborhood'], options['radius'])
+    return cls(_parse_counts(counts['birth'], size), _parse_counts(counts['survival'], size), **options)
+
+  # returns the rule string, leaving out the parts that are the defaults
+  def __str__(self):
+    parts = []
+    if self.radius != 1:
+      parts.append('R%d' % self.radius)
+    size = neighborhood_size(self.neighborhood, self.radius)
+    parts.append('B' + _counts_text(self.birth, size))
+    parts.append('S' + _counts_text(self.survival, size))
+    if self.neighborhood != 'moore':
+      parts.append(_neighborhood_codes[self.neighborhood])
+    if self.boundary != 'walls':
+      parts.append(self.boundary)
+    return '/'.join(parts)
+
+  def __repr__(self):
+    return 'CARule(%s)' % self
+
+  # what decides the rule's behavior, for comparing rules
+  def _key(self):
+    return self.table.tobytes(), self.neighborhood, self.radius, self.boundary
+
+  def __eq__(self, other):
+    return isinstance(other, CARule) and self._key() == other._key()
+
+  def __hash__(self):
+    return hash(self._key())
+
+  # returns the number of filled neighbors of every cell of a uint8 grid
+  # wall_top / wall_bottom say whether the first / last row of grid is the real edge of the map, so
+  # the rule can also run on a tile plus its halo
+  def counts(self, grid, wall_top=True, wall_bottom=True):
+    return grid_ops.window_counts(grid, self.radius, self.neighborhood, self.boundary, wall_top, wall_bottom)
+
+  # returns the grid after one step of the rule
+  def step(self, grid, wall_top=True, wall_bottom=True):
+    grid = np.asarray(grid, dtype=np.uint8)
+    newmap = self.table[grid, self.counts(grid, wall_top, wall_bottom)]
+    if self.boundary == 'walls':
+      if wall_top:
+        newmap[0] = 1
+      if wall_bottom:
+        newmap[-1] = 1
+    return newmap
+
+  # returns the grid after iterations steps of the rule
+  def run(self, grid, iterations, wall_top=True, wall_bottom=True):
+    grid = np.asarray(grid, dtype=np.uint8)
+    for n in range(iterations):
+      grid = self.step(grid, wall_top, wall_bottom)
+    return grid
+
+
+# named rule sets for different kinds of environments
+# cave: ObstacleMap's own rule, rounded open caves
+# maze / mazectric: the Life-like maze rules, which grow winding one-cell passages from a sparse fill
+# caverns: a radius 2 majority rule, larger and smoother blobs than cave
+# corridors: a von Neumann rule that favors straight horizontal and vertical walls
+rule_sets = {
+  'cave': CARule(range(5, 9), range(2, 9)),
+  'maze': CARule([3], [1, 2, 3, 4, 5]),
+  'mazectric': CARule([3], [1, 2, 3, 4]),
+  'caverns': CARule(range(14, 25), range(11, 25), radius=2),
+  'corridors': CARule([3, 4], [2, 3, 4], neighborhood='von_neumann'),
+}
+
+# returns a CARule from a CARule, the name of a rule set, or a rule string
+def get_rule(rule):
+  if isinstance(rule, CARule):
+    return rule
+  if rule in rule_sets:
+    return rule_sets[rule]
+  return CARule.parse(rule)
@@ -0,0 +1,247 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+from dimensions import contain_wall_length, cyl_radius, jackal_radius
+
+# single entry point for the dataset workflow:
+#   python cli.py generate   generate one world (--seed) or a whole dataset from a sweep
+#   python cli.py cspace     rebuild the C-space files from the occupancy grids
+#   python cli.py metrics    recompute the metrics files from the C-spaces and paths
+#   python cli.py normalize  write the normalized metrics files
+#   python cli.py render     draw the metric heatmaps of every world to PNG files
+#   python cli.py paths      write every path as run-length codes and smoothed Gazebo waypoints
+#   python cli.py maps       rewrite the map_server .pgm and .yaml files from the occupancy grids
+#   python cli.py bench      time each stage of the pipeline
+# every subcommand imports only the modules it needs, so none of them loads matplotlib unless it
+# draws something
+
+# returns the sorted indices of the files of one part of a dataset (see gen_world_ca.dataset_files)
+# packed grids saved as .npz are counted too
+def dataset_indices(data_dir, pattern):
+  folder, name = os.path.split(os.path.join(data_dir, pattern))
+  prefix = name[:name.index('%d')]
+  indices = set()
+  if os.path.isdir(folder):
+    for filename in os.listdir(folder):
+      number, ext = os.path.splitext(filename[len(prefix):])
+      if filename.startswith(prefix) and ext in ('.npy', '.npz') and number.isdigit():
+        indices.add(int(number))
+
+  return sorted(indices)
+
+# returns the number of worlds to process: --num-files if given, else one past the largest index
+# found in the dataset
+def num_files(args, pattern):
+  if args.num_files is not None:
+    return args.num_files
+
+  indices = dataset_indices(args.data_dir, pattern)
+  return indices[-1] + 1 if indices else 0
+
+# returns the WorldCache named by --cache-dir, or None
+def open_cache(args):
+  if args.cache_dir is None:
+    return None
+  from world_cache import WorldCache
+  return WorldCache(args.cache_dir)
+
+# returns the first value given for a parameter, or default if it was not given
+def first(values, default):
+  return default if values is None else values[0]
+
+def generate(args):
+  if args.seed is not None:
+    import gen_world_ca
+    data_dir = args.data_dir or 'test_data/'
+    gen_world_ca.make_dataset_dirs(data_dir)
+    world = gen_world_ca.World(args.seed, first(args.smooth_iter, 4), first(args.fill_pct, .27),
+                               first(args.rows, 30), first(args.cols, 30),
+                               robot_radius=first(args.robot_radius, jackal_radius),
+                               disp_radius=first(args.disp_radius, 3), cache=open_cache(args),
+                               ca_rule=first(args.ca_rule, None))
+    if not world():
+      print('world with seed %d has no path' % args.seed)
+      return 1
+    world.save(args.index, data_dir, packed=args.format == 'packed')
+    print(world.metrics)
+    return 0
+
+  import sweep
+  config = sweep.load_config(args.config)
+  for key in ['data_dir', 'workers', 'set_size', 'base_seed', 'cache_dir', 'pairs_per_world']:
+    if getattr(args, key) is not None:
+      config[key] = getattr(args, key)
+  if args.format is not None:
+    config['packed'] = args.format == 'packed'
+  for param in sweep.param_order + sweep.optional_params:
+    if getattr(args, param) is not None:
+      config['grid'][param] = getattr(args, param)
+
+  sweep.SweepScheduler(config)()
+  return 0
+
+def cspace(args):
+  import c_space
+  count = num_files(args, 'grid_files/grid_%d.npy')
+  c_space.create_cspace_files(os.path.join(args.data_dir, 'grid_files/'), count,
+                              os.path.join(args.data_dir, 'cspace_files/'), args.robot_radius,
+                              packed=args.format == 'packed', workers=args.workers, cache=open_cache(args))
+  print('wrote %d C-space files' % count)
+  return 0
+
+def metrics(args):
+  import difficulty_quant
+  count = num_files(args, 'path_files/path_%d.npy')
+  difficulty_quant.main(count, os.path.join(args.data_dir, ''), args.disp_radius, args.workers)
+  print('wrote %d metrics files' % count)
+  return 0
+
+def normalize(args):
+  import normalize_metrics
+  count = num_files(args, 'metrics_files/metrics_%d.npy')
+  normalize_metrics.main(count, os.path.join(args.data_dir, ''))
+  return 0
+
+def render(args):
+  import render
+  out_dir = args.out_dir or os.path.join(args.data_dir, 'render_files/')
+  images = render.render_dataset(args.data_dir, out_dir, args.indices, args.workers, args.disp_radius, args.manifest)
+  print('rendered %d worlds to %s' % (len(images), out_dir))
+  return 0
+
+def paths(args):
+  import path_tools
+  indices = args.indices or dataset_indices(args.data_dir, 'path_files/path_%d.npy')
+  original, runs = path_tools.postprocess_dataset(args.data_dir, indices, args.cyl_radius, contain_wall_length,
+                                                   args.window, args.spacing)
+  print('wrote %d paths, %d bytes as cells, %d bytes as run-length codes' % (len(indices), original, runs))
+  return 0
+
+def maps(args):
+  import map_export
+  indices = args.indices or dataset_indices(args.data_dir, 'grid_files/grid_%d.npy')
+  count = map_export.export_dataset(args.data_dir, indices, args.cyl_radius, contain_wall_length, args.workers)
+  print('wrote %d map_server maps' % count)
+  return 0
+
+def bench(args):
+  import bench
+  if args.search:
+    report = bench.compare_search(args.rows, args.cols, args.fill_pct, args.smooth_iter, args.robot_radius,
+                                  args.disp_radius, args.num_worlds, args.seed, args.workers)
+    bench.print_search_report(report)
+    return 0
+
+  if args.memory:
+    report, peak = bench.run_memory_profile(args.rows, args.cols, args.fill_pct, args.smooth_iter, args.robot_radius,
+                                            args.disp_radius, args.num_worlds, args.seed, args.top, args.frames)
+    bench.print_memory_report(report, peak)
+    return 0
+
+  report = bench.run_benchmark(args.rows, args.cols, args.fill_pct, args.smooth_iter, args.robot_radius,
+                               args.disp_radius, args.num_worlds, args.seed, args.workers)
+  bench.print_report(report)
+  return 0
+
+def build_parser():
+  parser = argparse.ArgumentParser(description='Generate and analyze BARN-style navigation worlds.')
+  subparsers = parser.add_subparsers(dest='command')
+  cpus = multiprocessing.cpu_count()
+
+  p = subparsers.add_parser('generate', help='generate one world (--seed) or a dataset from a sweep')
+  p.add_argument('--data-dir', help='defaults to test_data/, or the data_dir of the config')
+  p.add_argument('--config', help='sweep config file (see sweep_config.json)')
+  p.add_argument('--seed', type=int, help='generate only the world with this seed')
+  p.add_argument('--index', type=int, default=-1, help='dataset index of the world made with --seed')
+  p.add_argument('--base-seed', type=int, help='seed every sweep candidate is derived from')
+  p.add_argument('--workers', type=int)
+  p.add_argument('--set-size', type=int, help='worlds for each combination of parameters')
+  p.add_argument('--pairs-per-world', type=int, help='start/goal pairs saved from every generated map')
+  p.add_argument('--format', choices=['npy', 'packed'], help='format of the grid and C-space files')
+  p.add_argument('--cache-dir', help='folder of a world cache shared with other runs')
+  p.add_argument('--rows', type=int, nargs='+')
+  p.add_argument('--cols', type=int, nargs='+')
+  p.add_argument('--fill-pct', type=float, nargs='+')
+  p.add_argument('--smooth-iter', type=int, nargs='+')
+  p.add_argument('--ca-rule', nargs='+', help='rule set name or rule string of the cellular automaton (see ca_rules.py)')
+  p.add_argument('--robot-radius', type=int, nargs='+')
+  p.add_argument('--disp-radius', type=int, nargs='+')
+  p.set_defaults(func=generate)
+
+  p = subparsers.add_parser('cspace', help='rebuild the C-space files from the occupancy grids')
+  p.add_argument('--data-dir', default='test_data/')
+  p.add_argument('--num-files', type=int)
+  p.add_argument('--robot-radius', type=int, default=jackal_radius)
+  p.add_argument('--format', choices=['npy', 'packed'], default='npy')
+  p.add_argument('--workers', type=int, default=cpus)
+  p.add_argument('--cache-dir', help='folder of a world cache shared with other runs')
+  p.set_defaults(func=cspace)
+
+  p = subparsers.add_parser('metrics', help='recompute the metrics from the C-spaces and paths')
+  p.add_argument('--data-dir', default='test_data/')
+  p.add_argument('--num-files', type=int)
+  p.add_argument('--disp-radius', type=int, default=3)
+  p.add_argument('--workers', type=int, default=cpus)
+  p.set_defaults(func=metrics)
+
+  p = subparsers.add_parser('normalize', help='write the normalized metrics files')
+  p.add_argument('--data-dir', default='test_data/')
+  p.add_argument('--num-files', type=int)
+  p.set_defaults(func=normalize)
+
+  p = subparsers.add_parser('render', help='draw the metric heatmaps of every world')
+  p.add_argument('--data-dir', default='test_data/')
+  p.add_argument('--out-dir')
+  p.add_argument('--indices', type=int, nargs='+')
+  p.add_argument('--disp-radius', type=int, default=3, help='for worlds the manifest does not list')
+  p.add_argument('--manifest', default='manifest.json', help='dataset manifest, relative to the data folder')
+  p.add_argument('--workers', type=int, default=cpus)
+  p.set_defaults(func=render)
+
+  p = subparsers.add_parser('paths', help='write compact paths and smoothed Gazebo waypoints')
+  p.add_argument('--data-dir', default='test_data/')
+  p.add_argument('--indices', type=int, nargs='+')
+  p.add_argument('--cyl-radius', type=float, default=cyl_radius)
+  p.add_argument('--window', type=int, default=5, help='cells in the smoothing window')
+  p.add_argument('--spacing', type=int, default=3, help='cells between waypoints')
+  p.set_defaults(func=paths)
+
+  p = subparsers.add_parser('maps', help='rewrite the map_server .pgm and .yaml files from the occupancy grids')
+  p.add_argument('--data-dir', default='test_data/')
+  p.add_argument('--indices', type=int, nargs='+')
+  p.add_argument('--cyl-radius', type=float, default=cyl_radius)
+  p.add_argument('--workers', type=int, default=cpus)
+  p.set_defaults(func=maps)
+
+  p = subparsers.add_parser('bench', help='time each stage of the pipeline')
+  p.add_argument('--rows', type=int, default=30)
+  p.add_argument('--cols', type=int, default=30)
+  p.add_argument('--fill-pct', type=float, default=0.2)
+  p.add_argument('--smooth-iter', type=int, default=3)
+  p.add_argument('--robot-radius', type=int, default=jackal_radius)
+  p.add_argument('--disp-radius', type=int, default=3)
+  p.add_argument('--num-worlds', type=int, default=20)
+  p.add_argument('--seed', type=int, default=1, help='seed of the first world')
+  p.add_argument('--workers', type=int, default=1)
+  p.add_argument('--search', action='store_true', help='compare the path search modes instead')
+  p.add_argument('--memory', action='store_true',
+                 help='profile the memory of each stage with tracemalloc instead, one world at a time')
+  p.add_argument('--top', type=int, default=10, help='allocation sites shown per stage with --memory')
+  p.add_argument('--frames', type=int, default=1, help='call stack frames kept per allocation with --memory')
+  p.set_defaults(func=bench)
+
+  return parser
+
+def main(argv=None):
+  parser = build_parser()
+  args = parser.parse_args(argv)
+  if getattr(args, 'func', None) is None:
+    parser.print_help()
+    return 2
+
+  return args.func(args)
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,147 @@
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+import results_display
+from difficulty_quant import metric_names
+from normalize_metrics import load_metrics
+
+# resamples given to a pool worker at a time; every chunk has its own seed, so the intervals do
+# not depend on the number of workers
+bootstrap_chunk = 50
+
+# writes the analysis matrix to matrix_file: one row per environment, the five metrics of its
+# world followed by the mean traversal time of each planner
+# returns the column names
+def build_matrix(metrics_dir, planners, matrix_file):
+  results = results_display.load_results(planners)
+  metrics = load_metrics(metrics_dir, len(results))
+
+  matrix = np.lib.format.open_memmap(matrix_file, mode='w+', dtype=np.float64,
+                                     shape=(len(results), len(metric_names) + len(planners)))
+  matrix[:, :len(metric_names)] = metrics
+  for col, planner in enumerate(planners):
+    matrix[:, len(metric_names) + col] = results[planner[0]]['mean']
+  matrix.flush()
+  del matrix
+
+  return metric_names + [planner[0] for planner in planners]
+
+# loads the analysis matrix memory-mapped
+# returns (metric columns, planner columns)
+def load_matrix(matrix_file):
+  matrix = np.load(matrix_file, mmap_mode='r')
+  return matrix[:, :len(metric_names)], matrix[:, len(metric_names):]
+
+# returns the Pearson correlation of every column of x with every column of y
+# columns with no variance give nan
+def pearson(x, y):
+  x = np.asarray(x, dtype=np.float64)
+  y = np.asarray(y, dtype=np.float64)
+  x = x - x.mean(axis=0)
+  y = y - y.mean(axis=0)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return x.T.dot(y) / np.outer(np.sqrt((x ** 2).sum(axis=0)), np.sqrt((y ** 2).sum(axis=0)))
+
+# returns the rank of every value within its column, counting from 1, with tied values given the
+# average of their ranks
+def rank_columns(a):
+  a = np.asarray(a, dtype=np.float64)
+  ranks = np.empty(a.shape)
+  for col in range(a.shape[1]):
+    values, inverse, counts = np.unique(a[:, col], return_inverse=True, return_counts=True)
+    # the tied values v occupy ranks [first, first + count), their average is first + (count - 1) / 2
+    first = np.cumsum(counts) - counts + 1
+    ranks[:, col] = (first + (counts - 1) / 2.0)[inverse.ravel()]
+
+  return ranks
+
+# returns the Spearman rank correlation of every column of x with every column of y
+def spearman(x, y):
+  return pearson(rank_columns(x), rank_columns(y))
+
+# returns the Pearson and Spearman correlations for each bootstrap resample in a chunk
+# args: (matrix_file, seed, num_resamples); defined at module level so that pool workers can run it
+def bootstrap_chunk_stats(args):
+  matrix_file, seed, num_resamples = args
+  x, y = load_matrix(matrix_file)
+  x = np.asarray(x)
+  y = np.asarray(y)
+
+  rng = np.random.RandomState(seed)
+  n = len(x)
+  pearsons = np.empty((num_resamples, x.shape[1], y.shape[1]))
+  spearmans = np.empty((num_resamples, x.shape[1], y.shape[1]))
+  for b in range(num_resamples):
+    sample = rng.randint(0, n, n)
+    pearsons[b] = pearson(x[sample], y[sample])
+    spearmans[b] = spearman(x[sample], y[sample])
+
+  return pearsons, spearmans
+
+# returns percentile bootstrap confidence intervals of the Pearson and Spearman correlations
+# as two arrays of shape (2, metrics, planners) with the lower and upper bounds
+def bootstrap(matrix_file, num_resamples=1000, confidence=0.95, seed=0, workers=multiprocessing.cpu_count()):
+  tasks = []
+  for first in range(0, num_resamples, bootstrap_chunk):
+    tasks.append((matrix_file, seed * 1000003 + first, min(bootstrap_chunk, num_resamples - first)))
+
+  if workers <= 1:
+    chunks = [bootstrap_chunk_stats(task) for task in tasks]
+  else:
+    pool = multiprocessing.Pool(workers)
+    try:
+      chunks = pool.map(bootstrap_chunk_stats, tasks)
+    finally:
+      pool.close()
+      pool.join()
+
+  pearsons = np.concatenate([chunk[0] for chunk in chunks])
+  spearmans = np.concatenate([chunk[1] for chunk in chunks])
+  bounds = [50 * (1 - confidence), 50 * (1 + confidence)]
+  return np.nanpercentile(pearsons, bounds, axis=0), np.nanpercentile(spearmans, bounds, axis=0)
+
+# computes the correlations of every metric with every planner's traversal time, with bootstrap
+# confidence intervals
+# returns a dict with the metric and planner names, and the 'pearson' and 'spearman' matrices
+# (metrics x planners) and their intervals (2 x metrics x planners)
+def analyze(matrix_file, planner_keys, num_resamples=1000, confidence=0.95, seed=0,
+            workers=multiprocessing.cpu_count()):
+  x, y = load_matrix(matrix_file)
+  pearson_ci, spearman_ci = bootstrap(matrix_file, num_resamples, confidence, seed, workers)
+  return {
+    'metrics': list(metric_names),
+    'planners': list(planner_keys),
+    'environments': len(x),
+    'pearson': pearson(x, y),
+    'spearman': spearman(x, y),
+    'pearson_ci': pearson_ci,
+    'spearman_ci': spearman_ci,
+  }
+
+# prints one line per metric and planner pair
+def print_analysis(analysis):
+  print('%d environments' % analysis['environments'])
+  print('%-16s %-10s %24s %24s' % ('metric', 'planner', 'pearson [95% CI]', 'spearman [95% CI]'))
+  for m, metric in enumerate(analysis['metrics']):
+    for p, planner in enumerate(analysis['planners']):
+      print('%-16s %-10s %6.3f [%6.3f, %6.3f] %6.3f [%6.3f, %6.3f]' % (
+        metric, planner,
+        analysis['pearson'][m, p], analysis['pearson_ci'][0, m, p], analysis['pearson_ci'][1, m, p],
+        analysis['spearman'][m, p], analysis['spearman_ci'][0, m, p], analysis['spearman_ci'][1, m, p]))
+
+# builds the analysis matrix from the dataset and the planner results, then prints the correlations
+def main(data_dir='test_data/', planners=results_display.default_planners, num_resamples=1000):
+  matrix_file = os.path.join(data_dir, 'analysis_matrix.npy')
+  build_matrix(os.path.join(data_dir, 'metrics_files/'), planners, matrix_file)
+  analysis = analyze(matrix_file, [planner[0] for planner in planners], num_resamples)
+  print_analysis(analysis)
+  return analysis
+
+if __name__ == "__main__":
+  if len(sys.argv) > 2:
+    main(sys.argv[1], results_display.planners_from_args(sys.argv[2:]))
+  else:
+    main(*sys.argv[1:])
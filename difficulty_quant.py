@@ -1,16 +1,26 @@
 import math
-import Queue
+import multiprocessing
+from queue import PriorityQueue
+
 import numpy as np
+
+from occupancy import as_rows, load_grid
+
+# names of the metrics returned by DifficultyMetrics.avg_all_metrics, in order
+metric_names = ['closest_wall', 'avg_visibility', 'dispersion', 'char_dimension', 'tortuosity']
+
+# names of the per-cell metric grids returned by DifficultyMetrics.all_fields
+field_names = ['closest_dist', 'avg_vis', 'dispersion', 'char_dimension']
   
 class DifficultyMetrics:
 
-  # map: C-space occupancy grid
+  # map: C-space occupancy grid (list of lists, array, or OccupancyGrid)
   # path: list of points (row, col)
   # disp_radius: radius for dispersion
   def __init__(self, map, path, disp_radius):
-    self.map = map
-    self.rows = len(map)
-    self.cols = len(map[0])
+    self.map = as_rows(map)
+    self.rows = len(self.map)
+    self.cols = len(self.map[0])
     self.axes = [(0, 1), (1, 1), (1, 0), (1, -1)] # vertical, horizontal, and 2 diagonals
     self.path = path
     self.radius = disp_radius
@@ -50,16 +60,26 @@ class DifficultyMetrics:
     cdr = [[0 for i in range(self.cols)] for j in range(self.rows)]
     for r in range(self.rows):
       for c in range(self.cols):
-        if self.map[r][c] == 1:
-          cdr[r][c] = 0
+        cdr[r][c] = self._char_dim_cell(r, c)
 
-        cdr_min = self.rows + self.cols
-        for axis in self.axes:
-          cdr_min = min(cdr_min, self._distance(r, c, axis))
+    return cdr
 
-        cdr[r][c] = cdr_min
+  # returns the characteristic dimension at (r, c), the shortest of the distances along the 4 axes
+  def _char_dim_cell(self, r, c):
+    cdr_min = self.rows + self.cols
+    for axis in self.axes:
+      cdr_min = min(cdr_min, self._distance(r, c, axis))
 
-    return cdr
+    return cdr_min
+
+  # returns a dict with every per-cell metric grid, keyed by field_names
+  def all_fields(self):
+    return {
+      'closest_dist': self.closest_wall(),
+      'avg_vis': self.avg_visibility(),
+      'dispersion': self.dispersion(),
+      'char_dimension': self.characteristic_dimension(),
+    }
 
   # returns the distance along the axis in both directions, not including (r, c)
   def _distance(self, r, c, axis):
@@ -186,7 +206,7 @@ class DifficultyMetrics:
   # returns the distance to the closest obstacle at point (r, c)
   # returns 0 if self.map[r][c] is an obstacle, 1 if an adjacent non-diagonal cell is an obstacle, etc.
   def _dist_closest_wall(self, r, c):
-    pq = Queue.PriorityQueue()
+    pq = PriorityQueue()
     first_wrapper = self.Wrapper(0, r, c)
     pq.put(first_wrapper)
     visited = {(r, c) : first_wrapper}
@@ -207,7 +227,7 @@ class DifficultyMetrics:
 
     # in case the queue is empty before a wall is found (shouldn't happen),
     # the farthest a cell can be from a wall is half the board, since the top and bottom rows are all walls
-    return (self.rows - 1) / 2
+    return (self.rows - 1) // 2
 
   # wrapper class for coordinates
   class Wrapper:
@@ -259,25 +279,80 @@ class DifficultyMetrics:
     return result
 
 
+  # same as avg_all_metrics, but reads the per-cell metrics from grids that were already computed
+  # fields: dict of grids keyed by field_names, e.g. from all_fields
+  def avg_metrics_from_fields(self, fields):
+    result = []
+    for name in field_names:
+      grid = fields[name]
+      total = 0.0
+      for row, col in self.path:
+        total += grid[row][col]
+      result.append(total / len(self.path))
+
+    result.append(self.tortuosity())
+    return result
+
+
+# returns the metrics of many paths on the same C-space, as an array with a row per path in the order
+# of metric_names, the same values as avg_metrics_from_fields up to rounding
+# fields: dict of grids keyed by field_names, computed once for all the paths (e.g. from all_fields)
+# paths: list of paths, each a list of (row, col) or an n x 2 array
+def path_metrics(fields, paths):
+  lengths = np.asarray([len(path) for path in paths])
+  cells = np.concatenate([np.asarray(path, dtype=np.int64).reshape(-1, 2) for path in paths])
+  owner = np.repeat(np.arange(len(paths)), lengths)
+
+  result = np.zeros((len(paths), len(metric_names)))
+  for i, name in enumerate(field_names):
+    values = np.asarray(fields[name], dtype=np.float64)[cells[:, 0], cells[:, 1]]
+    result[:, i] = np.bincount(owner, weights=values, minlength=len(paths)) / lengths
+
+  # tortuosity: arc length over chord length, leaving out the steps between one path and the next
+  steps = np.sqrt((np.diff(cells, axis=0) ** 2).sum(axis=1))
+  steps[np.cumsum(lengths)[:-1] - 1] = 0.0
+  arc = np.bincount(owner[1:], weights=steps, minlength=len(paths))
+  ends = np.cumsum(lengths) - 1
+  chord = np.sqrt(((cells[ends] - cells[ends - lengths + 1]) ** 2).sum(axis=1))
+  with np.errstate(divide='ignore', invalid='ignore'):
+    result[:, -1] = arc / chord
+  return result
+
 def load_data(cspace_file, path_file):
-  cspace_grid = np.load(cspace_file)
+  cspace_grid = load_grid(cspace_file)
   path = np.load(path_file)
 
   return cspace_grid, path
 
-# load all c-spaces and paths, calculate metrics, and save
-def main(num_files=300):
-  dir_name = 'test_data/'
+# calculates and saves the metrics of one world of a dataset
+# args: (dir_name, index, disp_radius); defined at module level so that pool workers can run it
+def save_metrics(args):
+  dir_name, i, disp_radius = args
   path_file = 'path_files/path_%d.npy'
   cspace_file = 'cspace_files/cspace_%d.npy'
   metrics_file = 'metrics_files/metrics_%d.npy'
-  disp_radius = 3
-  for i in range(num_files):
-    cspace, path = load_data(dir_name + cspace_file % i, dir_name + path_file % i)
-    diffs = DifficultyMetrics(cspace, path, disp_radius)
 
-    metrics = np.asarray(diffs.avg_all_metrics())
-    np.save(dir_name + metrics_file % i, metrics)
-      
+  cspace, path = load_data(dir_name + cspace_file % i, dir_name + path_file % i)
+  diffs = DifficultyMetrics(cspace, path, disp_radius)
+
+  metrics = np.asarray(diffs.avg_all_metrics())
+  np.save(dir_name + metrics_file % i, metrics)
+
+# load all c-spaces and paths, calculate metrics, and save
+# workers > 1 spreads the worlds over a pool of processes
+def main(num_files=300, dir_name='test_data/', disp_radius=3, workers=1):
+  tasks = [(dir_name, i, disp_radius) for i in range(num_files)]
+  if workers <= 1:
+    for task in tasks:
+      save_metrics(task)
+    return
+
+  pool = multiprocessing.Pool(workers)
+  try:
+    pool.map(save_metrics, tasks)
+  finally:
+    pool.close()
+    pool.join()
+
 if __name__ == "__main__":
   main()
@@ -0,0 +1,17 @@
+# physical dimensions shared by the generator and the tools that read its datasets, kept apart from
+# gen_world_ca.py so that the tools can use them without loading the generator
+
+# jackal takes up 2 extra grid squares on each side in addition to center square
+jackal_radius = 2
+
+# pgm file resolution
+pgm_res = 0.15 # meters per pixel
+
+# inflation radius found in planner params
+infl_rad = 0.3 # meters
+
+# radius of cylinders in the .world file
+cyl_radius = 0.075
+
+# length of containment wall, in meters
+contain_wall_length = 5
@@ -1,48 +1,47 @@
+import hashlib
+import json
+import os
 import random
 import datetime
-import Queue
 import math
+import time
+from queue import Queue
 
-import matplotlib.pyplot as plt
-import Tkinter as tk
 import numpy as np
 
-from world_writer import WorldWriter
-from difficulty_quant import DifficultyMetrics
+from world_writer import StreamingWorldWriter
+from difficulty_quant import DifficultyMetrics, path_metrics
 from pgm_writer import PGMWriter
 from yaml_writer import YamlWriter
-
-# jackal takes up 2 extra grid squares on each side in addition to center square
-jackal_radius = 2
-
-# pgm file resolution
-pgm_res = 0.15 # meters per pixel
-
-# inflation radius found in planner params
-infl_rad = 0.3 # meters
-
-# radius of cylinders in the .world file
-cyl_radius = 0.075
-
-# length of containment wall, in meters
-contain_wall_length = 5
+from occupancy import OccupancyGrid, as_rows, save_grid
+from planners import GridSearch, HierarchicalPlanner, MultiQueryPlanner, SearchStats
+from incremental import IncrementalMetrics
+from ca_rules import get_rule
+from dimensions import contain_wall_length, cyl_radius, infl_rad, jackal_radius, pgm_res
 
 # class to generate occupancy grids using cellular automaton
 class ObstacleMap():
   # rand_fill_pct is the initial fill percent
   # seed is the random seed
   # smooth_iter is the number of smoothing iterations to run
-  def __init__(self, rows, cols, rand_fill_pct, seed=None, smooth_iter=5):
+  # rule is an optional CARule, rule set name, or rule string (see ca_rules.py) to smooth with instead
+  # of _smooth; the random fill is the same either way
+  def __init__(self, rows, cols, rand_fill_pct, seed=None, smooth_iter=5, rule=None):
     self.map = [[0 for i in range(cols)] for j in range(rows)]
     self.rows = rows
     self.cols = cols
     self.rand_fill_pct = rand_fill_pct
     self.seed = seed
     self.smooth_iter = smooth_iter
+    self.rule = None if rule is None else get_rule(rule)
 
   # fill in map and run smoothing iterations
   def __call__(self):
     self._random_fill()
+    if self.rule is not None:
+      self.map = self.rule.run(np.asarray(self.map, dtype=np.uint8), self.smooth_iter).tolist()
+      return
+
     for n in range(self.smooth_iter):
       self._smooth()
 
@@ -99,22 +98,37 @@ class ObstacleMap():
   def get_map(self):
     return self.map
 
+  # returns the map as a bit-packed OccupancyGrid
+  def get_grid(self):
+    return OccupancyGrid.from_grid(self.map)
+
 # class to represent Jackal's C-space
 class JackalMap:
-  # ob_map is the occupancy generated by ObstacleMap
+  # ob_map is the occupancy generated by ObstacleMap, as a list of lists, array, or OccupancyGrid
   # robot_radius is the number of cells the robot takes up in each direction
   # in addition 
   def __init__(self, ob_map, robot_radius):
-    self.ob_map = ob_map
-    self.rows = len(ob_map)
-    self.cols = len(ob_map[0])
+    self.ob_map = as_rows(ob_map)
+    self.rows = len(self.ob_map)
+    self.cols = len(self.ob_map[0])
 
     self.map = self._jmap_from_obs_map(robot_radius)
     self.infl_rad_cells = self.calc_infl_rad_cells()
 
+  # returns a JackalMap for a C-space computed before, without inflating the obstacle map again
+  @classmethod
+  def from_cspace(cls, ob_map, cspace):
+    jmap = cls.__new__(cls)
+    jmap.ob_map = as_rows(ob_map)
+    jmap.rows = len(jmap.ob_map)
+    jmap.cols = len(jmap.ob_map[0])
+    jmap.map = as_rows(cspace)
+    jmap.infl_rad_cells = jmap.calc_infl_rad_cells()
+    return jmap
+
   # use flood-fill algorithm to find the open region including (r, c)
   def _get_region(self, r, c):
-    queue = Queue.Queue(maxsize=0)
+    queue = Queue(maxsize=0)
     
     # region is 2D array that indicates the open region connected to (r, c) with a 1
     region = [[0 for i in range(self.cols)] for j in range(self.rows)]
@@ -181,7 +195,11 @@ class JackalMap:
 
   # returns a path between all points in the list points using A*
   # if a valid path cannot be found, returns None
-  def get_path(self, points, dist_map):
+  # search_mode: 'reference' for AStarSearch, a GridSearch mode ('astar', 'weighted', 'bidirectional'),
+  # or 'hierarchical' for HierarchicalPlanner (A*, or weighted A* if weight > 1, inside the corridor)
+  # weight: heuristic weight of the 'weighted' and 'hierarchical' modes
+  # the nodes expanded, runtime, and cost of the search are left in self.search_stats
+  def get_path(self, points, dist_map, search_mode='reference', weight=1.0):
     num_points = len(points)
     if num_points < 2:
       raise Exception('Path needs at least two points')
@@ -191,14 +209,35 @@ class JackalMap:
       if self.map[point[0]][point[1]] == 1:
         raise Exception('The point (%d, %d) is a wall' % (point[0], point[1]))
 
+    # GridSearch also prices the reference paths, so the costs of every mode can be compared
+    search = GridSearch(self.map, self.infl_rad_cells, dist_map)
+    if search_mode == 'hierarchical':
+      hierarchical = HierarchicalPlanner(search)
+    self.search_stats = SearchStats(search_mode, weight if search_mode in ('weighted', 'hierarchical') else 1.0)
+    self.search_stats.cost = self.search_stats.lower_bound = 0.0
+
     overall_path = []
     for n in range(num_points - 1):
       overall_path.append(points[n])
 
       # generate path between this point and the next one in the list
-      a_star = AStarSearch(self.map, self.infl_rad_cells)
+      if search_mode == 'reference':
+        a_star = AStarSearch(self.map, self.infl_rad_cells)
+        begin = time.time()
+        intermediate_path = a_star(points[n], points[n+1], dist_map)
+        stats = SearchStats(search_mode)
+        stats.runtime = time.time() - begin
+        stats.nodes_expanded = a_star.nodes_expanded
+        if intermediate_path:
+          stats.cost = search.path_cost(intermediate_path)
+      elif search_mode == 'hierarchical':
+        intermediate_path = hierarchical(points[n], points[n+1], 'weighted' if weight > 1 else 'astar', weight)
+        stats = hierarchical.stats
+      else:
+        intermediate_path = search(points[n], points[n+1], search_mode, weight)
+        stats = search.stats
+      self.search_stats.add(stats)
 
-      intermediate_path = a_star(points[n], points[n+1], dist_map)
       if not intermediate_path:
         return None
       
@@ -209,6 +248,17 @@ class JackalMap:
 
     return overall_path
 
+  # returns a list with the path from each point in starts to goal, or None for a start with no path
+  # plans once from the goal with MultiQueryPlanner, so each extra start only costs its path length
+  def get_paths(self, starts, goal, dist_map):
+    for point in list(starts) + [goal]:
+      if self.map[point[0]][point[1]] == 1:
+        raise Exception('The point (%d, %d) is a wall' % (point[0], point[1]))
+
+    planner = MultiQueryPlanner(self.map, self.infl_rad_cells, dist_map)
+    planner.plan_to(goal)
+    return planner.paths_from(starts)
+
   # robot_radius is how many cells from the center cell the robot takes up
   # robot_radius of 1 means robot takes up 3x3 cells
   # robot_radius of 2 means robot takes up 5x5 cells
@@ -243,6 +293,10 @@ class JackalMap:
   def get_map(self):
     return self.map
 
+  # returns the C-space as a bit-packed OccupancyGrid
+  def get_grid(self):
+    return OccupancyGrid.from_grid(self.map)
+
 # class to perform A* search on C-space
 class AStarSearch:
   # infl_rad_cells: the inflation radius, in cells
@@ -251,6 +305,7 @@ class AStarSearch:
     self.map_rows = len(map)
     self.map_cols = len(map[0])
     self.infl_rad_cells = infl_rad_cells
+    self.nodes_expanded = 0
 
   # dist_map: grid with the distances to closest obstacle at each point
   def __call__(self, start_coord, end_coord, dist_map):
@@ -276,6 +331,7 @@ class AStarSearch:
     end_node.g = end_node.h = end_node.f = 0
 
     # initialize lists to track nodes we've visited or not
+    self.nodes_expanded = 0
     visited = []
     not_visited = []
 
@@ -296,6 +352,7 @@ class AStarSearch:
       # pop this node from the unvisited list and add to visited list
       not_visited.pop(curr_idx)
       visited.append(curr_node)
+      self.nodes_expanded += 1
 
       # if this node is at end of the path, return
       if curr_node == end_node:
@@ -373,7 +430,7 @@ class AStarSearch:
   def return_path(self, end_node):
     path = []
     curr_node = end_node
-    while curr_node != None:
+    while curr_node is not None:
       path.append((curr_node.r, curr_node.c))
       curr_node = curr_node.parent
 
@@ -394,23 +451,307 @@ class Node:
   def __eq__(self, other):
     return self.r == other.r and self.c == other.c
  
+# file names for each part of a saved world, relative to the dataset directory
+dataset_files = {
+  'world': 'world_files/world_%d.world',
+  'grid': 'grid_files/grid_%d.npy',
+  'cspace': 'cspace_files/cspace_%d.npy',
+  'path': 'path_files/path_%d.npy',
+  'metrics': 'metrics_files/metrics_%d.npy',
+  'pgm': 'map_files/map_pgm_%d.pgm',
+  'yaml': 'map_files/yaml_%d.yaml',
+  'index': 'index_files/index_%d.npz',
+}
+
+# creates the dataset folders inside data_dir, if they do not exist yet
+def make_dataset_dirs(data_dir='test_data/'):
+  folders = set(os.path.dirname(pattern) for pattern in dataset_files.values())
+  folders.add('norm_metrics_files')
+  for name in folders:
+    folder = os.path.join(data_dir, name)
+    if not os.path.isdir(folder):
+      os.makedirs(folder)
+
+# planner of the extra start/goal pairs of World.sample_pairs, recorded in the manifest with each pair;
+# the world's own path comes from get_path with its search_mode
+pair_planner = 'multi_query'
+
+# returns the seed of the generator of a world's extra start/goal pairs
+# it is derived from the world's seed instead of being the seed itself, so the pairs are not drawn
+# from the same stream as the random fill
+def pair_seed(seed):
+  key = json.dumps([seed, 'pairs'])
+  return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:8], 16)
+
+# class to run the generation pipeline for one world, one stage at a time
+# build -> choose_points -> plan -> measure, then save to the dataset files
+class World:
+  # seed, smooth_iter, fill_pct, rows, cols: cellular automaton parameters for ObstacleMap
+  # robot_radius: cells the robot takes up around its center, for the C-space
+  # disp_radius: radius for the dispersion metric
+  # cache: optional WorldCache (see world_cache.py); a world generated before is loaded from it
+  # search_mode, search_weight: how the path is planned (see JackalMap.get_path)
+  # ca_rule: optional rule for the cellular automaton (see ObstacleMap), None for ObstacleMap's own
+  def __init__(self, seed, smooth_iter, fill_pct, rows, cols, robot_radius=jackal_radius, disp_radius=3, cache=None,
+               search_mode='reference', search_weight=1.0, ca_rule=None):
+    self.seed = seed
+    self.smooth_iter = smooth_iter
+    self.fill_pct = fill_pct
+    self.rows = rows
+    self.cols = cols
+    self.robot_radius = robot_radius
+    self.disp_radius = disp_radius
+    self.cache = cache
+    self.search_mode = search_mode
+    self.search_weight = search_weight
+    self.ca_rule = ca_rule
+
+    self.obstacle_map = None
+    self.jmap_gen = None
+    self.jackal_map = None
+    self.start_region = None
+    self.end_region = None
+    self.start = None
+    self.goal = None
+    self.dist_map = None
+    self.path = None
+    self.search_stats = None
+    self.metrics = None
+    self.pairs = []
+    self.fields = None
+    self.editor = None
+
+  # returns the generation parameters as a dict
+  # the search parameters are only included for worlds not planned with the reference A*, and the
+  # rule only for worlds given one, as its rule string
+  def params(self):
+    params = {
+      'seed': self.seed,
+      'smooth_iter': self.smooth_iter,
+      'fill_pct': self.fill_pct,
+      'rows': self.rows,
+      'cols': self.cols,
+      'robot_radius': self.robot_radius,
+      'disp_radius': self.disp_radius,
+    }
+    if self.search_mode != 'reference':
+      params['search_mode'] = self.search_mode
+      params['search_weight'] = self.search_weight
+    if self.ca_rule is not None:
+      params['ca_rule'] = str(get_rule(self.ca_rule))
+    return params
+
+  # generates the obstacle map and the C-space
+  # returns False if the biggest left and right regions are not connected
+  def build(self):
+    ob_map_gen = ObstacleMap(self.rows, self.cols, self.fill_pct, self.seed, self.smooth_iter, self.ca_rule)
+    ob_map_gen()
+    self.obstacle_map = ob_map_gen.get_map()
+
+    self.jmap_gen = JackalMap(self.obstacle_map, self.robot_radius)
+    self.jackal_map = self.jmap_gen.get_map()
+    self.start_region = self.jmap_gen.biggest_left_region()
+    self.end_region = self.jmap_gen.biggest_right_region()
+
+    return self.jmap_gen.regions_connected(self.start_region, self.end_region)
+
+  # returns the rows of the leftmost and rightmost columns that are in the connected region
+  def _open_rows(self):
+    left_open = []
+    right_open = []
+    for r in range(self.rows):
+      if self.start_region[r][0] == 1:
+        left_open.append(r)
+      if self.end_region[r][self.cols-1] == 1:
+        right_open.append(r)
+    return left_open, right_open
+
+  # chooses random start and end points in the leftmost and rightmost columns of the connected region
+  def choose_points(self):
+    left_open, right_open = self._open_rows()
+    # int(random() * n) is how Python 2's randint picked an index, so seeds give the same worlds as before
+    left_coord_r = left_open[int(random.random() * len(left_open))]
+    right_coord_r = right_open[int(random.random() * len(right_open))]
+
+    self.start = (left_coord_r, 0)
+    self.goal = (right_coord_r, self.cols-1)
+
+  # computes the distance map and the A* path from start to goal, with its stats in search_stats
+  # returns False if no path was found
+  def plan(self):
+    self.dist_map = DifficultyMetrics(self.jackal_map, [], self.disp_radius).closest_wall()
+    self.path = self.jmap_gen.get_path([self.start, self.goal], self.dist_map, self.search_mode, self.search_weight)
+    self.search_stats = self.jmap_gen.search_stats
+    return bool(self.path)
+
+  # calculates the difficulty metrics along the path
+  def measure(self):
+    diff = DifficultyMetrics(self.jackal_map, self.path, self.disp_radius)
+    self.metrics = diff.avg_all_metrics()
+
+  # computes every per-cell metric grid of the C-space (see DifficultyMetrics.all_fields)
+  # the distance grid is shared with dist_map, so the path penalties always match the fields
+  def compute_fields(self):
+    diff = DifficultyMetrics(self.jackal_map, self.path or [], self.disp_radius)
+    self.fields = {
+      'closest_dist': self.dist_map if self.dist_map is not None else diff.closest_wall(),
+      'avg_vis': diff.avg_visibility(),
+      'dispersion': diff.dispersion(),
+      'char_dimension': diff.characteristic_dimension(),
+    }
+    self.dist_map = self.fields['closest_dist']
+    return self.fields
+
+  # samples count more start/goal pairs in the leftmost and rightmost columns of the connected region,
+  # reusing the regions, distance map, and metric fields of the world, which are computed only once
+  # pairs are planned with MultiQueryPlanner (pair_planner), one search per distinct goal, and their
+  # metrics are averaged from the fields in one batch
+  # the pairs come from their own generator, seeded from the world's seed (see pair_seed), so they do
+  # not depend on what else was drawn from the random module (or on the world coming from a cache)
+  # no pair is drawn twice or repeats the world's own start and goal, so fewer than count pairs are
+  # returned if the region has fewer
+  # returns a list of (start, goal, path, metrics), leaving out any pair with no path
+  def sample_pairs(self, count):
+    if self.fields is None:
+      self.compute_fields()
+
+    rng = random.Random(pair_seed(self.seed))
+    left_open, right_open = self._open_rows()
+    seen = set([(tuple(self.start), tuple(self.goal))])
+    pairs = []
+    while len(pairs) < count and len(seen) < len(left_open) * len(right_open):
+      start = (left_open[int(rng.random() * len(left_open))], 0)
+      goal = (right_open[int(rng.random() * len(right_open))], self.cols-1)
+      if (start, goal) not in seen:
+        seen.add((start, goal))
+        pairs.append((start, goal))
+
+    starts_by_goal = {}
+    for start, goal in pairs:
+      starts_by_goal.setdefault(goal, []).append(start)
+    paths = {}
+    for goal, starts in starts_by_goal.items():
+      for start, path in zip(starts, self.jmap_gen.get_paths(starts, goal, self.dist_map)):
+        paths[(start, goal)] = path
+
+    found = [(start, goal, paths[(start, goal)]) for start, goal in pairs if paths[(start, goal)]]
+    if not found:
+      return []
+    metrics = path_metrics(self.fields, [path for start, goal, path in found])
+    return [(start, goal, path, metrics[i].tolist()) for i, (start, goal, path) in enumerate(found)]
+
+  # changes cells of the obstacle map and updates the C-space, metric fields, path, and metrics
+  # only where the change can reach (see IncrementalMetrics)
+  # add: list of (row, col) cells to fill, remove: list of (row, col) cells to clear
+  # returns a dict summarizing what was updated
+  def edit(self, add=(), remove=()):
+    if self.editor is None:
+      self.editor = IncrementalMetrics(self)
+    return self.editor.apply(add, remove)
+
+  # runs every stage, returns True if the world has a path
+  # with a cache, the stages are only run if the world is not cached yet, and the result is stored
+  def __call__(self):
+    if self.cache is not None:
+      found = self.cache.load_world(self)
+      if found is not None:
+        return found
+
+    found = self._run_stages()
+    if self.cache is not None:
+      self.cache.store_world(self)
+    return found
+
+  def _run_stages(self):
+    if not self.build():
+      return False
+
+    self.choose_points()
+    if not self.plan():
+      return False
+
+    self.measure()
+    return True
+
+  # writes the world, grids, path, metrics, and map files with the given index
+  # index: also write the ObstacleIndex of the cylinders, which holds every cylinder center in memory
+  # returns a dict with the name of each file written
+  def save(self, iteration, data_dir='test_data/', packed=False, index=True):
+    files = dict((part, os.path.join(data_dir, pattern % iteration)) for part, pattern in dataset_files.items())
+    if not index:
+      del files['index']
+
+    # write map to .world file
+    writer = StreamingWorldWriter(files['world'], self.obstacle_map, cyl_radius=cyl_radius, contain_wall_length=contain_wall_length,
+                                  index_file=files.get('index'))
+    contain_wall_cylinders = writer()
+    self.r_shift, self.c_shift = writer.get_shifts()
+
+    # save occupancy grid and C-space
+    files['grid'] = save_grid(files['grid'], self.obstacle_map, packed)
+    files['cspace'] = save_grid(files['cspace'], self.jackal_map, packed)
+
+    # save path and metrics
+    self.save_path(iteration, data_dir)
+
+    # write the map to a pgm file for navigation
+    pgm_writer = PGMWriter(self.obstacle_map, contain_wall_cylinders, files['pgm'])
+    pgm_writer()
+
+    # write map metadata to yaml file
+    yw = YamlWriter(files['yaml'], iteration, len(self.obstacle_map), cyl_radius)
+    yw.write()
+
+    return files
+
+  # writes only the path and metrics files with the given index, for a start/goal pair that shares the
+  # map files of another index
+  # returns a dict with the name of each file written
+  def save_path(self, iteration, data_dir='test_data/'):
+    files = dict((part, os.path.join(data_dir, dataset_files[part] % iteration)) for part in ['path', 'metrics'])
+    np.save(files['path'], np.asarray(self.path))
+    np.save(files['metrics'], np.asarray(self.metrics))
+    return files
+
+# returns copies of the obstacle map and C-space with the path drawn in for display
+# path cells are 0.35 (the whole robot footprint on the obstacle map), start and goal are 0.65
+def path_overlays(obstacle_map, jackal_map, path, robot_radius=jackal_radius):
+  rows, cols = len(obstacle_map), len(obstacle_map[0])
+  obstacle_map_with_path = [[obstacle_map[j][i] for i in range(cols)] for j in range(rows)]
+  jackal_map_with_path = [[jackal_map[j][i] for i in range(cols)] for j in range(rows)]
+  for r, c in path:
+    # update jackal-space path display
+    jackal_map_with_path[r][c] = 0.35
+
+    # update obstacle-space path display
+    for r_kernel in range(r - robot_radius, r + robot_radius + 1):
+      for c_kernel in range(c - robot_radius, c + robot_radius + 1):
+        if 0 <= r_kernel and r_kernel < rows and 0 <= c_kernel and c_kernel < cols:
+          obstacle_map_with_path[r_kernel][c_kernel] = 0.35
+
+  for r, c in [path[0], path[-1]]:
+    jackal_map_with_path[r][c] = 0.65
+    obstacle_map_with_path[r][c] = 0.65
+
+  return obstacle_map_with_path, jackal_map_with_path
+
 # class to display occupancy grid, path, C-space, and difficulty metrics
 class Display:
-  def __init__(self, map_with_path, jackal_map, jackal_map_with_path, dispersion_radius, path):
+  # fields: metric grids keyed by field_names (e.g. World.fields), computed here if not given
+  def __init__(self, map_with_path, jackal_map, jackal_map_with_path, dispersion_radius, path, fields=None):
     self.map_with_path = map_with_path
     self.jackal_map = jackal_map
     self.jackal_map_with_path = jackal_map_with_path
     self.dispersion_radius = dispersion_radius
-  
-    diff = DifficultyMetrics(jackal_map, path, dispersion_radius)
-    self.metrics = {
-      'closest_dist': diff.closest_wall(),
-      'avg_vis': diff.avg_visibility(),
-      'dispersion': diff.dispersion(),
-      'char_dimension': diff.characteristic_dimension(),
-    }
+
+    if fields is None:
+      fields = DifficultyMetrics(jackal_map, path, dispersion_radius).all_fields()
+    self.metrics = fields
 
   def __call__(self):
+    # imported here, so batch runs never load matplotlib or need a display
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(3, 3) # TODO: figure out why this is causing error
     
     # map and path
@@ -468,6 +809,8 @@ class Display:
 # class to get user input for cellular automaton parameters
 class Input:
   def __init__(self):
+    import tkinter as tk
+
     self.root = tk.Tk(className='Parameters')
 
     tk.Label(self.root, text='Seed').grid(row=0)
@@ -554,15 +897,8 @@ class Input:
     self.root.destroy()
     
 
-def main(iteration=0, seed=0, smooth_iter=4, fill_pct=.27, rows=30, cols=30, show_metrics=1):
-
-    world_file = 'test_data/world_files/world_%d.world' % iteration
-    grid_file = 'test_data/grid_files/grid_%d.npy' % iteration
-    cspace_file = 'test_data/cspace_files/cspace_%d.npy' % iteration
-    path_file = 'test_data/path_files/path_%d.npy' % iteration
-    diff_file = 'test_data/metrics_files/metrics_%d.npy' % iteration
-    pgm_file = 'test_data/map_files/map_pgm_%d.pgm' % iteration
-    yaml_file = 'test_data/map_files/yaml_%d.yaml' % iteration
+# packed: save the occupancy grid and C-space bit-packed, as .npz files
+def main(iteration=0, seed=0, smooth_iter=4, fill_pct=.27, rows=30, cols=30, show_metrics=1, packed=False):
 
     input_dict = { 'seed' : seed,
                   'smooth_iter': smooth_iter,
@@ -580,112 +916,41 @@ def main(iteration=0, seed=0, smooth_iter=4, fill_pct=.27, rows=30, cols=30, sho
 
     # create world generator and run smoothing iterations
     print('Seed: %d' % input_dict['seed'])
-    ob_map_gen = ObstacleMap(input_dict['rows'], input_dict['cols'], input_dict['fill_pct'], input_dict['seed'], input_dict['smooth_iter'])
-    ob_map_gen()
-
-    # get map from the obstacle map generator
-    obstacle_map = ob_map_gen.get_map()
-    
-    # generate jackal's map from the obstacle map
-    jmap_gen = JackalMap(obstacle_map, jackal_radius)
-    start_region = jmap_gen.biggest_left_region()
-    end_region = jmap_gen.biggest_right_region()
+    world = World(input_dict['seed'], input_dict['smooth_iter'], input_dict['fill_pct'], input_dict['rows'], input_dict['cols'])
 
     # throw out any maps that don't have a path
-    if not jmap_gen.regions_connected(start_region, end_region):
+    if not world.build():
       return
 
-    # get the final Jackal Map (C-space)
-    jackal_map = jmap_gen.get_map()
-
-    # write map to .world file
-    writer = WorldWriter(world_file, obstacle_map, cyl_radius=cyl_radius, contain_wall_length=contain_wall_length)
-    contain_wall_cylinders = writer()
-    r_shift, c_shift = writer.get_shifts()
-
     # choose random start and end points for path
-    left_open = []
-    right_open = []
-    for r in range(len(jackal_map)):
-      if start_region[r][0] == 1:
-        left_open.append(r)
-      if end_region[r][len(jackal_map[0])-1] == 1:
-        right_open.append(r)
-    left_coord_r = left_open[random.randint(0, len(left_open)-1)]
-    right_coord_r = right_open[random.randint(0, len(right_open)-1)]
-
+    world.choose_points()
+    left_coord_r = world.start[0]
+    right_coord_r = world.goal[0]
 
-    
     # generate path, if possible
-    path = []
-    diff_quant = DifficultyMetrics(jackal_map, path, disp_radius=3)
-    dist_map = diff_quant.closest_wall()
-    print('Points: (%d, 0), (%d, %d)' % (left_coord_r, right_coord_r, len(jackal_map[0])-1))
-    path = jmap_gen.get_path([(left_coord_r, 0), (right_coord_r, len(jackal_map[0])-1)], dist_map)
-
-    if not path:
+    print('Points: (%d, 0), (%d, %d)' % (left_coord_r, right_coord_r, world.cols-1))
+    if not world.plan():
       print('path not found')
       return # path not found, don't use this world
 
     print('Found path!')
 
+    # calculate metrics, then save the world, metrics, and map files
+    world.measure()
+    print(np.asarray(world.metrics))
+    world.save(iteration, packed=packed)
 
     # print start and end points in gazebo coords
-    start_r = r_shift + left_coord_r * cyl_radius * 2 # TODO: factor this out to variable
-    start_c = c_shift
-    end_r = r_shift + right_coord_r * cyl_radius * 2 # TODO: factor this out to variable
-    end_c = len(obstacle_map[0]) * cyl_radius * 2 + c_shift # TODO: factor this out to variable
+    start_r = world.r_shift + left_coord_r * cyl_radius * 2 # TODO: factor this out to variable
+    start_c = world.c_shift
+    end_r = world.r_shift + right_coord_r * cyl_radius * 2 # TODO: factor this out to variable
+    end_c = world.cols * cyl_radius * 2 + world.c_shift # TODO: factor this out to variable
     print('Start: (%f, %f) to Goal: (%f, %f)' % (start_r, start_c, end_r, end_c))
 
-    # put paths into matrices to display them
-    obstacle_map_with_path = [[obstacle_map[j][i] for i in range(len(obstacle_map[0]))] for j in range(len(obstacle_map))]
-    jackal_map_with_path = [[jackal_map[j][i] for i in range(len(jackal_map[0]))] for j in range(len(jackal_map))]
-    for r, c in path:
-      # update jackal-space path display
-      jackal_map_with_path[r][c] = 0.35
-
-      # update obstacle-space path display
-      for r_kernel in range(r - jackal_radius, r + jackal_radius + 1):
-        for c_kernel in range(c - jackal_radius, c + jackal_radius + 1):
-          if 0 <= r_kernel and r_kernel < rows and 0 <= c_kernel and c_kernel < cols:
-            obstacle_map_with_path[r_kernel][c_kernel] = 0.35
-
-
-    jackal_map_with_path[left_coord_r][0] = 0.65
-    jackal_map_with_path[right_coord_r][len(jackal_map[0])-1] = 0.65
-    obstacle_map_with_path[left_coord_r][0] = 0.65
-    obstacle_map_with_path[right_coord_r][len(obstacle_map[0])-1] = 0.65
-    
-    # save occupancy grid
-    grid_arr = np.asarray(obstacle_map)
-    np.save(grid_file, grid_arr)
-
-    # save C-space
-    cspace_grid = np.asarray(jackal_map)
-    np.save(cspace_file, cspace_grid)
-
-    # save path
-    path_arr = np.asarray(path)
-    np.save(path_file, path_arr)
-
-    # save metrics
-    diff = DifficultyMetrics(jackal_map, path, disp_radius=3)
-    metrics_arr = np.asarray(diff.avg_all_metrics())
-    print(metrics_arr)
-    np.save(diff_file, metrics_arr)
-
-
-    # write the map to a pgm file for navigation
-    pgm_writer = PGMWriter(obstacle_map, contain_wall_cylinders, pgm_file)
-    pgm_writer()
-
-    # write map metadata to yaml file
-    yw = YamlWriter(yaml_file, iteration)
-    yw.write()
-    
     # display world and heatmap of distances
     if input_dict['show_metrics']:
-      display = Display(obstacle_map_with_path, jackal_map, jackal_map_with_path, 3, path)
+      obstacle_map_with_path, jackal_map_with_path = path_overlays(world.obstacle_map, world.jackal_map, world.path)
+      display = Display(obstacle_map_with_path, world.jackal_map, jackal_map_with_path, world.disp_radius, world.path, world.fields)
       display()
    
     return True # path found
@@ -0,0 +1,208 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+import gen_world_ca
+import grid_ops
+from difficulty_quant import DifficultyMetrics
+
+# golden outputs of the cell-by-cell kernels on a corpus of seeded maps, for checking that a faster
+# engine gives the same results
+corpus_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'corpus.npz')
+
+# (seed, smooth_iter, fill_pct, rows, cols) of every map in the corpus
+corpus_cases = [(seed, smooth_iter, fill_pct, 30, 30)
+                for seed, (fill_pct, smooth_iter) in enumerate([(f, s) for f in [0.1, 0.2, 0.3, 0.4] for s in [2, 3, 4]] * 2, 1)]
+corpus_cases += [(201, 3, 0.2, 50, 50), (202, 4, 0.25, 40, 60), (203, 2, 0.3, 60, 40), (204, 5, 0.35, 50, 50)]
+
+robot_radius = gen_world_ca.jackal_radius
+disp_radius = 3
+
+# kernels an engine may provide, and whether their outputs must match exactly
+# every kernel takes the dict of one corpus map and returns an array
+exact_kernels = ['smooth', 'cspace', 'astar']
+float_kernels = ['closest_dist', 'avg_vis', 'dispersion', 'char_dimension']
+kernel_names = ['smooth', 'cspace'] + float_kernels + ['astar']
+
+# default tolerances for the floating-point kernels
+rtol = 1e-9
+atol = 1e-9
+
+
+def _rows(grid):
+  return np.asarray(grid).tolist()
+
+def _ref_smooth(case):
+  rows, cols = case['raw'].shape
+  obstacle_map = gen_world_ca.ObstacleMap(rows, cols, 0)
+  obstacle_map.map = _rows(case['raw'])
+  obstacle_map._smooth()
+  return np.asarray(obstacle_map.map)
+
+def _ref_cspace(case):
+  return np.asarray(gen_world_ca.JackalMap(_rows(case['grid']), robot_radius).get_map())
+
+def _ref_field(name):
+  def kernel(case):
+    diff = DifficultyMetrics(_rows(case['cspace']), [], disp_radius)
+    grids = {
+      'closest_dist': diff.closest_wall,
+      'avg_vis': diff.avg_visibility,
+      'dispersion': diff.dispersion,
+      'char_dimension': diff.characteristic_dimension,
+    }
+    return np.asarray(grids[name](), dtype=np.float64)
+  return kernel
+
+def _ref_astar(case):
+  a_star = gen_world_ca.AStarSearch(_rows(case['cspace']), case['infl_rad_cells'])
+  path = a_star(tuple(case['start']), tuple(case['goal']), _rows(case['closest_dist']))
+  return np.asarray(path if path else [], dtype=np.int64).reshape(-1, 2)
+
+# the current cell-by-cell implementations, which the corpus is recorded from
+reference_engine = {
+  'smooth': _ref_smooth,
+  'cspace': _ref_cspace,
+  'closest_dist': _ref_field('closest_dist'),
+  'avg_vis': _ref_field('avg_vis'),
+  'dispersion': _ref_field('dispersion'),
+  'char_dimension': _ref_field('char_dimension'),
+  'astar': _ref_astar,
+}
+
+# the vectorized kernels in grid_ops.py
+grid_ops_engine = {
+  'smooth': lambda case: grid_ops.smooth_step(case['raw'].astype(np.uint8)),
+  'cspace': lambda case: grid_ops.inflate(case['grid'], robot_radius),
+  'closest_dist': lambda case: grid_ops.distance_map(case['cspace'].astype(np.uint8)),
+}
+
+engines = {
+  'reference': reference_engine,
+  'grid_ops': grid_ops_engine,
+}
+
+
+# returns the start and goal for the A* kernel: the leftmost and rightmost cells of the largest open
+# region of the C-space, or None if the C-space has no open cell
+def _astar_points(cspace):
+  labels, sizes = grid_ops.label_regions(cspace.astype(np.uint8))
+  if len(sizes) < 2:
+    return None
+
+  rows, cols = np.nonzero(labels == np.argmax(sizes[1:]) + 1)
+  return (int(rows[np.argmin(cols)]), int(cols.min())), (int(rows[np.argmax(cols)]), int(cols.max()))
+
+# generates one corpus map and its golden outputs
+def record_case(case):
+  seed, smooth_iter, fill_pct, rows, cols = case
+  obstacle_map = gen_world_ca.ObstacleMap(rows, cols, fill_pct, seed, smooth_iter)
+  obstacle_map._random_fill()
+  raw = np.asarray(obstacle_map.map, dtype=np.uint8)
+  for n in range(smooth_iter):
+    obstacle_map._smooth()
+
+  jmap_gen = gen_world_ca.JackalMap(obstacle_map.map, robot_radius)
+  data = {
+    'case': np.asarray(case, dtype=np.float64),
+    'raw': raw,
+    'grid': np.asarray(obstacle_map.map, dtype=np.uint8),
+    'infl_rad_cells': np.float64(jmap_gen.infl_rad_cells),
+  }
+  data['smooth'] = _ref_smooth(data).astype(np.uint8)
+  data['cspace'] = _ref_cspace(data).astype(np.uint8)
+  for name in float_kernels:
+    data[name] = reference_engine[name](data)
+
+  points = _astar_points(data['cspace'])
+  data['start'], data['goal'] = [np.asarray(point) for point in (points or ((0, 0), (0, 0)))]
+  if points is not None:
+    data['astar'] = _ref_astar(data)
+  else:
+    data['astar'] = np.zeros((0, 2), dtype=np.int64)
+
+  return data
+
+# records the golden outputs of every corpus map to corpus_file
+def record(filename=corpus_file):
+  arrays = {}
+  for num, case in enumerate(corpus_cases):
+    for key, value in record_case(case).items():
+      arrays['%d/%s' % (num, key)] = value
+
+  folder = os.path.dirname(filename)
+  if not os.path.isdir(folder):
+    os.makedirs(folder)
+  np.savez_compressed(filename, **arrays)
+  print('recorded %d maps to %s' % (len(corpus_cases), filename))
+
+# loads the corpus as a list of dicts, one per map
+def load_corpus(filename=corpus_file):
+  corpus = {}
+  with np.load(filename) as data:
+    for key in data.files:
+      num, name = key.split('/', 1)
+      corpus.setdefault(int(num), {})[name] = data[key]
+
+  return [corpus[num] for num in sorted(corpus)]
+
+# returns True if an output matches the golden one: exactly for grids and paths, within the
+# tolerances for floating-point metrics
+def matches(name, expected, actual, rtol=rtol, atol=atol):
+  actual = np.asarray(actual)
+  if actual.shape != expected.shape:
+    return False
+  if name in exact_kernels:
+    return bool(np.array_equal(expected, actual))
+  return bool(np.allclose(expected, actual, rtol=rtol, atol=atol))
+
+# runs every kernel of an engine on the whole corpus and compares with the golden outputs
+# engine: name in engines, or a dict of kernel name to function
+# returns a dict per kernel with the maps that failed and the total time spent in the kernel
+def check(engine, filename=corpus_file, rtol=rtol, atol=atol):
+  kernels = engines[engine] if not isinstance(engine, dict) else engine
+  unknown = [name for name in kernels if name not in kernel_names]
+  if unknown:
+    raise Exception('Unknown kernels %s' % ', '.join(unknown))
+
+  corpus = load_corpus(filename)
+  report = {}
+  for name in kernel_names:
+    if name not in kernels:
+      continue
+
+    failed = []
+    elapsed = 0.0
+    for num, case in enumerate(corpus):
+      start = time.time()
+      actual = kernels[name](case)
+      elapsed += time.time() - start
+      if not matches(name, case[name], actual, rtol, atol):
+        failed.append(num)
+
+    report[name] = {'failed': failed, 'time': elapsed, 'maps': len(corpus)}
+
+  return report
+
+# prints a check report, with the speedup over the reference engine if it is given
+def print_report(report, reference_report=None):
+  for name in kernel_names:
+    if name not in report:
+      continue
+    result = report[name]
+    status = 'ok' if not result['failed'] else 'FAILED on maps %s' % result['failed']
+    line = '%-15s %8.1f ms' % (name, 1000 * result['time'])
+    if reference_report is not None and result['time'] > 0:
+      line += ' %7.1fx' % (reference_report[name]['time'] / result['time'])
+    print('%s  %s' % (line, status))
+
+if __name__ == "__main__":
+  if len(sys.argv) > 1 and sys.argv[1] == 'record':
+    record()
+  else:
+    name = sys.argv[1] if len(sys.argv) > 1 else 'grid_ops'
+    report = check(name)
+    print_report(report, check('reference') if name != 'reference' else None)
+    sys.exit(1 if any(result['failed'] for result in report.values()) else 0)
@@ -0,0 +1,236 @@
+import numpy as np
+
+# vectorized kernels on occupancy grids stored as uint8 NumPy arrays
+# every kernel reproduces the cell-by-cell code in gen_world_ca.py and difficulty_quant.py exactly,
+# and only looks at the cells it is given, so it can be run on a tile plus its halo
+
+
+# returns the number of filled neighbors (neighborhood of 8) of every cell
+# like ObstacleMap._tile_neighbors, cells above the top row and below the bottom row count as walls
+# and cells past the left and right columns count as empty
+# wall_top / wall_bottom say whether the first / last row of grid is the real edge of the map
+def neighbor_counts(grid, wall_top=True, wall_bottom=True):
+  rows, cols = grid.shape
+  padded = np.zeros((rows + 2, cols + 2), dtype=np.uint8)
+  padded[1:-1, 1:-1] = grid
+  if wall_top:
+    padded[0, :] = 1
+  if wall_bottom:
+    padded[-1, :] = 1
+
+  counts = np.zeros((rows, cols), dtype=np.uint8)
+  for dr in range(3):
+    for dc in range(3):
+      if dr != 1 or dc != 1:
+        counts += padded[dr:dr + rows, dc:dc + cols]
+
+  return counts
+
+# runs one smoothing iteration with fill threshold of 5 and clear threshold of 1,
+# the same rule as ObstacleMap._smooth
+def smooth_step(grid, wall_top=True, wall_bottom=True):
+  counts = neighbor_counts(grid, wall_top, wall_bottom)
+  newmap = grid.copy()
+  newmap[counts >= 5] = 1
+  newmap[counts <= 1] = 0
+  return newmap
+
+# boundary modes of pad_grid: what the cells past the edges of the map are taken to be
+# walls: filled above the top row and below the bottom row, empty past the left and right columns
+# (the convention of neighbor_counts); empty / filled: all empty / all filled; wrap: the opposite
+# edge, as on a torus; mirror: the edge cells reflected outward
+boundary_modes = ['walls', 'empty', 'filled', 'wrap', 'mirror']
+
+# returns grid padded by radius cells on every side, following a boundary mode
+# wall_top / wall_bottom are as in neighbor_counts, for the walls mode
+def pad_grid(grid, radius, boundary='walls', wall_top=True, wall_bottom=True):
+  if boundary == 'wrap':
+    return np.pad(grid, radius, mode='wrap')
+  if boundary == 'mirror':
+    return np.pad(grid, radius, mode='symmetric')
+  if boundary not in boundary_modes:
+    raise Exception('Unknown boundary mode %s' % boundary)
+
+  padded = np.pad(grid, radius, mode='constant', constant_values=1 if boundary == 'filled' else 0)
+  if boundary == 'walls' and radius > 0:
+    if wall_top:
+      padded[:radius, :] = 1
+    if wall_bottom:
+      padded[-radius:, :] = 1
+  return padded
+
+# returns the number of filled cells around every cell, not counting the cell itself (int32)
+# neighborhood: 'moore' for the square of side 2 * radius + 1, 'von_neumann' for the diamond of cells
+# with |dr| + |dc| <= radius
+# each row of the neighborhood is one subtraction of running sums along the rows, so the cost grows
+# with the radius, not with the number of cells in the neighborhood
+# with the defaults, the counts are the same as neighbor_counts
+def window_counts(grid, radius=1, neighborhood='moore', boundary='walls', wall_top=True, wall_bottom=True):
+  if neighborhood not in ['moore', 'von_neumann']:
+    raise Exception('Unknown neighborhood %s' % neighborhood)
+
+  rows, cols = grid.shape
+  padded = pad_grid(grid, radius, boundary, wall_top, wall_bottom)
+  sums = np.zeros((rows + 2 * radius, cols + 2 * radius + 1), dtype=np.int32)
+  np.cumsum(padded, axis=1, dtype=np.int32, out=sums[:, 1:])
+
+  counts = np.zeros((rows, cols), dtype=np.int32)
+  for dr in range(-radius, radius + 1):
+    half = radius if neighborhood == 'moore' else radius - abs(dr)
+    band = sums[radius + dr:radius + dr + rows]
+    counts += band[:, radius + half + 1:radius + half + 1 + cols]
+    counts -= band[:, radius - half:radius - half + cols]
+
+  counts -= grid
+  return counts
+
+# marks every cell within radius cells (square neighborhood) of an obstacle,
+# the same result as JackalMap._jmap_from_obs_map
+def inflate(grid, radius):
+  rows, cols = grid.shape
+  grid = grid.astype(np.uint8)
+
+  # the square kernel is separable: dilate along the rows, then along the columns
+  horiz = grid.copy()
+  for d in range(1, radius + 1):
+    if d >= cols:
+      break
+    np.maximum(horiz[:, d:], grid[:, :-d], out=horiz[:, d:])
+    np.maximum(horiz[:, :-d], grid[:, d:], out=horiz[:, :-d])
+
+  result = horiz.copy()
+  for d in range(1, radius + 1):
+    if d >= rows:
+      break
+    np.maximum(result[d:, :], horiz[:-d, :], out=result[d:, :])
+    np.maximum(result[:-d, :], horiz[d:, :], out=result[:-d, :])
+
+  return result
+
+# sentinel for columns without any obstacle
+no_obstacle = np.iinfo(np.int32).max // 4
+
+# returns the vertical distance from each cell to the closest obstacle in the same column
+# prev_up carries the distance to the last obstacle above the first row, so the grid can be
+# processed in bands of rows; returns the distances and the carry for the next band
+def column_distance_down(grid, prev_up=None):
+  rows, cols = grid.shape
+  up = np.empty((rows, cols), dtype=np.int32)
+  last = np.full(cols, no_obstacle, dtype=np.int32) if prev_up is None else prev_up
+  for r in range(rows):
+    last = np.where(grid[r] == 1, 0, np.minimum(last + 1, no_obstacle)).astype(np.int32)
+    up[r] = last
+
+  return up, last
+
+# same as column_distance_down, scanning from the bottom row upward
+def column_distance_up(grid, prev_down=None):
+  down, last = column_distance_down(grid[::-1], prev_down)
+  return down[::-1], last
+
+# exact Euclidean distance to the closest obstacle, given the vertical distances in each column
+# takes the minimum of (vertical distance)^2 + (horizontal offset)^2 over growing offsets,
+# and stops as soon as no offset can beat the current answer for any cell
+def row_envelope(vert):
+  rows, cols = vert.shape
+  vert = vert.astype(np.int64)
+  best = np.where(vert >= no_obstacle, no_obstacle, vert * vert)
+
+  d = 1
+  while d < cols:
+    finite = best[best < no_obstacle]
+    if finite.size == best.size and d * d >= finite.max():
+      break
+
+    shifted = vert[:, d:] * vert[:, d:] + d * d
+    np.minimum(best[:, :-d], np.where(vert[:, d:] >= no_obstacle, no_obstacle, shifted), out=best[:, :-d])
+    shifted = vert[:, :-d] * vert[:, :-d] + d * d
+    np.minimum(best[:, d:], np.where(vert[:, :-d] >= no_obstacle, no_obstacle, shifted), out=best[:, d:])
+    d += 1
+
+  return best
+
+# returns grid with the distance to closest obstacle at each point,
+# the same values as DifficultyMetrics.closest_wall
+def distance_map(grid):
+  rows = grid.shape[0]
+  up, _ = column_distance_down(grid)
+  down, _ = column_distance_up(grid)
+  sq = row_envelope(np.minimum(up, down))
+  return sq_to_distance(sq, rows)
+
+# converts squared distances to distances
+# cells with no obstacle anywhere in the map fall back to half the board, like _dist_closest_wall
+def sq_to_distance(sq, rows):
+  dists = np.sqrt(sq.astype(np.float64))
+  dists[sq >= no_obstacle] = (rows - 1) // 2
+  return dists
+
+# labels the 4-connected open regions of grid (cells equal to 0)
+# works one row at a time on runs of open cells, so grid may be a memory-mapped array
+# labels: output array of the same shape (int32), 0 for walls and 1..n for the regions
+# returns the region sizes indexed by label (sizes[0] is unused)
+def label_regions(grid, labels=None):
+  rows, cols = grid.shape
+  if labels is None:
+    labels = np.zeros((rows, cols), dtype=np.int32)
+
+  parent = [0]
+  sizes = [0]
+
+  def find(x):
+    while parent[x] != x:
+      parent[x] = parent[parent[x]]
+      x = parent[x]
+    return x
+
+  # first pass: give every run a provisional label and join runs that touch the run above
+  run_rows = []
+  prev_starts = prev_ends = prev_ids = None
+  for r in range(rows):
+    open_row = np.concatenate(([0], (np.asarray(grid[r]) == 0).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(open_row))
+    starts, ends = edges[0::2], edges[1::2]
+    ids = np.arange(len(parent), len(parent) + len(starts))
+    parent.extend(ids.tolist())
+    sizes.extend((ends - starts).tolist())
+
+    if prev_starts is not None and len(starts) and len(prev_starts):
+      # runs overlap if each one starts before the other ends
+      lo = np.searchsorted(prev_ends, starts, side='right')
+      hi = np.searchsorted(prev_starts, ends, side='left')
+      for i in range(len(starts)):
+        for j in range(lo[i], hi[i]):
+          a, b = find(ids[i]), find(prev_ids[j])
+          if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    run_rows.append((starts, ends, ids))
+    prev_starts, prev_ends, prev_ids = starts, ends, ids
+
+  # resolve provisional labels to consecutive region labels, numbered in row-major order
+  roots = np.array([find(x) for x in range(len(parent))], dtype=np.int64)
+  _, first, compact = np.unique(roots[1:], return_index=True, return_inverse=True)
+  order = np.argsort(np.argsort(first))
+  final = np.concatenate(([0], order[compact] + 1)).astype(np.int32)
+  region_sizes = np.bincount(final, weights=np.asarray(sizes, dtype=np.float64)).astype(np.int64)
+
+  # second pass: write the labels
+  for r in range(rows):
+    starts, ends, ids = run_rows[r]
+    row = np.zeros(cols, dtype=np.int32)
+    for s, e, i in zip(starts, ends, ids):
+      row[s:e] = final[i]
+    labels[r] = row
+
+  return labels, region_sizes
+
+# returns the label of the largest region touching the given column, or 0 if there is none
+# ties go to the region seen first from the top, like JackalMap.biggest_left_region
+def biggest_region_in_column(labels, sizes, col):
+  best, best_size = 0, 0
+  for label in np.asarray(labels[:, col]):
+    if label and sizes[label] > best_size:
+      best, best_size = label, sizes[label]
+
+  return best
@@ -0,0 +1,168 @@
+import numpy as np
+
+from difficulty_quant import DifficultyMetrics, field_names
+
+# class to keep a world's C-space, metric fields, path, and metrics up to date through small edits
+# to the obstacle map, recomputing only the cells an edit can affect:
+# - C-space: cells within robot_radius of an edited obstacle cell
+# - distance to closest obstacle: cells at least as close to a changed C-space cell as to their old
+#   closest obstacle
+# - average visibility and characteristic dimension: cells on the row, column, or diagonals through
+#   a changed C-space cell, since both look along straight lines
+# - dispersion: cells within 2 * disp_radius of a changed C-space cell, since the in-between axes with
+#   a negative step of 2 are counted as single steps and so reach that far
+# the path is planned again, between the same start and goal, whenever the C-space changed: a cell
+# that opened or closed anywhere, or a wall penalty that moved with it, can change which path is the
+# cheapest, so the result matches planning the edited world from scratch (see check)
+class IncrementalMetrics:
+  # world: gen_world_ca.World that has been built and planned
+  def __init__(self, world):
+    self.world = world
+    self.diff = DifficultyMetrics(world.jackal_map, world.path or [], world.disp_radius)
+    if world.fields is None:
+      world.compute_fields()
+
+  # sets the cells in add to obstacles and the cells in remove to open space, then updates everything
+  # returns a dict summarizing the update
+  def apply(self, add=(), remove=()):
+    world = self.world
+    edited = []
+    for cells, value in [(add, 1), (remove, 0)]:
+      for r, c in cells:
+        if world.obstacle_map[r][c] != value:
+          world.obstacle_map[r][c] = value
+          edited.append((r, c))
+
+    changed = self._update_cspace(edited)
+    fields = world.fields
+    old_dists = np.asarray(fields['closest_dist'], dtype=np.float64)
+
+    dist_cells = self._distance_cells(changed, old_dists)
+    line_cells = self._line_cells(changed)
+    window_cells = self._window_cells(changed, 2 * world.disp_radius)
+
+    for r, c in dist_cells:
+      fields['closest_dist'][r][c] = self.diff._dist_closest_wall(r, c)
+
+    for r, c in line_cells:
+      fields['avg_vis'][r][c] = self.diff._avg_vis_cell(r, c)
+      fields['char_dimension'][r][c] = self.diff._char_dim_cell(r, c)
+
+    for r, c in window_cells:
+      fields['dispersion'][r][c] = self.diff._cell_dispersion(r, c, world.disp_radius)
+
+    replanned = bool(changed)
+    if replanned:
+      self._replan()
+    self._update_metrics()
+
+    return {
+      'obstacles_changed': len(edited),
+      'cspace_changed': len(changed),
+      'dist_cells': len(dist_cells),
+      'line_cells': len(line_cells),
+      'window_cells': len(window_cells),
+      'replanned': replanned,
+      'path_found': bool(world.path),
+    }
+
+  # updates the C-space around the edited cells, returns the C-space cells that changed
+  def _update_cspace(self, edited):
+    world = self.world
+    radius = world.robot_radius
+    around = self._window_cells(edited, radius)
+
+    changed = []
+    for r, c in sorted(around):
+      value = 0 if world.jmap_gen._open(r, c, radius) else 1
+      if world.jackal_map[r][c] != value:
+        world.jackal_map[r][c] = value
+        changed.append((r, c))
+
+    return changed
+
+  # cells within radius (square neighborhood) of any of the given cells
+  def _window_cells(self, cells, radius):
+    rows, cols = self.world.rows, self.world.cols
+    result = set()
+    for r, c in cells:
+      for i in range(max(r - radius, 0), min(r + radius + 1, rows)):
+        for j in range(max(c - radius, 0), min(c + radius + 1, cols)):
+          result.add((i, j))
+
+    return result
+
+  # cells on the row, column, and both diagonals through any of the given cells
+  def _line_cells(self, cells):
+    rows, cols = self.world.rows, self.world.cols
+    result = set()
+    for r, c in cells:
+      for j in range(cols):
+        result.add((r, j))
+      for i in range(rows):
+        result.add((i, c))
+        for j in (c + (i - r), c - (i - r)):
+          if 0 <= j < cols:
+            result.add((i, j))
+
+    return result
+
+  # cells whose closest obstacle could be one of the changed cells, before or after the edit
+  def _distance_cells(self, changed, old_dists):
+    rows, cols = old_dists.shape
+    r_idx, c_idx = np.mgrid[0:rows, 0:cols]
+    mask = np.zeros((rows, cols), dtype=bool)
+    for r, c in changed:
+      mask |= (r_idx - r) ** 2 + (c_idx - c) ** 2 <= old_dists ** 2 + 1e-9
+
+    return [(int(r), int(c)) for r, c in zip(*np.nonzero(mask))]
+
+  # plans a new path between the same start and goal, if they are still open
+  def _replan(self):
+    world = self.world
+    start, goal = world.start, world.goal
+    if world.jackal_map[start[0]][start[1]] == 1 or world.jackal_map[goal[0]][goal[1]] == 1:
+      world.path = None
+    else:
+      world.path = world.jmap_gen.get_path([start, goal], world.dist_map, world.search_mode, world.search_weight)
+
+  # recomputes the path metrics from the fields
+  def _update_metrics(self):
+    world = self.world
+    if not world.path:
+      world.metrics = None
+      return
+
+    self.diff.path = world.path
+    world.metrics = self.diff.avg_metrics_from_fields(world.fields)
+
+  # recomputes the C-space, fields, path, and metrics of the edited world from scratch, with the same
+  # start and goal, and returns the names of the ones that differ from the incremental results
+  def check(self):
+    from gen_world_ca import JackalMap
+    world = self.world
+    jmap_gen = JackalMap(world.obstacle_map, world.robot_radius)
+    jackal_map = jmap_gen.get_map()
+    diff = DifficultyMetrics(jackal_map, [], world.disp_radius)
+    fields = diff.all_fields()
+
+    path = None
+    start, goal = world.start, world.goal
+    if jackal_map[start[0]][start[1]] == 0 and jackal_map[goal[0]][goal[1]] == 0:
+      path = jmap_gen.get_path([start, goal], fields['closest_dist'], world.search_mode, world.search_weight)
+    metrics = None
+    if path:
+      diff.path = path
+      metrics = diff.avg_all_metrics()
+
+    mismatched = []
+    if jackal_map != world.jackal_map:
+      mismatched.append('jackal_map')
+    for name in field_names:
+      if not np.allclose(fields[name], world.fields[name]):
+        mismatched.append(name)
+    if (path or None) != (world.path or None):
+      mismatched.append('path')
+    if (metrics is None) != (world.metrics is None) or (metrics is not None and not np.allclose(metrics, world.metrics)):
+      mismatched.append('metrics')
+    return mismatched
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+
+# class to record which worlds of a dataset are complete
+# a world is committed only after all of its files are written and synced, by rewriting the manifest
+# to a temporary file and renaming it over the old one, so the manifest on disk always lists exactly
+# the finished worlds; any other file in the dataset folders is left over from an interrupted or
+# earlier run
+class Manifest:
+  # filename: JSON file holding the manifest
+  def __init__(self, filename):
+    self.filename = filename
+    self.worlds = {}
+    self.state = {}
+
+    if os.path.exists(filename):
+      with open(filename) as f:
+        data = json.load(f)
+      self.worlds = dict((int(index), entry) for index, entry in data['worlds'].items())
+      self.state = data['state']
+
+  # records a finished world and writes the manifest
+  # index: dataset index of the world
+  # params: generation parameters
+  # files: dict of the files written for the world
+  # metrics: the world's metrics, stored for convenience
+  # state: if given, replaces the caller's saved state (e.g. scheduler progress) in the same write
+  def commit(self, index, params, files, metrics=None, state=None):
+    self.worlds[index] = {
+      'params': params,
+      'seed': params.get('seed'),
+      'files': files,
+      'sha256': dict((part, file_checksum(name)) for part, name in files.items()),
+      'metrics': None if metrics is None else [float(m) for m in metrics],
+    }
+    if state is not None:
+      self.state = state
+    self.write()
+
+  # removes a world, so it will be generated again
+  def discard(self, index):
+    self.worlds.pop(index, None)
+
+  def is_committed(self, index):
+    return index in self.worlds
+
+  # returns the largest committed index, or -1 if nothing is committed
+  def last_index(self):
+    return max(self.worlds) if self.worlds else -1
+
+  # returns the indices of committed worlds whose files are missing or have changed
+  def verify(self):
+    bad = []
+    for index, entry in sorted(self.worlds.items()):
+      for part, name in entry['files'].items():
+        if not os.path.exists(name) or file_checksum(name, sync=False) != entry['sha256'][part]:
+          bad.append(index)
+          break
+
+    return bad
+
+  # writes the manifest atomically
+  def write(self):
+    data = {
+      'state': self.state,
+      'worlds': dict((str(index), entry) for index, entry in self.worlds.items()),
+    }
+
+    tmp_file = self.filename + '.tmp'
+    with open(tmp_file, 'w') as f:
+      json.dump(data, f, indent=1, sort_keys=True)
+      f.flush()
+      os.fsync(f.fileno())
+    os.rename(tmp_file, self.filename)
+
+
+# returns the SHA-256 of a file
+# if sync, the file is flushed to disk first, so a committed world survives a machine going down
+def file_checksum(filename, sync=True):
+  digest = hashlib.sha256()
+  with open(filename, 'rb') as f:
+    if sync:
+      os.fsync(f.fileno())
+    for block in iter(lambda: f.read(1 << 16), b''):
+      digest.update(block)
+
+  return digest.hexdigest()
@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from occupancy import as_rows, load_grid
+
+# file names of the map_server files, relative to the dataset directory
+pgm_file = 'map_files/map_pgm_%d.pgm'
+yaml_file = 'map_files/yaml_%d.yaml'
+
+# template of the map_server .yaml files
+template_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yaml_template.txt')
+
+# open columns added past the last column of every .pgm image
+open_columns = 3
+
+_template = []
+
+# returns the .yaml template, read once; trailing whitespace is dropped, as the files never had a
+# final newline
+def yaml_template():
+  if not _template:
+    with open(template_file) as f:
+      _template.append(f.read().rstrip())
+  return _template[0]
+
+# meters per pixel of the .pgm images: every pixel is one cylinder of the .world file
+def map_resolution(cyl_radius):
+  return cyl_radius * 2
+
+# map_server origin (x, y, yaw) of a map with the given number of rows, which puts the image where
+# the .world file puts the cylinders
+def map_origin(rows, cyl_radius):
+  return -rows * map_resolution(cyl_radius), 0.0, 0
+
+# number of cylinders in the containment wall, as returned by WorldWriter
+def contain_wall_cylinders(cyl_radius, contain_wall_length):
+  return int(contain_wall_length / (cyl_radius * 2))
+
+# writes a float without the rounding noise of the multiplications above, e.g. 0.15 and -4.5
+def _number(value):
+  return repr(round(value, 9)) if isinstance(value, float) else str(value)
+
+# returns the contents of the .yaml file of a map
+# image: name of the .pgm file, relative to the .yaml file
+def yaml_text(image, rows, cyl_radius):
+  origin = map_origin(rows, cyl_radius)
+  return yaml_template() % ((image, _number(map_resolution(cyl_radius))) + tuple(_number(v) for v in origin))
+
+# returns the .pgm images of a stack of occupancy grids of the same shape, as an n x height x width
+# uint8 array, the same pixels PGMWriter writes
+# the image is the map turned a quarter turn: one line per column, from the last column to the
+# containment wall at the first, followed by open_columns open lines at the top; walls are 0, open is 255
+def pgm_images(grids, contain_wall_cylinders):
+  grids = np.asarray(grids)
+  if grids.ndim == 2:
+    grids = grids[None]
+  n, rows, cols = grids.shape
+
+  # (n, rows, contain + cols), columns in map order with the containment wall in front
+  full = np.full((n, rows, contain_wall_cylinders + cols), 255, dtype=np.uint8)
+  full[:, :, contain_wall_cylinders:][grids == 1] = 0
+  if contain_wall_cylinders:
+    full[:, [0, rows - 1], :contain_wall_cylinders] = 0
+    full[:, :, 0] = 0
+
+  images = np.full((n, open_columns + contain_wall_cylinders + cols, rows), 255, dtype=np.uint8)
+  images[:, open_columns:, :] = full[:, :, ::-1].transpose(0, 2, 1)
+  return images
+
+# returns the header of a .pgm image, formatted like PGMWriter's
+def pgm_header(image):
+  height, width = image.shape
+  return ('P5\n%d  %d  255\n' % (width, height)).encode('ascii')
+
+# returns the whole .pgm file of one occupancy grid
+def pgm_bytes(grid, contain_wall_cylinders):
+  image = pgm_images(np.asarray(as_rows(grid)), contain_wall_cylinders)[0]
+  return pgm_header(image) + image.tobytes()
+
+# writes the .pgm and .yaml files of a stack of occupancy grids of the same shape
+# every file is put together in memory and written with one call
+def write_maps(grids, pgm_files, yaml_files, cyl_radius, contain_wall_length):
+  images = pgm_images(grids, contain_wall_cylinders(cyl_radius, contain_wall_length))
+  rows = images.shape[2]
+  for image, pgm_name, yaml_name in zip(images, pgm_files, yaml_files):
+    with open(pgm_name, 'wb') as f:
+      f.write(pgm_header(image) + image.tobytes())
+    with open(yaml_name, 'w') as f:
+      f.write(yaml_text(os.path.basename(pgm_name), rows, cyl_radius))
+
+# writes the map files of one chunk of a dataset, grouping the grids by shape
+# args: (data_dir, indices, cyl_radius, contain_wall_length); defined at module level so that pool
+# workers can run it
+def _export_chunk(args):
+  data_dir, indices, cyl_radius, contain_wall_length = args
+  by_shape = {}
+  for i in indices:
+    grid = np.asarray(load_grid(os.path.join(data_dir, 'grid_files/grid_%d.npy' % i)), dtype=np.uint8)
+    by_shape.setdefault(grid.shape, []).append((i, grid))
+
+  for group in by_shape.values():
+    write_maps(np.stack([grid for i, grid in group]),
+               [os.path.join(data_dir, pgm_file % i) for i, grid in group],
+               [os.path.join(data_dir, yaml_file % i) for i, grid in group],
+               cyl_radius, contain_wall_length)
+  return len(indices)
+
+# rewrites the map_server files of a dataset from its occupancy grids, with the resolution and origin
+# of every map computed from cyl_radius and its rows
+# the indices are split into chunks, one pool task each, and each chunk is converted in one batch
+# returns the number of maps written
+def export_dataset(data_dir, indices, cyl_radius, contain_wall_length, workers=1, chunk_size=64):
+  folder = os.path.join(data_dir, os.path.dirname(pgm_file))
+  if not os.path.isdir(folder):
+    os.makedirs(folder)
+
+  indices = list(indices)
+  tasks = [(data_dir, indices[i:i + chunk_size], cyl_radius, contain_wall_length)
+           for i in range(0, len(indices), chunk_size)]
+  if workers <= 1 or len(tasks) <= 1:
+    return sum(_export_chunk(task) for task in tasks)
+
+  pool = multiprocessing.Pool(min(workers, len(tasks)))
+  try:
+    return sum(pool.map(_export_chunk, tasks))
+  finally:
+    pool.close()
+    pool.join()
@@ -45,10 +45,9 @@ def save_norm_metrics(dir_name, metrics_arr):
     np.save(dir_name + file_name % i, metrics_arr[i])
 
 # loads all metrics files, normalizes metrics, and saves to directory
-def main():
-  num_files = 300
-  metrics_dir = 'test_data/metrics_files/'
-  norm_metrics_dir = 'test_data/norm_metrics_files/'
+def main(num_files=300, data_dir='test_data/'):
+  metrics_dir = data_dir + 'metrics_files/'
+  norm_metrics_dir = data_dir + 'norm_metrics_files/'
   
   # load files
   dataset_arr = load_metrics(metrics_dir, num_files)
@@ -0,0 +1,128 @@
+import numpy as np
+
+# kinds of cylinders, as stored in ObstacleIndex.kinds
+WALL = 0
+OBSTACLE = 1
+
+# default bucket side, in cylinder diameters
+bucket_cylinders = 8
+
+# class to find the cylinders of a Gazebo world near a point, without scanning them all
+# the cylinder centers, in world coordinates, are hashed into a uniform grid of square buckets; bucket
+# b = ix * shape[1] + iy holds the cylinders order[starts[b]:starts[b + 1]], so the buckets of one ix
+# and a range of iy are one slice of order, and the whole index is a few flat arrays saved in one .npz
+# cylinder ids are the numbers of the cylinders in the .world file
+class ObstacleIndex:
+  # centers: (x, y) of every cylinder, in the order they were written
+  # radius: cylinder radius
+  # kinds: WALL or OBSTACLE for every cylinder, or None
+  # cell_size: side of the buckets, bucket_cylinders cylinder diameters by default
+  def __init__(self, centers, radius, kinds=None, cell_size=None):
+    self.centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    self.radius = float(radius)
+    self.kinds = np.full(len(self.centers), OBSTACLE, dtype=np.uint8) if kinds is None else np.asarray(kinds, dtype=np.uint8)
+    self.cell_size = float(cell_size or bucket_cylinders * 2 * radius)
+
+    if len(self.centers):
+      self.origin = self.centers.min(axis=0)
+      self.shape = tuple(int(n) for n in ((self.centers.max(axis=0) - self.origin) // self.cell_size).astype(np.int64) + 1)
+    else:
+      self.origin = np.zeros(2)
+      self.shape = (1, 1)
+
+    buckets = self._bucket_ids(self.centers)
+    self.order = np.argsort(buckets, kind='mergesort').astype(np.int64)
+    self.starts = np.searchsorted(buckets[self.order], np.arange(self.shape[0] * self.shape[1] + 1)).astype(np.int64)
+
+  # returns the index of the cylinders written by a WorldWriter, from its cylinder_list
+  @classmethod
+  def from_cylinder_list(cls, cylinder_list, radius, kinds=None):
+    return cls([(cyl[0], cyl[1]) for cyl in cylinder_list], radius, kinds)
+
+  def __len__(self):
+    return len(self.centers)
+
+  def _bucket_coords(self, points):
+    return ((points - self.origin) // self.cell_size).astype(np.int64)
+
+  def _bucket_ids(self, points):
+    coords = self._bucket_coords(points)
+    return coords[:, 0] * self.shape[1] + coords[:, 1]
+
+  # returns the ids of the cylinders in the buckets that overlap a box, a superset of the cylinders
+  # whose centers are in the box
+  def _candidates(self, x_min, x_max, y_min, y_max):
+    low = self._bucket_coords(np.asarray([[x_min, y_min]]))[0]
+    high = self._bucket_coords(np.asarray([[x_max, y_max]]))[0]
+    ix0, iy0 = max(low[0], 0), max(low[1], 0)
+    ix1, iy1 = min(high[0], self.shape[0] - 1), min(high[1], self.shape[1] - 1)
+    if ix0 > ix1 or iy0 > iy1:
+      return np.zeros(0, dtype=np.int64)
+
+    slices = [self.order[self.starts[ix * self.shape[1] + iy0]:self.starts[ix * self.shape[1] + iy1 + 1]]
+              for ix in range(ix0, ix1 + 1)]
+    return np.concatenate(slices)
+
+  # returns the ids of the cylinders whose centers are in the box, in increasing order
+  def in_box(self, x_min, x_max, y_min, y_max):
+    ids = self._candidates(x_min, x_max, y_min, y_max)
+    x, y = self.centers[ids, 0], self.centers[ids, 1]
+    return np.sort(ids[(x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)])
+
+  # returns the ids of the cylinders within distance of (x, y) and their distances, closest first
+  # distances are to the centers, or to the cylinder surfaces (0 inside a cylinder) if surface is set
+  def within(self, x, y, distance, surface=False):
+    reach = distance + (self.radius if surface else 0.0)
+    ids = self._candidates(x - reach, x + reach, y - reach, y + reach)
+    dists = np.hypot(self.centers[ids, 0] - x, self.centers[ids, 1] - y)
+    if surface:
+      dists = np.maximum(dists - self.radius, 0.0)
+    keep = dists <= distance
+    ids, dists = ids[keep], dists[keep]
+    order = np.lexsort((ids, dists))
+    return ids[order], dists[order]
+
+  # returns the ids of the k cylinders with the closest centers to (x, y) and their distances,
+  # closest first; the search box doubles until it holds k cylinders within its half-width
+  def nearest(self, x, y, k=1):
+    k = min(k, len(self))
+    if k == 0:
+      return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    # once the box covers every bucket and the point, every cylinder is a candidate
+    extent = np.hypot(*(np.asarray(self.shape) * self.cell_size)) + np.hypot(*(np.asarray([x, y]) - self.origin))
+    reach = self.cell_size
+    while True:
+      ids, dists = self.within(x, y, reach)
+      if len(ids) >= k or reach > extent:
+        return ids[:k], dists[:k]
+      reach *= 2
+
+  # returns the distance from (x, y) to the surface of the closest cylinder (0 inside one), or None if
+  # the world has no cylinders
+  def clearance(self, x, y):
+    ids, dists = self.nearest(x, y)
+    if not len(ids):
+      return None
+    return max(float(dists[0]) - self.radius, 0.0)
+
+  # saves the index to an .npz file
+  def save(self, filename):
+    with open(filename, 'wb') as f:
+      np.savez(f, centers=self.centers, kinds=self.kinds, order=self.order, starts=self.starts,
+               origin=self.origin, shape=np.asarray(self.shape), radius=self.radius, cell_size=self.cell_size)
+
+  # loads an index saved by save, without rebuilding the buckets
+  @classmethod
+  def load(cls, filename):
+    index = cls.__new__(cls)
+    with np.load(filename) as data:
+      index.centers = data['centers']
+      index.kinds = data['kinds']
+      index.order = data['order']
+      index.starts = data['starts']
+      index.origin = data['origin']
+      index.shape = tuple(int(n) for n in data['shape'])
+      index.radius = float(data['radius'])
+      index.cell_size = float(data['cell_size'])
+    return index
@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+
+# rows packed at a time when converting from an array
+pack_band = 1024
+
+# class to store a binary occupancy grid (obstacle map or C-space) with one bit per cell
+# each row is packed with np.packbits, so a 30x30 grid takes 120 bytes instead of 7200 as int64
+# it is the storage format of the dataset files; the generation stages take it as input but unpack it
+# into lists for their cell-by-cell loops
+class OccupancyGrid:
+  # bits: uint8 array of shape (rows, ceil(cols / 8)) from np.packbits(grid, axis=1)
+  def __init__(self, bits, rows, cols):
+    self.bits = np.ascontiguousarray(bits, dtype=np.uint8)
+    self.rows = rows
+    self.cols = cols
+
+  # grid is a list of lists, a NumPy array, or another OccupancyGrid
+  @classmethod
+  def from_grid(cls, grid):
+    if isinstance(grid, OccupancyGrid):
+      return grid
+
+    arr = grid if isinstance(grid, np.ndarray) else np.asarray(grid)
+    if arr.ndim != 2:
+      raise Exception('Occupancy grid must be 2D, got shape %s' % (arr.shape,))
+
+    # pack in bands of rows so memory-mapped grids are never loaded whole
+    rows, cols = arr.shape
+    bits = np.empty((rows, (cols + 7) // 8), dtype=np.uint8)
+    for r0 in range(0, rows, pack_band):
+      bits[r0:r0 + pack_band] = np.packbits(np.asarray(arr[r0:r0 + pack_band]) != 0, axis=1)
+
+    return cls(bits, rows, cols)
+
+  @property
+  def shape(self):
+    return (self.rows, self.cols)
+
+  @property
+  def nbytes(self):
+    return self.bits.nbytes
+
+  # returns the grid as a uint8 array of 0s and 1s
+  def to_array(self):
+    return np.unpackbits(self.bits, axis=1)[:, :self.cols]
+
+  # returns the grid as a list of lists of ints, the form used by ObstacleMap and JackalMap
+  def to_list(self):
+    return self.to_array().tolist()
+
+  # number of occupied cells
+  def count(self):
+    return int(np.unpackbits(self.bits, axis=1)[:, :self.cols].sum())
+
+  # grid[r, c] is the value of one cell; grid[r] is one unpacked row
+  def __getitem__(self, index):
+    if isinstance(index, tuple):
+      r, c = index
+      return (int(self.bits[r, c >> 3]) >> (7 - (c & 7))) & 1
+
+    return np.unpackbits(self.bits[index])[:self.cols]
+
+  def __len__(self):
+    return self.rows
+
+  def __eq__(self, other):
+    return isinstance(other, OccupancyGrid) and self.shape == other.shape and np.array_equal(self.bits, other.bits)
+
+  def __ne__(self, other):
+    return not self == other
+
+  # saves the packed grid to an .npz file
+  def save(self, filename):
+    with open(filename, 'wb') as f:
+      np.savez(f, bits=self.bits, shape=np.asarray(self.shape))
+
+  @classmethod
+  def load(cls, filename):
+    return load_grid(filename)
+
+
+# returns grid as a list of lists, converting from an OccupancyGrid or NumPy array if needed
+# the cell-by-cell loops index lists much faster than arrays or packed bits
+def as_rows(grid):
+  if isinstance(grid, OccupancyGrid):
+    return grid.to_list()
+  if isinstance(grid, np.ndarray):
+    return grid.tolist()
+  return grid
+
+# returns grid as a uint8 array of 0s and 1s
+def as_array(grid):
+  if isinstance(grid, OccupancyGrid):
+    return grid.to_array()
+  return np.asarray(grid, dtype=np.uint8)
+
+# saves an occupancy grid to a dataset file
+# if packed, the grid is stored bit-packed and the extension is switched to .npz,
+# otherwise it is saved as an int64 array in .npy format as before
+# returns the name of the file written
+def save_grid(filename, grid, packed=False):
+  if packed:
+    filename = os.path.splitext(filename)[0] + '.npz'
+    OccupancyGrid.from_grid(grid).save(filename)
+  else:
+    arr = grid.to_array() if isinstance(grid, OccupancyGrid) else np.asarray(grid)
+    np.save(filename, arr.astype(np.int64))
+
+  return filename
+
+# loads an occupancy grid saved by save_grid, packed or not, and returns an OccupancyGrid
+# if filename does not exist, the same name with the other extension is tried
+def load_grid(filename):
+  if not os.path.exists(filename):
+    base, ext = os.path.splitext(filename)
+    other = base + ('.npz' if ext == '.npy' else '.npy')
+    if os.path.exists(other):
+      filename = other
+
+  if not filename.endswith('.npz'):
+    return OccupancyGrid.from_grid(np.load(filename))
+
+  with np.load(filename) as data:
+    rows, cols = data['shape']
+    return OccupancyGrid(data['bits'], int(rows), int(cols))
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+import gen_world_ca
+import sweep
+from occupancy import as_rows
+
+# reference outputs of the Python 2 code, for checking that a port or a refactor still generates
+# exactly the same worlds
+reference_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parity', 'py2_reference.json')
+
+# (seed, smooth_iter, fill_pct, rows, cols) of every world in the reference
+cases = [(seed, smooth_iter, fill_pct, 30, 30)
+         for seed, (fill_pct, smooth_iter) in enumerate([(f, s) for f in [0.15, 0.2, 0.25] for s in [2, 3, 4]] * 3, 1)]
+cases += [(101, 3, 0.2, 40, 50), (102, 4, 0.25, 50, 40)]
+
+# outputs that are meant to differ from the reference, keyed by case and then by key (or by
+# 'files/<part>' for a file digest), with the value expected instead of the recorded one
+# the recording itself is never edited, so every entry here is a reviewed, deliberate change
+expected_changes = {
+  # the Python 2 .yaml files always had the origin of a 30-row map (-4.5); map_export computes it
+  # from the rows, so the 40-row map now gets -6.0
+  (101, 3, 0.2, 40, 50): {
+    'files/yaml': '08d517f4e5444b110cf746bad2eff393a2ca3b800d967873c3088ea488520e0b',
+  },
+}
+
+# returns the reference outputs of one world with the expected changes applied
+def expected_result(recorded):
+  result = dict(recorded)
+  changes = expected_changes.get(tuple(recorded['case']), {})
+  for name, value in changes.items():
+    if name.startswith('files/'):
+      result['files'] = dict(result['files'], **{name[len('files/'):]: value})
+    else:
+      result[name] = value
+  return result
+
+# returns the SHA-256 of a file
+def file_digest(filename):
+  with open(filename, 'rb') as f:
+    return hashlib.sha256(f.read()).hexdigest()
+
+# generates the world of one case and returns everything it produces, in JSON-friendly form
+def run_case(case, data_dir):
+  seed, smooth_iter, fill_pct, rows, cols = case
+  world = gen_world_ca.World(seed, smooth_iter, fill_pct, rows, cols)
+  result = {'case': list(case), 'connected': world.build()}
+  result['grid'] = as_rows(world.obstacle_map)
+  result['cspace'] = as_rows(world.jackal_map)
+  if not result['connected']:
+    return result
+
+  world.choose_points()
+  result['start'] = list(world.start)
+  result['goal'] = list(world.goal)
+  result['found'] = world.plan()
+  if not result['found']:
+    return result
+
+  result['path'] = [list(point) for point in world.path]
+  world.measure()
+  result['metrics'] = [float(m) for m in world.metrics]
+
+  multi_path = world.jmap_gen.get_paths([world.start], world.goal, world.dist_map)[0]
+  result['multi_path'] = [list(point) for point in multi_path]
+
+  files = world.save(seed, data_dir)
+  result['files'] = dict((part, file_digest(files[part])) for part in ['world', 'pgm', 'yaml', 'path', 'metrics'])
+  return result
+
+# returns the results of every case, plus the sweep seeds, which must not change either
+def run_all():
+  data_dir = tempfile.mkdtemp() + '/'
+  try:
+    gen_world_ca.make_dataset_dirs(data_dir)
+    results = [run_case(case, data_dir) for case in cases]
+  finally:
+    shutil.rmtree(data_dir)
+
+  combos = sweep.expand_grid(sweep.default_config['grid'])
+  seeds = [[sweep.candidate_seed(0, params, n) for n in range(5)] for params in combos]
+  return {'worlds': results, 'sweep_seeds': seeds}
+
+# writes the reference file from the running interpreter
+def record():
+  data = run_all()
+  data['python'] = sys.version.split()[0]
+  folder = os.path.dirname(reference_file)
+  if not os.path.isdir(folder):
+    os.makedirs(folder)
+  with open(reference_file, 'w') as f:
+    json.dump(data, f, sort_keys=True)
+
+  print('recorded %d worlds with Python %s' % (len(data['worlds']), data['python']))
+
+# compares the running interpreter's outputs with the reference, returns a list of differences
+def check():
+  with open(reference_file) as f:
+    reference = json.load(f)
+  current = run_all()
+
+  problems = []
+  if current['sweep_seeds'] != reference['sweep_seeds']:
+    problems.append('sweep seeds differ')
+
+  for recorded, actual in zip(reference['worlds'], current['worlds']):
+    expected = expected_result(recorded)
+    for key in sorted(expected):
+      if key == 'metrics':
+        same = key in actual and np.array_equal(expected[key], actual[key])
+      else:
+        same = actual.get(key) == expected[key]
+      if not same:
+        problems.append('case %s: %s differs' % (expected['case'], key))
+
+  return problems
+
+if __name__ == "__main__":
+  if len(sys.argv) > 1 and sys.argv[1] == 'record':
+    record()
+  else:
+    problems = check()
+    for problem in problems:
+      print(problem)
+    print('%d differences from the reference' % len(problems))
+    sys.exit(1 if problems else 0)
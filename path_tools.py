@@ -0,0 +1,167 @@
+import os
+
+import numpy as np
+
+from occupancy import as_rows, load_grid
+from planners import moves
+from world_writer import field_origin
+
+# file names for the post-processed paths, relative to the dataset directory
+path_runs_file = 'path_runs_files/path_runs_%d.npy'
+waypoints_file = 'waypoint_files/waypoints_%d.npy'
+
+# heading code of a step that stays on the same cell (saved paths repeat their start cell)
+stay = len(moves)
+
+# heading code of every (dr, dc) step, indexed by (dr + 1) * 3 + (dc + 1)
+_step_headings = np.full(9, stay, dtype=np.uint8)
+for h, (dr, dc) in enumerate(moves):
+  _step_headings[(dr + 1) * 3 + (dc + 1)] = h
+_moves = np.asarray(moves + [(0, 0)], dtype=np.int64)
+
+# returns the heading code (index into planners.moves, or stay) of every step of a path
+# path: list of (row, col) cells or an n x 2 array, each cell next to or the same as the one before it
+def headings(path):
+  steps = np.diff(np.asarray(path, dtype=np.int64).reshape(-1, 2), axis=0)
+  if len(steps) and np.abs(steps).max() > 1:
+    raise Exception('Path cells must be next to each other')
+  return _step_headings[(steps[:, 0] + 1) * 3 + (steps[:, 1] + 1)]
+
+# returns the cells of a path where it changes heading, plus its first and last cells, as an n x 2 array
+# the path is the straight 8-connected lines between consecutive turn points; repeated cells are dropped
+def turn_points(path):
+  cells = np.asarray(path, dtype=np.int64).reshape(-1, 2)
+  if len(cells) > 1:
+    cells = cells[np.concatenate(([True], headings(cells) != stay))]
+  if len(cells) < 3:
+    return cells.copy()
+
+  codes = headings(cells)
+  turns = np.nonzero(codes[1:] != codes[:-1])[0] + 1
+  return cells[np.concatenate(([0], turns, [len(cells) - 1]))]
+
+# returns the full path, as an n x 2 array, from its turn points
+def expand_turn_points(points):
+  points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+  if len(points) < 2:
+    return points.copy()
+
+  steps = np.diff(points, axis=0)
+  lengths = np.abs(steps).max(axis=1)
+  if (lengths == 0).any():
+    raise Exception('Turn points must be distinct')
+  units = steps // lengths[:, None]
+  if (units * lengths[:, None] != steps).any():
+    raise Exception('Turn points must be joined by straight or diagonal lines')
+
+  # offset of every cell after the first from the turn point before it
+  segment = np.repeat(np.arange(len(lengths)), lengths)
+  offset = np.arange(len(segment)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + 1
+  rest = points[segment] + units[segment] * offset[:, None]
+  return np.concatenate((points[:1], rest))
+
+# returns a path as its first cell and run-length direction codes
+# runs: n x 2 uint32 array of (heading, count), a heading being an index into planners.moves or stay
+def run_length_encode(path):
+  cells = np.asarray(path, dtype=np.int64).reshape(-1, 2)
+  if len(cells) == 0:
+    raise Exception('Cannot encode an empty path')
+
+  codes = headings(cells)
+  if len(codes) == 0:
+    return cells[0].copy(), np.zeros((0, 2), dtype=np.uint32)
+
+  starts = np.concatenate(([0], np.nonzero(codes[1:] != codes[:-1])[0] + 1))
+  counts = np.diff(np.append(starts, len(codes)))
+  return cells[0].copy(), np.stack((codes[starts], counts), axis=1).astype(np.uint32)
+
+# returns the full path, as an n x 2 array, from its first cell and run-length direction codes
+def run_length_decode(start, runs):
+  runs = np.asarray(runs, dtype=np.int64).reshape(-1, 2)
+  steps = np.repeat(_moves[runs[:, 0]], runs[:, 1], axis=0)
+  return np.concatenate((np.asarray(start, dtype=np.int64).reshape(1, 2),
+                         np.asarray(start, dtype=np.int64) + np.cumsum(steps, axis=0)))
+
+# saves a path as run-length direction codes to an .npy file: a uint32 array with the first cell in
+# its first row and one (heading, count) run in each row after it
+def save_runs(filename, path):
+  start, runs = run_length_encode(path)
+  np.save(filename, np.concatenate((start.reshape(1, 2), runs)).astype(np.uint32))
+
+# loads a path saved by save_runs, as an n x 2 array
+def load_runs(filename):
+  data = np.load(filename).astype(np.int64)
+  return run_length_decode(data[0], data[1:])
+
+# returns a smoothed copy of a path as an n x 2 float array, by a moving average over window cells
+# the first and last cells are kept; if cspace is given, any smoothed point whose nearest cell is a
+# wall goes back to its cell on the path
+def smooth_path(path, window=5, cspace=None):
+  cells = np.asarray(path, dtype=np.float64).reshape(-1, 2)
+  half = window // 2
+  if len(cells) < 3 or half < 1:
+    return cells.copy()
+
+  # pad with the end cells, so the average near the ends is pulled toward them
+  padded = np.concatenate((np.repeat(cells[:1], half, axis=0), cells, np.repeat(cells[-1:], half, axis=0)))
+  sums = np.cumsum(np.concatenate((np.zeros((1, 2)), padded)), axis=0)
+  smoothed = (sums[2 * half + 1:] - sums[:-2 * half - 1]) / (2 * half + 1)
+  smoothed[0], smoothed[-1] = cells[0], cells[-1]
+
+  if cspace is not None:
+    grid = np.asarray(as_rows(cspace))
+    nearest = np.rint(smoothed).astype(np.int64)
+    blocked = grid[nearest[:, 0], nearest[:, 1]] == 1
+    smoothed[blocked] = cells[blocked]
+
+  return smoothed
+
+# returns every spacing-th point of a path, always keeping the last one
+def resample(points, spacing):
+  points = np.asarray(points)
+  if len(points) == 0:
+    return points.copy()
+  keep = np.arange(0, len(points), spacing)
+  if keep[-1] != len(points) - 1:
+    keep = np.append(keep, len(points) - 1)
+  return points[keep]
+
+# converts (row, col) map coordinates to Gazebo (x, y), the positions of the cylinders in the .world file
+# origin: Gazebo (x, y) of cell (0, 0), from WorldWriter.get_field_origin or world_writer.field_origin
+# x = origin x + row * 2 * cyl_radius, y = origin y + col * 2 * cyl_radius
+def gazebo_coords(points, origin, cyl_radius):
+  points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+  return np.stack((origin[0] + points[:, 0] * cyl_radius * 2, origin[1] + points[:, 1] * cyl_radius * 2), axis=1)
+
+# returns the smoothed waypoints of a path in Gazebo coordinates, as an n x 2 float array
+# rows: rows of the map, and contain_wall_length, for the position of the obstacle field
+# spacing: cells between waypoints
+def gazebo_waypoints(path, rows, cyl_radius, contain_wall_length, window=5, spacing=3, cspace=None):
+  origin = field_origin(rows, cyl_radius, contain_wall_length)
+  return gazebo_coords(resample(smooth_path(path, window, cspace), spacing), origin, cyl_radius)
+
+# post-processes the saved paths of a dataset: writes each path as run-length codes and as smoothed
+# Gazebo waypoints, next to the original path_files
+# returns the number of bytes of the original and run-length files
+def postprocess_dataset(data_dir, indices, cyl_radius, contain_wall_length, window=5, spacing=3):
+  for pattern in [path_runs_file, waypoints_file]:
+    folder = os.path.join(data_dir, os.path.dirname(pattern))
+    if not os.path.isdir(folder):
+      os.makedirs(folder)
+
+  original_bytes = 0
+  runs_bytes = 0
+  for i in indices:
+    path_name = os.path.join(data_dir, 'path_files/path_%d.npy' % i)
+    path = np.load(path_name)
+    cspace = load_grid(os.path.join(data_dir, 'cspace_files/cspace_%d.npy' % i))
+
+    runs_name = os.path.join(data_dir, path_runs_file % i)
+    save_runs(runs_name, path)
+    np.save(os.path.join(data_dir, waypoints_file % i),
+            gazebo_waypoints(path, len(cspace), cyl_radius, contain_wall_length, window, spacing, cspace))
+
+    original_bytes += os.path.getsize(path_name)
+    runs_bytes += os.path.getsize(runs_name)
+
+  return original_bytes, runs_bytes
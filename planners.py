@@ -0,0 +1,546 @@
+import heapq
+import math
+import time
+from array import array
+
+import numpy as np
+
+import grid_ops
+from occupancy import as_rows
+
+# the 8 headings, in clockwise order, so that heading h may be followed by h-1, h, or h+1
+# (straight or a 45 degree turn), the same turn limits as AStarSearch
+moves = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
+move_lengths = [math.sqrt(dr ** 2 + dc ** 2) for dr, dc in moves]
+
+# cost factor for cells within the inflation radius, same as AStarSearch
+penalty_factor = 5.0
+
+# marks an unset entry in the next-move table
+no_move = 255
+
+# returns the headings allowed after heading h
+def next_headings(h):
+  return ((h + 7) % 8, h, (h + 1) % 8)
+
+# returns the flattened wall flags and per-cell penalties for a C-space and distance map
+# the penalty for entering a cell is penalty_factor / distance inside the inflation radius, 0 outside
+def cell_costs(map, dist_map, infl_rad_cells):
+  blocked = [v == 1 for row in map for v in row]
+  dists = np.asarray(dist_map, dtype=np.float64).ravel()
+  with np.errstate(divide='ignore'):
+    penalty = np.where(dists <= infl_rad_cells, penalty_factor / dists, 0.0)
+  penalty[~np.isfinite(penalty)] = 0.0
+  return blocked, penalty.tolist()
+
+
+# class to plan from many start points to one goal on the C-space
+# runs one reverse Dijkstra search from the goal over (cell, heading) states, with the same turn
+# limits, diagonal wall check, and wall penalty as AStarSearch; after that, the optimal path from
+# any start can be read off the table of best next moves in O(path length)
+# path cost is the sum of the move lengths plus the penalty of every cell entered
+class MultiQueryPlanner:
+  # map: C-space occupancy grid
+  # infl_rad_cells: the inflation radius, in cells
+  # dist_map: grid with the distances to closest obstacle at each point
+  def __init__(self, map, infl_rad_cells, dist_map):
+    self.map = as_rows(map)
+    self.rows = len(self.map)
+    self.cols = len(self.map[0])
+    self.infl_rad_cells = infl_rad_cells
+    self.blocked, self.penalty = cell_costs(self.map, dist_map, infl_rad_cells)
+
+    self.goal = None
+    self.cost_to_go = None
+    self.next_move = None
+    self.nodes_expanded = 0
+
+  # runs the reverse search from goal, replacing any previous goal
+  def plan_to(self, goal):
+    if self.map[goal[0]][goal[1]] == 1:
+      raise Exception('The point (%d, %d) is a wall' % (goal[0], goal[1]))
+
+    rows, cols = self.rows, self.cols
+    blocked, penalty = self.blocked, self.penalty
+    num_states = rows * cols * 8
+    cost = array('d', [float('inf')]) * num_states
+    next_move = bytearray([no_move]) * num_states
+
+    goal_cell = goal[0] * cols + goal[1]
+    heap = []
+    for h in range(8):
+      cost[goal_cell * 8 + h] = 0.0
+      heap.append((0.0, goal_cell * 8 + h))
+
+    expanded = 0
+    while heap:
+      d, state = heapq.heappop(heap)
+      if d > cost[state]:
+        continue
+      expanded += 1
+
+      # the state is (cell v, heading h used to enter v); its predecessor cell is u = v - move
+      v, h = divmod(state, 8)
+      v_r, v_c = divmod(v, cols)
+      dr, dc = moves[h]
+      u_r, u_c = v_r - dr, v_c - dc
+      if u_r < 0 or u_r >= rows or u_c < 0 or u_c >= cols:
+        continue
+
+      u = u_r * cols + u_c
+      if blocked[u]:
+        continue
+
+      # not possible to move between diagonal walls
+      if dr != 0 and dc != 0 and blocked[v_r * cols + u_c] and blocked[u_r * cols + v_c]:
+        continue
+
+      # every heading that can turn into h reaches u at this cost
+      new_cost = d + move_lengths[h] + penalty[v]
+      for prev_h in next_headings(h):
+        prev_state = u * 8 + prev_h
+        if new_cost < cost[prev_state]:
+          cost[prev_state] = new_cost
+          next_move[prev_state] = h
+          heapq.heappush(heap, (new_cost, prev_state))
+
+    self.goal = (goal[0], goal[1])
+    self.cost_to_go = cost
+    self.next_move = next_move
+    self.nodes_expanded = expanded
+
+  # returns (best heading state, cost) to leave start in any direction
+  def _best_start_state(self, start):
+    cell = start[0] * self.cols + start[1]
+    best_state, best_cost = None, float('inf')
+    for h in range(8):
+      if self.cost_to_go[cell * 8 + h] < best_cost:
+        best_state, best_cost = cell * 8 + h, self.cost_to_go[cell * 8 + h]
+
+    return best_state, best_cost
+
+  # returns the path cost from start to the goal, or None if it cannot be reached
+  def cost_from(self, start):
+    if self.goal is None:
+      raise Exception('plan_to must be called before querying paths')
+
+    if tuple(start) == self.goal:
+      return 0.0
+
+    state, cost = self._best_start_state(start)
+    return None if state is None else cost
+
+  # returns the path from start to the goal as a list of (row, col), or None if it cannot be reached
+  def path_from(self, start):
+    if self.goal is None:
+      raise Exception('plan_to must be called before querying paths')
+
+    start = (start[0], start[1])
+    if start == self.goal:
+      return [start]
+
+    state, cost = self._best_start_state(start)
+    if state is None:
+      return None
+
+    path = [start]
+    r, c = start
+    while (r, c) != self.goal:
+      h = self.next_move[state]
+      r += moves[h][0]
+      c += moves[h][1]
+      path.append((r, c))
+      state = (r * self.cols + c) * 8 + h
+
+    return path
+
+  # returns a list with the path from each start to the goal (None where unreachable)
+  def paths_from(self, starts):
+    return [self.path_from(start) for start in starts]
+
+
+# returns the octile distance between two cells, the cost of the shortest move sequence between them
+# with no walls, turn limits, or penalties, so it never overestimates a path cost
+def octile(r0, c0, r1, c1):
+  dr = abs(r0 - r1)
+  dc = abs(c0 - c1)
+  return max(dr, dc) + (math.sqrt(2) - 1) * min(dr, dc)
+
+# search modes of GridSearch
+search_modes = ['astar', 'weighted', 'bidirectional']
+
+
+# class to record what one search did
+# cost is the path cost (see MultiQueryPlanner), lower_bound a proven lower bound on the optimal cost
+class SearchStats:
+  def __init__(self, mode, weight=1.0):
+    self.mode = mode
+    self.weight = weight
+    self.nodes_expanded = 0
+    self.runtime = 0.0
+    self.cost = None
+    self.lower_bound = None
+
+  # returns a guaranteed bound on cost / optimal cost: 1 for the exact modes, at most weight for
+  # weighted A*, tighter when the lower bound found during the search allows
+  def bound(self):
+    if self.cost is None or self.lower_bound is None:
+      return None
+    if self.lower_bound <= 0:
+      return 1.0 if self.cost <= 0 else self.weight
+    return max(1.0, min(self.weight, self.cost / self.lower_bound))
+
+  # adds the stats of another search, for paths planned in several legs
+  # start from cost and lower_bound 0 to sum them
+  def add(self, other):
+    self.nodes_expanded += other.nodes_expanded
+    self.runtime += other.runtime
+    self.cost = None if self.cost is None or other.cost is None else self.cost + other.cost
+    self.lower_bound = None if self.lower_bound is None or other.lower_bound is None else self.lower_bound + other.lower_bound
+
+  def as_dict(self):
+    return {
+      'mode': self.mode,
+      'weight': self.weight,
+      'nodes_expanded': self.nodes_expanded,
+      'runtime': self.runtime,
+      'cost': self.cost,
+      'bound': self.bound(),
+    }
+
+
+# class to plan a single path on the C-space, faster than AStarSearch on big maps
+# searches (cell, heading) states with the same turn limits, diagonal wall check, and wall penalty as
+# MultiQueryPlanner, so its costs are comparable; the octile distance is the heuristic
+# modes:
+#   astar          A*, optimal
+#   weighted       weighted A* with heuristic weight w >= 1; the path costs at most w times the optimal
+#                  cost, and the bound actually proven is reported in stats
+#   bidirectional  A* from both ends at once, meeting in the middle, optimal
+class GridSearch:
+  # map: C-space occupancy grid
+  # infl_rad_cells: the inflation radius, in cells
+  # dist_map: grid with the distances to closest obstacle at each point
+  def __init__(self, map, infl_rad_cells, dist_map):
+    self.map = as_rows(map)
+    self.rows = len(self.map)
+    self.cols = len(self.map[0])
+    self.infl_rad_cells = infl_rad_cells
+    self.blocked, self.penalty = cell_costs(self.map, dist_map, infl_rad_cells)
+    self.stats = None
+
+  # returns the path from start to goal as a list of (row, col), or None if there is none
+  # the stats of the search are left in self.stats
+  # allowed: optional boolean grid; the search only enters cells where it is true
+  def __call__(self, start, goal, mode='astar', weight=1.0, allowed=None):
+    if allowed is not None:
+      blocked = self.blocked
+      self.blocked = (np.asarray(blocked, dtype=bool) | ~np.asarray(allowed, dtype=bool).ravel()).tolist()
+      try:
+        return self(start, goal, mode, weight)
+      finally:
+        self.blocked = blocked
+
+    if mode not in search_modes:
+      raise Exception('Unknown search mode %s' % mode)
+    if mode != 'weighted':
+      weight = 1.0
+    elif weight < 1.0:
+      raise Exception('Weighted A* needs a weight of at least 1, got %s' % weight)
+    for point in [start, goal]:
+      if self.map[point[0]][point[1]] == 1:
+        raise Exception('The point (%d, %d) is a wall' % (point[0], point[1]))
+
+    self.stats = SearchStats(mode, weight)
+    begin = time.time()
+    start = (start[0], start[1])
+    goal = (goal[0], goal[1])
+    if start == goal:
+      path = [start]
+      self.stats.cost = self.stats.lower_bound = 0.0
+    elif mode == 'bidirectional':
+      path = self._bidirectional(start, goal)
+    else:
+      path = self._astar(start, goal, weight)
+    self.stats.runtime = time.time() - begin
+    return path
+
+  # returns the cost of a path under the search's cost model
+  def path_cost(self, path):
+    cost = 0.0
+    for (r0, c0), (r1, c1) in zip(path[:-1], path[1:]):
+      cost += math.sqrt((r1 - r0) ** 2 + (c1 - c0) ** 2) + self.penalty[r1 * self.cols + c1]
+    return cost
+
+  # returns the state reached by moving from cell u with heading h, or None if the move is not allowed
+  def _step(self, u, h):
+    u_r, u_c = divmod(u, self.cols)
+    dr, dc = moves[h]
+    v_r, v_c = u_r + dr, u_c + dc
+    if v_r < 0 or v_r >= self.rows or v_c < 0 or v_c >= self.cols:
+      return None
+    v = v_r * self.cols + v_c
+    if self.blocked[v]:
+      return None
+
+    # not possible to move between diagonal walls
+    if dr != 0 and dc != 0 and self.blocked[u_r * self.cols + v_c] and self.blocked[v_r * self.cols + u_c]:
+      return None
+    return v * 8 + h
+
+  # returns the state before moving into the cell of state with its heading, or None if not allowed
+  def _step_back(self, state):
+    v, h = divmod(state, 8)
+    v_r, v_c = divmod(v, self.cols)
+    dr, dc = moves[h]
+    u_r, u_c = v_r - dr, v_c - dc
+    if u_r < 0 or u_r >= self.rows or u_c < 0 or u_c >= self.cols:
+      return None
+    u = u_r * self.cols + u_c
+    if self.blocked[u]:
+      return None
+    if dr != 0 and dc != 0 and self.blocked[v_r * self.cols + u_c] and self.blocked[u_r * self.cols + v_c]:
+      return None
+    return u
+
+  # returns the path of (row, col) cells from a chain of states
+  def _cells(self, states):
+    return [divmod(state // 8, self.cols) for state in states]
+
+  # weighted A* from start to goal, reopening states when a cheaper way to them is found
+  # the start cell is entered with every heading at cost 0, so it may be left in any direction
+  def _astar(self, start, goal, weight):
+    cols = self.cols
+    penalty = self.penalty
+    num_states = self.rows * cols * 8
+    cost = array('d', [float('inf')]) * num_states
+    parent = array('l', [-1]) * num_states
+    g_r, g_c = goal
+
+    start_cell = start[0] * cols + start[1]
+    h0 = octile(start[0], start[1], g_r, g_c)
+    heap = []
+    for h in range(8):
+      cost[start_cell * 8 + h] = 0.0
+      heap.append((weight * h0, 0.0, start_cell * 8 + h))
+
+    expanded = 0
+    found = None
+    while heap:
+      f, g, state = heapq.heappop(heap)
+      if g > cost[state]:
+        continue
+      expanded += 1
+
+      u = state // 8
+      if u == goal[0] * cols + goal[1]:
+        found = state
+        break
+
+      for h in next_headings(state % 8):
+        next_state = self._step(u, h)
+        if next_state is None:
+          continue
+        new_cost = g + move_lengths[h] + penalty[next_state // 8]
+        if new_cost < cost[next_state]:
+          cost[next_state] = new_cost
+          parent[next_state] = state
+          v_r, v_c = divmod(next_state // 8, cols)
+          heapq.heappush(heap, (new_cost + weight * octile(v_r, v_c, g_r, g_c), new_cost, next_state))
+
+    self.stats.nodes_expanded = expanded
+    if found is None:
+      return None
+
+    # the optimal cost is at least the smallest unweighted f of any open state
+    lower_bound = cost[found]
+    for f, g, state in heap:
+      if g <= cost[state]:
+        v_r, v_c = divmod(state // 8, cols)
+        lower_bound = min(lower_bound, g + octile(v_r, v_c, g_r, g_c))
+    self.stats.cost = cost[found]
+    self.stats.lower_bound = lower_bound
+
+    states = [found]
+    while parent[states[-1]] != -1:
+      states.append(parent[states[-1]])
+    states.reverse()
+    return self._cells(states)
+
+  # A* from start forward and from goal backward over the same states, alternating by the smaller
+  # open list; the backward search is the reverse search of MultiQueryPlanner, so a state's backward
+  # cost is its cost to go, and a path through a state costs its forward cost plus its cost to go
+  # stops once either search's smallest f is at least the best path found, so the path is optimal
+  def _bidirectional(self, start, goal):
+    cols = self.cols
+    penalty = self.penalty
+    num_states = self.rows * cols * 8
+    cost_f = array('d', [float('inf')]) * num_states
+    cost_b = array('d', [float('inf')]) * num_states
+    parent = array('l', [-1]) * num_states
+    next_move = bytearray([no_move]) * num_states
+    s_r, s_c = start
+    g_r, g_c = goal
+
+    start_cell = start[0] * cols + start[1]
+    goal_cell = goal[0] * cols + goal[1]
+    heap_f = []
+    heap_b = []
+    for h in range(8):
+      cost_f[start_cell * 8 + h] = 0.0
+      heap_f.append((octile(s_r, s_c, g_r, g_c), 0.0, start_cell * 8 + h))
+      cost_b[goal_cell * 8 + h] = 0.0
+      heap_b.append((octile(g_r, g_c, s_r, s_c), 0.0, goal_cell * 8 + h))
+
+    best = float('inf')
+    meet = None
+    expanded = 0
+    while heap_f and heap_b and heap_f[0][0] < best and heap_b[0][0] < best:
+      if len(heap_f) <= len(heap_b):
+        f, g, state = heapq.heappop(heap_f)
+        if g > cost_f[state]:
+          continue
+        expanded += 1
+
+        for h in next_headings(state % 8):
+          next_state = self._step(state // 8, h)
+          if next_state is None:
+            continue
+          new_cost = g + move_lengths[h] + penalty[next_state // 8]
+          if new_cost < cost_f[next_state]:
+            cost_f[next_state] = new_cost
+            parent[next_state] = state
+            if new_cost + cost_b[next_state] < best:
+              best, meet = new_cost + cost_b[next_state], next_state
+            v_r, v_c = divmod(next_state // 8, cols)
+            heapq.heappush(heap_f, (new_cost + octile(v_r, v_c, g_r, g_c), new_cost, next_state))
+      else:
+        f, g, state = heapq.heappop(heap_b)
+        if g > cost_b[state]:
+          continue
+        expanded += 1
+
+        # every heading that can turn into h reaches the cell before at this cost
+        u = self._step_back(state)
+        if u is None:
+          continue
+        h = state % 8
+        new_cost = g + move_lengths[h] + penalty[state // 8]
+        u_r, u_c = divmod(u, cols)
+        for prev_h in next_headings(h):
+          prev_state = u * 8 + prev_h
+          if new_cost < cost_b[prev_state]:
+            cost_b[prev_state] = new_cost
+            next_move[prev_state] = h
+            if new_cost + cost_f[prev_state] < best:
+              best, meet = new_cost + cost_f[prev_state], prev_state
+            heapq.heappush(heap_b, (new_cost + octile(u_r, u_c, s_r, s_c), new_cost, prev_state))
+
+    self.stats.nodes_expanded = expanded
+    if meet is None:
+      return None
+    self.stats.cost = self.stats.lower_bound = best
+
+    # forward half from the parents, backward half from the best next moves
+    states = [meet]
+    while parent[states[-1]] != -1:
+      states.append(parent[states[-1]])
+    states.reverse()
+    state = meet
+    while state // 8 != goal_cell:
+      h = next_move[state]
+      state = self._step(state // 8, h)
+      states.append(state)
+    return self._cells(states)
+
+
+# class to plan paths on big C-spaces coarse to fine
+# plans first on a C-space downsampled by factor, where a coarse cell is blocked if any of its fine
+# cells is, then plans on the full C-space (GridSearch, with its penalties) only inside a corridor of
+# corridor_radius coarse cells around the coarse path
+# narrow passages close off the coarse C-space quickly, so if there is no coarse path the factor is
+# halved, down to min_factor; if no factor gives a coarse path, or the fine search finds no path in
+# the corridor, the whole C-space is searched
+# the path is only optimal within the corridor, so no bound is reported unless it fell back
+class HierarchicalPlanner:
+  # search: GridSearch on the full C-space
+  # factor: fine cells per coarse cell along each side, for the first try
+  # min_factor: smallest factor tried
+  # corridor_radius: coarse cells around the coarse path the fine search may use
+  def __init__(self, search, factor=8, min_factor=2, corridor_radius=2):
+    self.search = search
+    self.factor = factor
+    self.min_factor = min_factor
+    self.corridor_radius = corridor_radius
+    self.coarse_maps = {}
+
+    self.stats = None
+    self.coarse_path = None
+    self.coarse_factor = None
+    self.fell_back = False
+
+  # returns the C-space downsampled by factor, as a boolean grid of blocked coarse cells
+  def coarse_map(self, factor):
+    if factor not in self.coarse_maps:
+      rows, cols = self.search.rows, self.search.cols
+      coarse_rows, coarse_cols = -(-rows // factor), -(-cols // factor)
+      blocked = np.zeros((coarse_rows * factor, coarse_cols * factor), dtype=bool)
+      blocked[:rows, :cols] = np.asarray(self.search.blocked, dtype=bool).reshape(rows, cols)
+      self.coarse_maps[factor] = blocked.reshape(coarse_rows, factor, coarse_cols, factor).any(axis=(1, 3))
+    return self.coarse_maps[factor]
+
+  # returns the corridor around a coarse path from start to goal as a boolean grid of the full
+  # C-space, or None if no factor gives a coarse path
+  # the coarse path and its factor are left in coarse_path and coarse_factor
+  def corridor(self, start, goal):
+    self.coarse_path = self.coarse_factor = None
+    factor = self.factor
+    while factor >= self.min_factor:
+      coarse_start = (start[0] // factor, start[1] // factor)
+      coarse_goal = (goal[0] // factor, goal[1] // factor)
+
+      # the start and goal cells always count as open, as long as the fine cells are
+      coarse_map = self.coarse_map(factor).copy()
+      coarse_map[coarse_start] = coarse_map[coarse_goal] = False
+      coarse_search = GridSearch(coarse_map.astype(np.uint8), 0, np.full(coarse_map.shape, np.inf))
+      path = coarse_search(coarse_start, coarse_goal)
+      self.stats.nodes_expanded += coarse_search.stats.nodes_expanded
+      if path is not None:
+        self.coarse_path = path
+        self.coarse_factor = factor
+        break
+      factor //= 2
+
+    if self.coarse_path is None:
+      return None
+
+    on_path = np.zeros(coarse_map.shape, dtype=np.uint8)
+    on_path[tuple(np.asarray(self.coarse_path).T)] = 1
+    wide = grid_ops.inflate(on_path, self.corridor_radius).astype(bool)
+    fine = np.repeat(np.repeat(wide, factor, axis=0), factor, axis=1)
+    return fine[:self.search.rows, :self.search.cols]
+
+  # returns the path from start to goal as a list of (row, col), or None if there is none
+  # mode, weight: GridSearch mode of the fine searches
+  # the combined stats are left in self.stats, and fell_back tells if the whole C-space was searched
+  def __call__(self, start, goal, mode='astar', weight=1.0):
+    begin = time.time()
+    self.stats = SearchStats('hierarchical', weight if mode == 'weighted' else 1.0)
+    self.fell_back = False
+
+    path = None
+    allowed = self.corridor(start, goal)
+    if allowed is not None:
+      path = self.search(start, goal, mode, weight, allowed)
+      self.stats.nodes_expanded += self.search.stats.nodes_expanded
+      self.stats.cost = self.search.stats.cost
+
+    if path is None:
+      self.fell_back = True
+      path = self.search(start, goal, mode, weight)
+      self.stats.nodes_expanded += self.search.stats.nodes_expanded
+      self.stats.cost = self.search.stats.cost
+      self.stats.lower_bound = self.search.stats.lower_bound
+
+    self.stats.runtime = time.time() - begin
+    return path
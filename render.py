@@ -0,0 +1,191 @@
+import multiprocessing
+import os
+import sys
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import numpy as np
+
+import gen_world_ca
+import grid_ops
+from difficulty_quant import DifficultyMetrics
+from manifest import Manifest
+from occupancy import as_array, as_rows, load_grid
+
+# panels of the metric image, in the same layout as gen_world_ca.Display:
+# (axes position, overlay or field name, colormap, title, colorbar)
+panels = [
+  ((0, 0), 'map_with_path', 'Greys', 'Map and A* path', False),
+  ((0, 1), 'closest_dist', 'RdYlGn', 'Distance to \nclosest obstacle', True),
+  ((0, 2), 'char_dimension', 'binary', 'Char dimension', True),
+  ((1, 0), 'avg_vis', 'RdYlGn', 'Average visibility', True),
+  ((1, 1), 'dispersion', 'RdYlGn', '%d-square radius dispersion', True),
+  ((2, 0), 'jackal_map_with_path', 'Greys', 'Jackal navigable map', False),
+]
+
+# name of the image written for each world, relative to the output folder
+image_file = 'render_%d.png'
+
+# returns the metric grids of a saved world
+# the distance to closest obstacle comes from the vectorized distance transform, which gives the
+# same values as DifficultyMetrics.closest_wall
+def dataset_fields(jackal_map, disp_radius):
+  diff = DifficultyMetrics(jackal_map, [], disp_radius)
+  return {
+    'closest_dist': grid_ops.distance_map(as_array(jackal_map).astype(np.uint8)),
+    'avg_vis': diff.avg_visibility(),
+    'dispersion': diff.dispersion(),
+    'char_dimension': diff.characteristic_dimension(),
+  }
+
+
+# class to render the metric panels of many worlds to image files without a display
+# the figure, axes, images, and colorbars are created once for a map size; each world only replaces
+# the image data and color limits before the figure is drawn again
+class HeatmapRenderer:
+  def __init__(self, disp_radius=3, dpi=100):
+    self.disp_radius = disp_radius
+    self.dpi = dpi
+    self.shape = None
+    self.fig = None
+    self.canvas = None
+    self.images = {}
+
+  # creates the figure and one image per panel for maps of the given shape
+  def _setup(self, shape):
+    self.fig = Figure(figsize=(8, 8), dpi=self.dpi)
+    self.canvas = FigureCanvasAgg(self.fig)
+    self.images = {}
+
+    blank = np.zeros(shape)
+    axes = self.fig.subplots(3, 3)
+    for r in range(3):
+      for c in range(3):
+        ax = axes[r][c]
+        ax.set_axis_off()
+        for (pos, name, cmap, title, cbar) in panels:
+          if pos != (r, c):
+            continue
+          image = ax.imshow(blank, cmap=cmap, interpolation='nearest', vmin=0, vmax=1)
+          ax.set_title(title % self.disp_radius if '%d' in title else title)
+          if cbar:
+            colorbar = self.fig.colorbar(image, ax=ax, orientation='horizontal')
+            colorbar.ax.tick_params(labelsize='xx-small')
+          self.images[name] = image
+
+    self.shape = shape
+
+  # renders one world to filename
+  # overlays: (map_with_path, jackal_map_with_path) from gen_world_ca.path_overlays
+  # fields: metric grids keyed by field_names
+  def render(self, overlays, fields, filename, title=None):
+    data = {
+      'map_with_path': np.asarray(overlays[0], dtype=np.float64),
+      'jackal_map_with_path': np.asarray(overlays[1], dtype=np.float64),
+    }
+    for name in fields:
+      data[name] = np.asarray(fields[name], dtype=np.float64)
+
+    shape = data['map_with_path'].shape
+    if shape != self.shape:
+      self._setup(shape)
+
+    for name, image in self.images.items():
+      values = data[name]
+      image.set_data(values)
+      if name in fields:
+        image.set_clim(values.min(), values.max())
+
+    self.fig.suptitle(title or '')
+    self.canvas.print_png(filename)
+
+  # renders a World that has been built, reusing its fields if they were already computed
+  # a world without a path is drawn with its plain obstacle map and C-space in the path panels
+  def render_world(self, world, filename):
+    if world.fields is None:
+      world.compute_fields()
+    if world.path:
+      overlays = gen_world_ca.path_overlays(world.obstacle_map, world.jackal_map, world.path, world.robot_radius)
+      title = 'seed %d' % world.seed
+    else:
+      overlays = (world.obstacle_map, world.jackal_map)
+      title = 'seed %d (no path)' % world.seed
+    self.render(overlays, world.fields, filename, title)
+
+  # renders world index of a saved dataset
+  # disp_radius: dispersion radius of the world, or None for the renderer's own
+  # base_index: index of the world holding the map files, for an extra start/goal pair of a sweep
+  def render_saved(self, data_dir, index, out_dir, robot_radius=gen_world_ca.jackal_radius, disp_radius=None,
+                   base_index=None):
+    if disp_radius is not None and disp_radius != self.disp_radius:
+      # the dispersion panel's title shows the radius, so the figure is set up again
+      self.disp_radius = disp_radius
+      self.shape = None
+
+    map_index = index if base_index is None else base_index
+    files = dict((part, os.path.join(data_dir, pattern % map_index)) for part, pattern in gen_world_ca.dataset_files.items())
+    files['path'] = os.path.join(data_dir, gen_world_ca.dataset_files['path'] % index)
+    obstacle_map = as_rows(load_grid(files['grid']))
+    jackal_map = as_rows(load_grid(files['cspace']))
+    path = [tuple(point) for point in np.load(files['path']).tolist()]
+
+    overlays = gen_world_ca.path_overlays(obstacle_map, jackal_map, path, robot_radius)
+    filename = os.path.join(out_dir, image_file % index)
+    self.render(overlays, dataset_fields(jackal_map, self.disp_radius), filename, 'world %d' % index)
+    return filename
+
+
+# renderer of each pool worker, created once per process
+_renderer = None
+
+def _init_worker(disp_radius):
+  global _renderer
+  _renderer = HeatmapRenderer(disp_radius)
+
+def _render_task(args):
+  data_dir, index, out_dir, robot_radius, disp_radius, base_index = args
+  return _renderer.render_saved(data_dir, index, out_dir, robot_radius, disp_radius, base_index)
+
+# returns (robot_radius, disp_radius, base_index) of a dataset world from its manifest entry, or the
+# defaults for a world the manifest does not list
+def world_options(manifest, index, disp_radius):
+  entry = manifest.worlds.get(index)
+  if entry is None:
+    return gen_world_ca.jackal_radius, disp_radius, None
+  params = entry['params']
+  return params['robot_radius'], params['disp_radius'], params.get('base_index')
+
+# renders every world of a saved dataset to out_dir, using a pool of workers
+# indices defaults to every world with a path file in data_dir
+# each world is drawn with the robot radius and dispersion radius of its entry in the dataset manifest
+# (manifest_file, relative to data_dir), since sweeps can vary them; worlds it does not list use
+# jackal_radius and disp_radius
+# returns the list of images written
+def render_dataset(data_dir='test_data/', out_dir='test_data/render_files/', indices=None,
+                   workers=multiprocessing.cpu_count(), disp_radius=3, manifest_file='manifest.json'):
+  if indices is None:
+    path_dir = os.path.dirname(os.path.join(data_dir, gen_world_ca.dataset_files['path']))
+    indices = sorted(int(name[len('path_'):-len('.npy')]) for name in os.listdir(path_dir)
+                     if name.startswith('path_') and name.endswith('.npy'))
+  if not os.path.isdir(out_dir):
+    os.makedirs(out_dir)
+
+  manifest = Manifest(os.path.join(data_dir, manifest_file))
+  tasks = [(data_dir, index, out_dir) + world_options(manifest, index, disp_radius) for index in indices]
+  if workers <= 1:
+    _init_worker(disp_radius)
+    return [_render_task(task) for task in tasks]
+
+  pool = multiprocessing.Pool(workers, _init_worker, (disp_radius,))
+  try:
+    return pool.map(_render_task, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+  finally:
+    pool.close()
+    pool.join()
+
+
+if __name__ == "__main__":
+  data_dir = sys.argv[1] if len(sys.argv) > 1 else 'test_data/'
+  out_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(data_dir, 'render_files/')
+  images = render_dataset(data_dir, out_dir)
+  print('rendered %d worlds to %s' % (len(images), out_dir))
@@ -1,69 +1,65 @@
-import matplotlib.pyplot as plt
-import numpy as np
-
-combined_results = np.load('./combined_results_stats/combined_penalty30.npy')
-eband_results = np.load('./eband_results_stats/eband_only_penalty30.npy')
-dwa_results = np.load('./dwa_results_stats/dwa_only_penalty30.npy')
-
-class Env:
-    # combined, eband, dwa are all len(2) lists -- first element is mean, second is std
-    def __init__(self, combined, eband, dwa):
-        self.combined = combined
-        self.eband = eband
-        self.dwa = dwa
-
-    # for ordering by difficulty, worlds are sorted by combined mean
-    def __eq__(self, other):
-        return self.combined[0] == other.combined[0]
-
-    def __ne__(self, other):
-        return self.combined[0] != other.combined[0]
-
-    def __lt__(self, other):
-        return self.combined[0] < other.combined[0]
-
-    def __le__(self, other):
-        return self.combined[0] <= other.combined[0]
-
-    def __gt__(self, other):
-        return self.combined[0] > other.combined[0]
-
-    def __ge__(self, other):
-        return self.combined[0] >= other.combined[0]
-
-def main():
-    # list of 300 Env objects
-    sorted_results = []
-    for num in range(len(combined_results)):
-        sorted_results.append( Env(combined_results[num], eband_results[num], dwa_results[num]) )
-
-    # sort environments in order of ascending difficulty
-    sorted_results.sort()
+import sys
 
-    combined_mean = np.zeros(300)
-    combined_std = np.zeros(300)
-
-    eband_mean = np.zeros(300)
-    eband_std = np.zeros(300)
-
-    dwa_mean = np.zeros(300)
-    dwa_std = np.zeros(300)
-
-    for num in range(len(sorted_results)):
-        combined_mean[num] = sorted_results[num].combined[0]
-        combined_std[num] = sorted_results[num].combined[1]
-
-        eband_mean[num] = sorted_results[num].eband[0]
-        eband_std[num] = sorted_results[num].eband[1]
-
-        dwa_mean[num] = sorted_results[num].dwa[0]
-        dwa_std[num] = sorted_results[num].dwa[1]
-
-    print("E-Band average std: %f" % np.mean(eband_std))
-    print("DWA average std: %f" % np.mean(dwa_std))
+import numpy as np
 
-    print("E-Band average mean: %f" % np.mean(eband_mean))
-    print("DWA average mean: %f" % np.mean(dwa_mean))
+# planners compared by default: (key, title, results file, plot color)
+# each results file holds one (mean, std) row of normalized traversal time per environment
+default_planners = [
+    ('combined', 'Combined', './combined_results_stats/combined_penalty30.npy', 'blue'),
+    ('eband', 'E-Band', './eband_results_stats/eband_only_penalty30.npy', 'red'),
+    ('dwa', 'DWA', './dwa_results_stats/dwa_only_penalty30.npy', (0.172, 0.61, 0.29)),
+]
+
+# colors for planners beyond the ones above
+extra_colors = ['purple', 'orange', 'brown', 'gray', 'olive', 'cyan']
+
+# percentiles reported in the summary
+summary_percentiles = [5, 25, 50, 75, 95]
+
+# loads the results of every planner into one structured array with a field per planner key,
+# each holding the mean and std of every environment, plus the environment number
+# files are memory-mapped, so only the columns used are read
+def load_results(planners=default_planners):
+    columns = [np.load(planner[2], mmap_mode='r') for planner in planners]
+    num_envs = len(columns[0])
+    for planner, column in zip(planners, columns):
+        if len(column) != num_envs:
+            raise Exception('%s has %d environments, expected %d' % (planner[2], len(column), num_envs))
+
+    dtype = [('env', np.int64)] + [(planner[0], [('mean', np.float64), ('std', np.float64)]) for planner in planners]
+    results = np.empty(num_envs, dtype=dtype)
+    results['env'] = np.arange(num_envs)
+    for planner, column in zip(planners, columns):
+        results[planner[0]]['mean'] = column[:, 0]
+        results[planner[0]]['std'] = column[:, 1]
+
+    return results
+
+# returns the results in order of ascending difficulty, by the mean of the planner key
+# ties keep their environment order
+def sort_by_difficulty(results, key):
+    return results[np.argsort(results[key]['mean'], kind='mergesort')]
+
+# returns a dict of summary statistics of each planner's means and stds
+def summarize(results, keys):
+    summary = {}
+    for key in keys:
+        mean = results[key]['mean']
+        std = results[key]['std']
+        summary[key] = {
+            'environments': len(mean),
+            'average_mean': float(np.mean(mean)),
+            'average_std': float(np.mean(std)),
+            'percentiles': dict(zip(summary_percentiles, np.percentile(mean, summary_percentiles).tolist())),
+        }
+
+    return summary
+
+# plots each planner's mean and std over the environments, in the order of sorted_results
+# shows each plot, or saves them as <save_dir>/<key>.png if save_dir is given
+def plot_sorted(sorted_results, planners, save_dir=None, ylim=10):
+    # imported here, so loading and summarizing results does not need matplotlib
+    import matplotlib.pyplot as plt
 
     plt.rcParams.update({'font.size': 23, 'font.family': 'Times New Roman'})
     plt.rcParams['font.family'] = 'serif'
@@ -71,30 +67,52 @@ def main():
 
     xlabel = 'Environment number'
     ylabel = 'Difficulty level\n(normalized traversal time)'
-    ylim = 10
-
-    plt.plot(combined_mean, color='blue')
-    plt.fill_between(np.arange(0, 300), combined_mean + combined_std, combined_mean - combined_std, alpha=0.31, color='blue')
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    plt.ylim(0, ylim)
-    plt.title("Combined")
-    plt.tick_params(labelsize=16)
-    plt.show()
-
-    plt.plot(eband_mean, color='red')
-    plt.fill_between(np.arange(0, 300), eband_mean + eband_std, eband_mean - eband_std, alpha=0.31, color='red')
-    plt.ylim(0, ylim)
-    plt.title("E-Band")
-    plt.tick_params(labelsize=16)
-    plt.show()
-
-    plt.plot(dwa_mean, color='green')
-    plt.fill_between(np.arange(0, 300), dwa_mean + dwa_std, dwa_mean - dwa_std, alpha=0.31, color=(0.172, 0.61, 0.29))
-    plt.ylim(0, ylim)
-    plt.title("DWA")
-    plt.tick_params(labelsize=16)
-    plt.show()
+    x = np.arange(len(sorted_results))
+
+    for key, title, filename, color in planners:
+        mean = sorted_results[key]['mean']
+        std = sorted_results[key]['std']
+
+        plt.plot(x, mean, color=color)
+        plt.fill_between(x, mean + std, mean - std, alpha=0.31, color=color)
+        plt.xlabel(xlabel)
+        plt.ylabel(ylabel)
+        plt.ylim(0, ylim)
+        plt.title(title)
+        plt.tick_params(labelsize=16)
+        if save_dir is None:
+            plt.show()
+        else:
+            plt.savefig('%s/%s.png' % (save_dir, key), bbox_inches='tight')
+            plt.close()
+
+# returns planners built from command line arguments of the form key=file.npy
+def planners_from_args(args):
+    planners = []
+    for num, arg in enumerate(args):
+        key, filename = arg.split('=', 1)
+        planners.append((key, key, filename, extra_colors[num % len(extra_colors)]))
+
+    return planners
+
+# planners: list of (key, title, results file, plot color), the first one orders the environments
+def main(planners=default_planners, save_dir=None):
+    results = load_results(planners)
+
+    # sort environments in order of ascending difficulty
+    sorted_results = sort_by_difficulty(results, planners[0][0])
+
+    summary = summarize(sorted_results, [planner[0] for planner in planners])
+    for key, title, filename, color in planners:
+        print("%s average std: %f" % (title, summary[key]['average_std']))
+    for key, title, filename, color in planners:
+        print("%s average mean: %f" % (title, summary[key]['average_mean']))
+    for key, title, filename, color in planners:
+        percentiles = summary[key]['percentiles']
+        print("%s mean percentiles: %s" % (title, ', '.join('p%d %f' % (p, percentiles[p]) for p in summary_percentiles)))
+
+    plot_sorted(sorted_results, planners, save_dir)
+    return summary
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(planners_from_args(sys.argv[1:]) if len(sys.argv) > 1 else default_planners)
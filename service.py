@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import socket
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import gen_world_ca
+import sweep
+from occupancy import as_rows
+from world_cache import WorldCache
+
+# parameters used for anything a request leaves out
+default_params = {
+  'rows': 30,
+  'cols': 30,
+  'robot_radius': gen_world_ca.jackal_radius,
+  'disp_radius': 3,
+  'fill_pct': 0.2,
+  'smooth_iter': 3,
+}
+
+# default UNIX socket of the service
+default_socket = '/tmp/jackal_worlds.sock'
+
+# most worlds one request may ask for
+default_max_count = 100
+
+# most candidates tried for one world before the request gets an error, for parameters that rarely
+# or never give a path
+default_max_attempts = 200
+
+# returns the full parameters of a request, raising an Exception on unknown parameters
+def request_params(params):
+  unknown = [name for name in params if name not in default_params]
+  if unknown:
+    raise Exception('Unknown world parameters %s' % ', '.join(sorted(unknown)))
+
+  result = dict(default_params)
+  result.update(params)
+  return result
+
+# identifies a parameter set, for the warm pools and the seed counters
+def params_key(params):
+  return tuple(params[name] for name in sweep.param_order)
+
+# returns a world as a JSON-friendly dict
+def world_record(world):
+  return {
+    'params': world.params(),
+    'seed': world.seed,
+    'start': list(world.start),
+    'goal': list(world.goal),
+    'path': [list(point) for point in world.path],
+    'metrics': [float(m) for m in world.metrics],
+    'grid': as_rows(world.obstacle_map),
+    'cspace': as_rows(world.jackal_map),
+  }
+
+# runs the generation pipeline for one candidate, returns its record or None if it has no path
+# defined at module level so that pool workers can run it
+def generate_world(args):
+  world = sweep.run_candidate(args)
+  return None if world is None else world_record(world)
+
+
+# class to generate worlds on request for other tools
+# requests arrive as JSON lines, {"id": ..., "params": {...}, "count": n}, on a UNIX socket or a local
+# TCP port; every world is sent back as a JSON line as soon as it is ready, followed by
+# {"id": ..., "done": true}, or {"id": ..., "error": ...} if the request is bad, asks for more than
+# max_count worlds, runs out of max_attempts candidates for a world, or a worker fails
+# candidates run in a process pool; seeds come from sweep.candidate_seed, counting up per parameter
+# set, so no two worlds served for the same parameters are the same
+# parameter sets in warm are generated ahead of time, up to warm_size worlds each, and requests for
+# them are answered from that pool first
+class GenerationService:
+  # cache: optional WorldCache, so worlds served before are loaded instead of generated again
+  def __init__(self, workers=os.cpu_count(), warm=(), warm_size=4, base_seed=0, cache=None,
+               max_count=default_max_count, max_attempts=default_max_attempts):
+    self.workers = workers
+    self.max_count = max_count
+    self.max_attempts = max_attempts
+    self.cache = cache
+    self.base_seed = base_seed
+    self.warm = [request_params(params) for params in warm]
+    self.warm_size = warm_size
+    self.executor = None
+    self.server = None
+    self.socket_path = None
+    self.counters = {}
+    self.pools = {}
+    self.refill_tasks = []
+
+  async def start(self, socket_path=None, host='127.0.0.1', port=None):
+    # start the workers before the socket is open, so they do not inherit it
+    self.executor = ProcessPoolExecutor(self.workers)
+    await asyncio.get_running_loop().run_in_executor(self.executor, int)
+
+    if port is None:
+      socket_path = socket_path or default_socket
+      if os.path.exists(socket_path):
+        os.remove(socket_path)
+      self.server = await asyncio.start_unix_server(self._handle, path=socket_path)
+      self.socket_path = socket_path
+    else:
+      self.server = await asyncio.start_server(self._handle, host=host, port=port)
+
+    for params in self.warm:
+      pool = asyncio.Queue(maxsize=self.warm_size)
+      self.pools[params_key(params)] = pool
+      self.refill_tasks.append(asyncio.ensure_future(self._refill(params, pool)))
+
+  async def close(self):
+    for task in self.refill_tasks:
+      task.cancel()
+    if self.server is not None:
+      self.server.close()
+      await self.server.wait_closed()
+    if self.socket_path is not None and os.path.exists(self.socket_path):
+      os.remove(self.socket_path)
+    if self.executor is not None:
+      self.executor.shutdown(wait=True, cancel_futures=True)
+
+  # serves until SIGINT or SIGTERM, then shuts the workers down
+  async def serve_forever(self, socket_path=None, host='127.0.0.1', port=None):
+    await self.start(socket_path, host, port)
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+      loop.add_signal_handler(sig, stop.set)
+    try:
+      await stop.wait()
+    finally:
+      await self.close()
+
+  # returns the next seed for a parameter set
+  def _next_seed(self, params):
+    key = params_key(params)
+    n = self.counters.get(key, 0)
+    self.counters[key] = n + 1
+    return sweep.candidate_seed(self.base_seed, params, n)
+
+  # generates candidates in the pool until one has a path
+  # raises an Exception after max_attempts candidates without a path, or if a worker fails
+  async def _next_world(self, params):
+    loop = asyncio.get_running_loop()
+    for n in range(self.max_attempts):
+      try:
+        record = await loop.run_in_executor(self.executor, generate_world, (params, self._next_seed(params), self.cache))
+      except Exception as er:
+        raise Exception('World generation failed: %s' % er)
+      if record is not None:
+        return record
+
+    raise Exception('No world with a path after %d candidates' % self.max_attempts)
+
+  # keeps a warm pool full; stops, with a message, if the parameters fail
+  async def _refill(self, params, pool):
+    while True:
+      try:
+        record = await self._next_world(params)
+      except Exception as er:
+        print('stopped warming %s: %s' % (json.dumps(params, sort_keys=True), er), file=sys.stderr)
+        return
+      await pool.put(record)
+
+  # yields count worlds for params, the warm ones first and the rest in the order they finish
+  async def worlds(self, params, count):
+    pool = self.pools.get(params_key(params))
+    sent = 0
+    while pool is not None and sent < count and not pool.empty():
+      yield pool.get_nowait()
+      sent += 1
+
+    tasks = [asyncio.ensure_future(self._next_world(params)) for n in range(count - sent)]
+    try:
+      for task in asyncio.as_completed(tasks):
+        yield await task
+    finally:
+      for task in tasks:
+        task.cancel()
+
+  async def _handle(self, reader, writer):
+    try:
+      while True:
+        line = await reader.readline()
+        if not line:
+          break
+
+        request_id = None
+        try:
+          request = json.loads(line.decode('utf-8'))
+          request_id = request.get('id')
+          params = request_params(request.get('params', {}))
+          count = int(request.get('count', 1))
+          if count < 1 or count > self.max_count:
+            raise Exception('count must be between 1 and %d' % self.max_count)
+        except Exception as er:
+          await self._send(writer, {'id': request_id, 'error': str(er)})
+          continue
+
+        # closing the generator cancels its remaining tasks, also when the client goes away
+        try:
+          async with contextlib.aclosing(self.worlds(params, count)) as worlds:
+            async for record in worlds:
+              record['id'] = request_id
+              await self._send(writer, record)
+        except ConnectionError:
+          raise
+        except Exception as er:
+          await self._send(writer, {'id': request_id, 'error': str(er)})
+          continue
+        await self._send(writer, {'id': request_id, 'done': True})
+    except ConnectionError:
+      pass
+    finally:
+      writer.close()
+
+  @staticmethod
+  async def _send(writer, message):
+    writer.write((json.dumps(message) + '\n').encode('utf-8'))
+    await writer.drain()
+
+
+# yields count worlds from a running service, as they arrive
+# connects to socket_path, or to host and port if port is given
+def request_worlds(params=None, count=1, socket_path=default_socket, host='127.0.0.1', port=None):
+  if port is None:
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(socket_path)
+  else:
+    conn = socket.create_connection((host, port))
+
+  with conn, conn.makefile('rwb') as stream:
+    stream.write((json.dumps({'id': 0, 'params': params or {}, 'count': count}) + '\n').encode('utf-8'))
+    stream.flush()
+    for line in stream:
+      message = json.loads(line.decode('utf-8'))
+      if 'error' in message:
+        raise Exception(message['error'])
+      if message.get('done'):
+        return
+      yield message
+
+def build_parser():
+  parser = argparse.ArgumentParser(description='Serve generated worlds over a local socket.')
+  parser.add_argument('--socket', default=default_socket, help='UNIX socket to listen on')
+  parser.add_argument('--port', type=int, help='listen on this local TCP port instead of a UNIX socket')
+  parser.add_argument('--workers', type=int, default=os.cpu_count())
+  parser.add_argument('--warm', action='append', default=[],
+                      help='JSON parameters to keep pre-generated worlds for, may be repeated')
+  parser.add_argument('--warm-size', type=int, default=4)
+  parser.add_argument('--base-seed', type=int, default=0)
+  parser.add_argument('--cache-dir', help='folder of a world cache shared with other runs')
+  parser.add_argument('--max-count', type=int, default=default_max_count, help='most worlds per request')
+  parser.add_argument('--max-attempts', type=int, default=default_max_attempts,
+                      help='most candidates tried for one world before the request gets an error')
+  return parser
+
+def main(argv=None):
+  args = build_parser().parse_args(argv)
+  cache = WorldCache(args.cache_dir) if args.cache_dir else None
+  service = GenerationService(args.workers, [json.loads(params) for params in args.warm], args.warm_size,
+                              args.base_seed, cache, args.max_count, args.max_attempts)
+  asyncio.run(service.serve_forever(args.socket, port=args.port))
+
+if __name__ == "__main__":
+  main()
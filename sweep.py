@@ -0,0 +1,264 @@
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+
+import gen_world_ca
+from manifest import Manifest
+from world_cache import WorldCache, default_max_bytes
+
+# order in which the grid parameters are nested, the last one changes fastest
+param_order = ['rows', 'cols', 'robot_radius', 'disp_radius', 'fill_pct', 'smooth_iter']
+
+# parameters a grid may also list, nested after param_order; combinations only have them when the
+# grid does, so sweeps without them keep their seeds
+# ca_rule: rule set name or rule string for the cellular automaton (see ca_rules.py)
+optional_params = ['ca_rule']
+
+# default sweep: 4 fill percents x 3 smoothing levels, 25 worlds each (the original 300-world dataset)
+default_config = {
+  'data_dir': 'test_data/',
+  'manifest': 'manifest.json', # relative to data_dir
+  'set_size': 25, # worlds saved for each combination of parameters
+  'workers': multiprocessing.cpu_count(),
+  'base_seed': 0, # every candidate seed is derived from this
+  'overprovision': 1.25, # extra candidates sent per round, relative to the expected number needed
+  'max_batch': 200, # most candidates sent for one combination in one round
+  'packed': False, # save grids and C-spaces bit-packed
+  'cache_dir': None, # folder of a WorldCache shared by every run, or None for no cache
+  'cache_max_bytes': default_max_bytes,
+  'pairs_per_world': 1, # start/goal pairs saved from every accepted world (see World.sample_pairs)
+  'grid': {
+    'rows': [30],
+    'cols': [30],
+    'robot_radius': [gen_world_ca.jackal_radius],
+    'disp_radius': [3],
+    'fill_pct': [0.15, 0.20, 0.25, 0.30],
+    'smooth_iter': [2, 3, 4],
+  },
+}
+
+# loads a sweep config from a JSON file, filling in anything it leaves out from default_config
+# config_file may be None to use the defaults
+def load_config(config_file=None):
+  config = dict(default_config)
+  config['grid'] = dict(default_config['grid'])
+  if config_file is None:
+    return config
+
+  with open(config_file) as f:
+    user_config = json.load(f)
+
+  for key, value in user_config.items():
+    if key == 'grid':
+      for param, values in value.items():
+        if param not in param_order + optional_params:
+          raise Exception('Unknown sweep parameter %s' % param)
+        config['grid'][param] = values if isinstance(values, list) else [values]
+    elif key in default_config:
+      config[key] = value
+    else:
+      raise Exception('Unknown sweep config key %s' % key)
+
+  return config
+
+# returns a list with a dict of parameters for every combination in the grid
+def expand_grid(grid):
+  names = param_order + [param for param in optional_params if param in grid]
+  values = [grid[param] for param in names]
+  return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+# returns the seed of the n-th candidate for a combination of parameters
+# seeds are never 0, since ObstacleMap does not seed the generator for a seed of 0
+def candidate_seed(base_seed, params, n):
+  key = json.dumps([base_seed, sorted(params.items()), n])
+  return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:8], 16) % (2 ** 31 - 1) + 1
+
+# generates one candidate world, returns the World if it has a path or None otherwise
+# args: (params, seed), optionally followed by a WorldCache to load the world from or store it in, and
+# the number of start/goal pairs wanted; the pairs after the world's own are left in world.pairs
+# defined at module level so that pool workers can run it
+def run_candidate(args):
+  params, seed = args[:2]
+  cache = args[2] if len(args) > 2 else None
+  num_pairs = args[3] if len(args) > 3 else 1
+  world = gen_world_ca.World(seed, params['smooth_iter'], params['fill_pct'], params['rows'], params['cols'],
+                             robot_radius=params['robot_radius'], disp_radius=params['disp_radius'], cache=cache,
+                             ca_rule=params.get('ca_rule'))
+  if not world():
+    return None
+
+  world.pairs = world.sample_pairs(num_pairs - 1) if num_pairs > 1 else []
+  return world
+
+
+# class to build a dataset from a grid of generation parameters
+# every combination gets set_size worlds, stored at indices [k * set_size, (k + 1) * set_size) for the
+# k-th combination; candidates are sent to a pool of workers in rounds, sized from each combination's
+# acceptance rate so far, and results are taken in candidate order so the dataset does not depend
+# on the number of workers
+# every accepted world is committed to the dataset manifest together with the scheduler's progress,
+# so an interrupted build resumes from the last committed world without redoing finished ones
+class SweepScheduler:
+  def __init__(self, config):
+    self.config = config
+    self.data_dir = config['data_dir']
+    self.set_size = config['set_size']
+    self.combos = expand_grid(config['grid'])
+    self.manifest = Manifest(os.path.join(self.data_dir, config['manifest']))
+    self.cache = None
+    if config['cache_dir'] is not None:
+      self.cache = WorldCache(config['cache_dir'], config['cache_max_bytes'])
+    self.state = self._load_state()
+
+  # identifies the sweep, so a manifest is only resumed by the same sweep
+  def _sweep_key(self):
+    key = [self.config['base_seed'], self.set_size, [sorted(c.items()) for c in self.combos]]
+    if self.config['pairs_per_world'] != 1:
+      key.append(self.config['pairs_per_world'])
+    key = json.dumps(key)
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+  # returns the scheduler progress saved in the manifest, or fresh progress for a new build
+  # committed worlds whose files were since changed or removed are dropped, to be generated again
+  def _load_state(self):
+    state = self.manifest.state
+    if not state:
+      return {
+        'sweep': self._sweep_key(),
+        'combos': [{'params': params, 'attempted': 0, 'succeeded': 0, 'next_candidate': 0, 'partial': None}
+                   for params in self.combos],
+      }
+
+    if state.get('sweep') != self._sweep_key():
+      raise Exception('Manifest %s belongs to a different sweep' % self.manifest.filename)
+
+    # extra pairs share the map files of their base world, so they go with it
+    bad = self.manifest.verify()
+    bad += [index for index, entry in sorted(self.manifest.worlds.items())
+            if entry['params'].get('base_index') in bad and index not in bad]
+    for index in bad:
+      print('world %d is incomplete, regenerating it' % index)
+      self.manifest.discard(index)
+    for combo in state['combos']:
+      if combo.get('partial') and combo['partial']['base_index'] in bad:
+        combo['partial'] = None
+    if bad:
+      self.manifest.write()
+
+    return state
+
+  # dataset indices of the k-th combination that have no committed world yet
+  def _open_slots(self, k):
+    block = range(k * self.set_size, (k + 1) * self.set_size)
+    return [index for index in block if not self.manifest.is_committed(index)]
+
+  # estimated fraction of candidates that have a path, with one success and one failure assumed
+  # up front so a new combination starts at 50%
+  @staticmethod
+  def acceptance_rate(combo):
+    return (combo['succeeded'] + 1.0) / (combo['attempted'] + 2.0)
+
+  # number of candidates to send for a combination this round
+  def _batch_size(self, k):
+    combo = self.state['combos'][k]
+    remaining = len(self._open_slots(k))
+    expected = remaining / self.acceptance_rate(combo)
+    return int(min(math.ceil(expected * self.config['overprovision']), max(self.config['max_batch'], remaining)))
+
+  def _unfinished(self):
+    return [k for k in range(len(self.combos)) if self._open_slots(k)]
+
+  # runs rounds of candidates until every combination has set_size worlds
+  def __call__(self):
+    gen_world_ca.make_dataset_dirs(self.data_dir)
+    workers = self.config['workers']
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+
+    try:
+      while self._unfinished():
+        self._run_round(pool)
+    finally:
+      if pool is not None:
+        pool.close()
+        pool.join()
+
+    return self.state
+
+  def _run_round(self, pool):
+    tasks = []
+    for k in self._unfinished():
+      combo = self.state['combos'][k]
+      first = combo['next_candidate']
+      for n in range(first, first + self._batch_size(k)):
+        tasks.append((k, n))
+
+    args = [(self.combos[k], candidate_seed(self.config['base_seed'], self.combos[k], n), self.cache,
+             self.config['pairs_per_world']) for k, n in tasks]
+    if pool is None:
+      results = (run_candidate(arg) for arg in args)
+    else:
+      results = pool.imap(run_candidate, args)
+
+    # results arrive in task order; each one is handled as soon as it is ready
+    for i, world in enumerate(results):
+      k, n = tasks[i]
+      combo = self.state['combos'][k]
+      if world is None:
+        combo['next_candidate'] = n + 1
+        combo['attempted'] += 1
+        continue
+
+      self._commit_samples(k, n, world)
+
+  # saves the world's own path, then any extra start/goal pairs, each as its own dataset world
+  # the first sample gets the map files; the pairs after it only get their path and metrics files, and
+  # name the index holding the map files as base_index in the manifest
+  # the candidate is only marked done with its last sample, and the samples committed so far are kept
+  # in the state (partial), so a build interrupted between pairs picks up with the next pair of the same
+  # candidate and ends up the same as one that was not interrupted
+  def _commit_samples(self, k, n, world):
+    combo = self.state['combos'][k]
+    partial = combo.get('partial') or {'pairs_done': 0, 'base_index': None}
+    samples = [(world.start, world.goal, world.path, world.metrics)] + world.pairs
+    todo = list(enumerate(samples))[partial['pairs_done']:]
+    todo = todo[:len(self._open_slots(k))]
+
+    if not todo:
+      self._finish_candidate(combo, n)
+      return
+
+    for j, (pair, sample) in enumerate(todo):
+      index = self._open_slots(k)[0]
+      world.start, world.goal, world.path, world.metrics = sample
+      params = world.params()
+      if pair == 0:
+        files = world.save(index, self.data_dir, packed=self.config['packed'])
+        partial['base_index'] = index
+      else:
+        files = world.save_path(index, self.data_dir)
+        params['pair'] = pair
+        params['planner'] = gen_world_ca.pair_planner
+        params['base_index'] = partial['base_index']
+
+      if j == len(todo) - 1:
+        self._finish_candidate(combo, n)
+      else:
+        partial['pairs_done'] = pair + 1
+        combo['partial'] = partial
+      self.manifest.commit(index, params, files, world.metrics, self.state)
+      print('world %d %s seed %d (acceptance %.2f)' % (index, self._describe(combo['params']), world.seed, self.acceptance_rate(combo)))
+
+  # moves a combination past candidate n, which had a path
+  @staticmethod
+  def _finish_candidate(combo, n):
+    combo['next_candidate'] = n + 1
+    combo['attempted'] += 1
+    combo['succeeded'] += 1
+    combo['partial'] = None
+
+  @staticmethod
+  def _describe(params):
+    return ' '.join('%s %s' % (param, params[param]) for param in param_order + optional_params if param in params)
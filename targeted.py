@@ -0,0 +1,298 @@
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+
+import numpy as np
+
+import gen_world_ca
+import sweep
+from difficulty_quant import metric_names
+from manifest import Manifest
+
+# default targeted build: 5 bins of a combined difficulty score, 20 worlds each
+default_config = {
+  'data_dir': 'test_data/',
+  'manifest': 'targeted_manifest.json', # relative to data_dir, apart from the manifest of a sweep
+  'workers': multiprocessing.cpu_count(),
+  'base_seed': 0,
+  'batch': 50, # candidates sent to the workers at a time
+  'packed': False,
+  'grid': dict(sweep.default_config['grid']),
+  'target': {
+    # one of metric_names, or 'score' for the weighted sum of all five metrics
+    'metric': 'score',
+    # weights for the score; by default lower clearance, visibility, and characteristic dimension
+    # and higher dispersion and tortuosity make a world harder
+    'weights': [-1.0, -0.25, 0.5, -0.25, 2.0],
+    # bin edges; the defaults cover the scores of the default grid, about -8.3 to 2.3, with the outer
+    # bins the rarest (roughly 1 in 10 evaluated worlds)
+    'bins': [-8.0, -6.0, -4.0, -2.0, 0.0, 2.0],
+    'per_bin': 20,
+  },
+  'warmup': 30, # worlds fully evaluated before any candidate is rejected early
+  'min_keep_prob': 0.05, # candidates predicted to miss every open bin are still kept this often
+  'max_candidates': 20000, # the build stops after this many candidates, even with bins still open
+}
+
+# names of the early features, computed right after the C-space is built
+feature_names = ['bias', 'fill_pct', 'smooth_iter', 'obstacle_fraction', 'cspace_free_fraction', 'region_fraction']
+
+# returns the early features of a world after World.build, before any path planning
+# fill ratio after smoothing, fraction of the C-space that is free, and the fraction of cells in the
+# connected start region
+def early_features(world):
+  cells = float(world.rows * world.cols)
+  obstacles = sum(sum(row) for row in world.obstacle_map)
+  cspace_free = cells - sum(sum(row) for row in world.jackal_map)
+  region = sum(sum(row) for row in world.start_region)
+  return [1.0, world.fill_pct, world.smooth_iter, obstacles / cells, cspace_free / cells, region / cells]
+
+# returns the targeted value of a world's metrics
+def target_value(target, metrics):
+  if target['metric'] == 'score':
+    return float(np.dot(target['weights'], metrics))
+  return float(metrics[metric_names.index(target['metric'])])
+
+# returns the index of the bin holding value, or None if it is outside every bin
+def find_bin(edges, value):
+  for b in range(len(edges) - 1):
+    if edges[b] <= value < edges[b + 1]:
+      return b
+  return None
+
+# standard normal cumulative distribution
+def normal_cdf(x):
+  return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+# class to predict the targeted value of a world from its early features
+# ridge regression, refit from all fully evaluated worlds so far, with the spread of its errors
+class DifficultyPredictor:
+  def __init__(self, ridge=1e-3):
+    self.ridge = ridge
+    self.weights = None
+    self.sigma = None
+
+  def fit(self, features, values):
+    x = np.asarray(features, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    self.weights = np.linalg.solve(x.T.dot(x) + self.ridge * np.eye(x.shape[1]), x.T.dot(y))
+    residuals = y - x.dot(self.weights)
+    self.sigma = max(float(np.sqrt(np.mean(residuals ** 2))), 1e-6)
+
+  def predict(self, features):
+    return float(np.dot(self.weights, features))
+
+
+# class to decide whether a candidate is worth the A* search and metrics
+# keeps a candidate with the predicted probability that its value falls in a bin that still
+# needs worlds, but never less than min_keep_prob, so the predictor keeps seeing every kind of world
+class RejectionRule:
+  # predictor: fitted DifficultyPredictor
+  # open_bins: list of (low, high) value ranges of the bins that are not full yet
+  def __init__(self, predictor, open_bins, min_keep_prob):
+    self.predictor = predictor
+    self.open_bins = open_bins
+    self.min_keep_prob = min_keep_prob
+
+  def keep_probability(self, features):
+    mean = self.predictor.predict(features)
+    sigma = self.predictor.sigma
+    prob = 0.0
+    for low, high in self.open_bins:
+      prob += normal_cdf((high - mean) / sigma) - normal_cdf((low - mean) / sigma)
+    return max(prob, self.min_keep_prob)
+
+# builds one candidate, and only plans and measures it if rule keeps it
+# returns (status, features, world) where status is 'disconnected', 'rejected', 'no_path', or 'evaluated'
+# defined at module level so that pool workers can run it
+def run_candidate(args):
+  params, seed, rule = args
+  world = gen_world_ca.World(seed, params['smooth_iter'], params['fill_pct'], params['rows'], params['cols'],
+                             robot_radius=params['robot_radius'], disp_radius=params['disp_radius'],
+                             ca_rule=params.get('ca_rule'))
+  if not world.build():
+    return 'disconnected', None, None
+
+  features = early_features(world)
+  # separate generator, so the world's own random stream is not disturbed
+  if rule is not None and random.Random(seed).random() >= rule.keep_probability(features):
+    return 'rejected', features, None
+
+  world.choose_points()
+  if not world.plan():
+    return 'no_path', features, None
+
+  world.measure()
+  return 'evaluated', features, world
+
+
+# class to fill bins of a difficulty target instead of a fixed number of worlds per parameter set
+# candidates cycle through the parameter grid; once warmup worlds are evaluated, a predictor trained
+# on early features rejects candidates unlikely to land in a bin that still needs worlds, before the
+# expensive path planning and metrics
+# bin b holds dataset indices [b * per_bin, (b + 1) * per_bin); accepted worlds and the training data
+# are committed to the manifest, so an interrupted build resumes where it stopped
+# the build stops early, reporting the bins it could not fill, after max_candidates candidates or once
+# every open bin lies outside the range of values seen in the evaluated worlds
+class TargetedGenerator:
+  def __init__(self, config):
+    self.config = config
+    self.target = config['target']
+    self.data_dir = config['data_dir']
+    self.combos = sweep.expand_grid(config['grid'])
+    self.edges = self.target['bins']
+    self.per_bin = self.target['per_bin']
+    self.manifest = Manifest(os.path.join(self.data_dir, config['manifest']))
+    self.state = self._load_state()
+    self.predictor = DifficultyPredictor()
+
+  # identifies the build, so a manifest is only resumed by the same config
+  def _build_key(self):
+    target = [self.target['metric'], self.target['weights'], self.edges, self.per_bin]
+    key = json.dumps(['targeted', self.config['base_seed'], [sorted(c.items()) for c in self.combos], target,
+                      self.config['batch'], self.config['warmup'], self.config['min_keep_prob']])
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+  # returns the progress saved in the manifest, or fresh progress for a new build
+  def _load_state(self):
+    state = self.manifest.state
+    if not state:
+      return {
+        'targeted': self._build_key(),
+        'next_candidate': 0,
+        'features': [],
+        'values': [],
+        'counts': {'disconnected': 0, 'rejected': 0, 'no_path': 0, 'evaluated': 0},
+      }
+
+    if state.get('targeted') != self._build_key():
+      raise Exception('Manifest %s belongs to a different build' % self.manifest.filename)
+    return state
+
+  def _open_slots(self, b):
+    block = range(b * self.per_bin, (b + 1) * self.per_bin)
+    return [index for index in block if not self.manifest.is_committed(index)]
+
+  def _open_bins(self):
+    return [b for b in range(len(self.edges) - 1) if self._open_slots(b)]
+
+  # returns the open bins that can still get worlds: all of them while warming up, then only those
+  # overlapping the range of values seen so far
+  def _reachable_bins(self):
+    values = self.state['values']
+    if len(values) < self.config['warmup']:
+      return self._open_bins()
+    low, high = min(values), max(values)
+    return [b for b in self._open_bins() if self.edges[b] <= high and self.edges[b + 1] > low]
+
+  # returns the rejection rule for the next batch, or None while warming up
+  def _rule(self):
+    if len(self.state['values']) < self.config['warmup']:
+      return None
+
+    self.predictor.fit(self.state['features'], self.state['values'])
+    open_bins = [(self.edges[b], self.edges[b + 1]) for b in self._open_bins()]
+    return RejectionRule(self.predictor, open_bins, self.config['min_keep_prob'])
+
+  def __call__(self):
+    gen_world_ca.make_dataset_dirs(self.data_dir)
+    workers = self.config['workers']
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+
+    try:
+      while self._reachable_bins() and self.state['next_candidate'] < self.config['max_candidates']:
+        self._run_batch(pool)
+    finally:
+      if pool is not None:
+        pool.close()
+        pool.join()
+
+    counts = self.state['counts']
+    print('evaluated %d worlds, rejected %d early, %d disconnected, %d without a path' % (
+      counts['evaluated'], counts['rejected'], counts['disconnected'], counts['no_path']))
+    self._report_unfilled()
+    return self.state
+
+  # prints the bins left with open slots, and why the build stopped before filling them
+  def _report_unfilled(self):
+    unfilled = self._open_bins()
+    if not unfilled:
+      return
+
+    values = self.state['values']
+    if self.state['next_candidate'] >= self.config['max_candidates']:
+      print('stopped after max_candidates (%d) candidates' % self.config['max_candidates'])
+    elif values:
+      print('stopped: the open bins are outside the values seen, %.3f to %.3f' % (min(values), max(values)))
+    for b in unfilled:
+      print('bin %d [%.3f, %.3f) has %d of %d worlds' % (b, self.edges[b], self.edges[b + 1],
+                                                        self.per_bin - len(self._open_slots(b)), self.per_bin))
+
+  def _run_batch(self, pool):
+    rule = self._rule()
+    first = self.state['next_candidate']
+    args = []
+    for n in range(first, min(first + self.config['batch'], self.config['max_candidates'])):
+      params = self.combos[n % len(self.combos)]
+      args.append((params, sweep.candidate_seed(self.config['base_seed'], params, n), rule))
+
+    if pool is None:
+      results = (run_candidate(arg) for arg in args)
+    else:
+      results = pool.imap(run_candidate, args)
+
+    for i, (status, features, world) in enumerate(results):
+      self.state['next_candidate'] = first + i + 1
+      self.state['counts'][status] += 1
+      if status != 'evaluated':
+        continue
+
+      value = target_value(self.target, world.metrics)
+      self.state['features'].append(features)
+      self.state['values'].append(value)
+
+      b = find_bin(self.edges, value)
+      slots = [] if b is None else self._open_slots(b)
+      if slots:
+        files = world.save(slots[0], self.data_dir, packed=self.config['packed'])
+        self.manifest.commit(slots[0], world.params(), files, world.metrics, self.state)
+        print('world %d in bin %d (value %.3f)' % (slots[0], b, value))
+
+# loads a targeted build config from a JSON file, filling in anything it leaves out from default_config
+def load_config(config_file=None):
+  config = dict(default_config)
+  config['grid'] = dict(default_config['grid'])
+  config['target'] = dict(default_config['target'])
+  if config_file is None:
+    return config
+
+  with open(config_file) as f:
+    user_config = json.load(f)
+
+  for key, value in user_config.items():
+    if key == 'grid':
+      for param, values in value.items():
+        if param not in sweep.param_order + sweep.optional_params:
+          raise Exception('Unknown sweep parameter %s' % param)
+        config['grid'][param] = values if isinstance(values, list) else [values]
+    elif key == 'target':
+      config['target'].update(value)
+    elif key in default_config:
+      config[key] = value
+    else:
+      raise Exception('Unknown targeted config key %s' % key)
+
+  if config['target']['metric'] != 'score' and config['target']['metric'] not in metric_names:
+    raise Exception('Unknown target metric %s' % config['target']['metric'])
+
+  return config
+
+
+if __name__ == "__main__":
+  generator = TargetedGenerator(load_config(sys.argv[1] if len(sys.argv) > 1 else None))
+  generator()
@@ -0,0 +1,171 @@
+import os
+import random
+
+import numpy as np
+
+import grid_ops
+from occupancy import OccupancyGrid
+
+# default tile size, in cells
+tile_size = 256
+
+# class to generate very large worlds tile by tile
+# produces the same obstacle map, C-space, and distance map as running ObstacleMap, JackalMap,
+# and DifficultyMetrics.closest_wall on the whole grid, but only ever works on one tile
+# (plus a halo of overlap) at a time, on uint8 arrays instead of nested lists
+class TiledWorld:
+  # rows, cols, rand_fill_pct, seed, smooth_iter: same as ObstacleMap
+  # robot_radius: same as JackalMap
+  # tile: size of each square tile, in cells
+  # spill_dir: if given, every full-size array is a memory-mapped .npy file in this directory
+  def __init__(self, rows, cols, rand_fill_pct, seed=None, smooth_iter=5, robot_radius=2, tile=tile_size, spill_dir=None):
+    self.rows = rows
+    self.cols = cols
+    self.rand_fill_pct = rand_fill_pct
+    self.seed = seed
+    self.smooth_iter = smooth_iter
+    self.robot_radius = robot_radius
+    self.tile = tile
+    self.spill_dir = spill_dir
+
+    self.obstacle_map = None
+    self.jackal_map = None
+    self.dist_map = None
+    self.labels = None
+    self.region_sizes = None
+
+  # fill in map, run smoothing iterations, then inflate and compute distances
+  def __call__(self):
+    fill = self._random_fill()
+    self.obstacle_map = self._smooth(fill)
+    del fill
+    self._remove('fill')
+
+    self.jackal_map = self._inflate(self.obstacle_map)
+    self.dist_map = self._distances(self.jackal_map)
+
+  # allocates a full-size array, in memory or memory-mapped
+  def _alloc(self, name, dtype):
+    if self.spill_dir is None:
+      return np.zeros((self.rows, self.cols), dtype=dtype)
+
+    path = os.path.join(self.spill_dir, name + '.npy')
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(self.rows, self.cols))
+
+  def _remove(self, name):
+    if self.spill_dir is not None:
+      path = os.path.join(self.spill_dir, name + '.npy')
+      if os.path.exists(path):
+        os.remove(path)
+
+  # yields (row start, row end, col start, col end) for every tile
+  def _tiles(self):
+    for r0 in range(0, self.rows, self.tile):
+      for c0 in range(0, self.cols, self.tile):
+        yield r0, min(r0 + self.tile, self.rows), c0, min(c0 + self.tile, self.cols)
+
+  # fills in the map one band of rows at a time
+  # draws the random numbers in the same order as ObstacleMap._random_fill,
+  # which skips the top and bottom rows
+  def _random_fill(self):
+    if self.seed:
+      random.seed(self.seed)
+
+    fill = self._alloc('fill', np.uint8)
+    rand = random.random
+    for r0 in range(0, self.rows, self.tile):
+      r1 = min(r0 + self.tile, self.rows)
+      band = np.ones((r1 - r0, self.cols), dtype=np.uint8)
+      for r in range(r0, r1):
+        if r != 0 and r != self.rows - 1:
+          values = np.fromiter((rand() for c in range(self.cols)), dtype=np.float64, count=self.cols)
+          band[r - r0] = values < self.rand_fill_pct
+      fill[r0:r1] = band
+
+    return fill
+
+  # runs all smoothing iterations on each tile at once
+  # a halo of smooth_iter cells is enough, since each iteration only looks one cell outward
+  def _smooth(self, fill):
+    smoothed = self._alloc('obstacle_map', np.uint8)
+    halo = self.smooth_iter
+    for r0, r1, c0, c1 in self._tiles():
+      wr0, wr1 = max(r0 - halo, 0), min(r1 + halo, self.rows)
+      wc0, wc1 = max(c0 - halo, 0), min(c1 + halo, self.cols)
+
+      window = np.array(fill[wr0:wr1, wc0:wc1])
+      for n in range(self.smooth_iter):
+        window = grid_ops.smooth_step(window, wall_top=(wr0 == 0), wall_bottom=(wr1 == self.rows))
+
+      smoothed[r0:r1, c0:c1] = window[r0 - wr0:r1 - wr0, c0 - wc0:c1 - wc0]
+
+    return smoothed
+
+  # inflates each tile with a halo of robot_radius cells
+  def _inflate(self, ob_map):
+    jackal_map = self._alloc('jackal_map', np.uint8)
+    halo = self.robot_radius
+    for r0, r1, c0, c1 in self._tiles():
+      wr0, wr1 = max(r0 - halo, 0), min(r1 + halo, self.rows)
+      wc0, wc1 = max(c0 - halo, 0), min(c1 + halo, self.cols)
+
+      window = grid_ops.inflate(np.array(ob_map[wr0:wr1, wc0:wc1]), self.robot_radius)
+      jackal_map[r0:r1, c0:c1] = window[r0 - wr0:r1 - wr0, c0 - wc0:c1 - wc0]
+
+    return jackal_map
+
+  # exact distance transform in bands of rows
+  # the column distances are carried from band to band in a downward and an upward sweep,
+  # after which each band can finish on its own
+  def _distances(self, grid):
+    vert = self._alloc('vert', np.int32)
+    bands = [(r0, min(r0 + self.tile, self.rows)) for r0 in range(0, self.rows, self.tile)]
+
+    carry = None
+    for r0, r1 in bands:
+      vert[r0:r1], carry = grid_ops.column_distance_down(np.array(grid[r0:r1]), carry)
+
+    carry = None
+    for r0, r1 in reversed(bands):
+      down, carry = grid_ops.column_distance_up(np.array(grid[r0:r1]), carry)
+      vert[r0:r1] = np.minimum(vert[r0:r1], down)
+
+    dists = self._alloc('dist_map', np.float64)
+    for r0, r1 in bands:
+      dists[r0:r1] = grid_ops.sq_to_distance(grid_ops.row_envelope(np.array(vert[r0:r1])), self.rows)
+
+    del vert
+    self._remove('vert')
+    return dists
+
+  # labels the open regions of the C-space, for choosing start and end points
+  def label_regions(self):
+    self.labels = self._alloc('labels', np.int32)
+    self.labels, self.region_sizes = grid_ops.label_regions(self.jackal_map, self.labels)
+    return self.labels, self.region_sizes
+
+  # labels of the biggest regions touching the leftmost and rightmost columns
+  def biggest_left_label(self):
+    if self.labels is None:
+      self.label_regions()
+    return grid_ops.biggest_region_in_column(self.labels, self.region_sizes, 0)
+
+  def biggest_right_label(self):
+    if self.labels is None:
+      self.label_regions()
+    return grid_ops.biggest_region_in_column(self.labels, self.region_sizes, self.cols - 1)
+
+  # true if the biggest left and right regions are the same one, like JackalMap.regions_connected
+  def regions_connected(self):
+    left = self.biggest_left_label()
+    return left != 0 and left == self.biggest_right_label()
+
+  # returns the obstacle map and C-space as bit-packed OccupancyGrids
+  def get_grids(self):
+    return OccupancyGrid.from_grid(self.obstacle_map), OccupancyGrid.from_grid(self.jackal_map)
+
+  # flushes memory-mapped arrays to disk
+  def flush(self):
+    for arr in [self.obstacle_map, self.jackal_map, self.dist_map, self.labels]:
+      if isinstance(arr, np.memmap):
+        arr.flush()
@@ -0,0 +1,227 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+import grid_ops
+from occupancy import as_array
+
+# default bound on the total size of a cache, in bytes
+default_max_bytes = 256 * 1024 * 1024
+
+# version of the cached outputs, part of every key; raise it whenever a change to the cellular
+# automaton, C-space, planner, or metrics changes what the same parameters produce, so entries written
+# by older code are never served
+cache_version = 1
+
+# outcomes of a cached world: stopped after build, stopped after plan, or finished
+NOT_CONNECTED = 0
+NO_PATH = 1
+DONE = 2
+
+# returns the key of a world: a hash of every parameter that changes what the pipeline produces
+def world_key(params):
+  names = ['seed', 'rows', 'cols', 'fill_pct', 'smooth_iter', 'robot_radius', 'disp_radius', 'search_mode', 'search_weight',
+           'ca_rule']
+  key = json.dumps(['world', cache_version] + [[name, params[name]] for name in names if name in params])
+  return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+# returns the key of a C-space: a hash of the occupancy grid's contents and the robot radius
+def cspace_key(grid, robot_radius):
+  bits = np.packbits(as_array(grid) != 0, axis=1)
+  digest = hashlib.sha256(json.dumps(['cspace', cache_version, robot_radius, list(bits.shape)]).encode('utf-8'))
+  digest.update(bits.tobytes())
+  return digest.hexdigest()
+
+
+# class to keep generation artifacts on disk, so repeated experiments reuse earlier work
+# every entry is an .npz file named after its key; entries are written to a temporary file and
+# renamed into place, so a reader in another process sees a whole entry or none
+# writers take an exclusive lock on the cache folder, then evict the least recently used entries
+# (by modification time, which every hit refreshes) until the cache fits in max_bytes
+class WorldCache:
+  # cache_dir: folder holding the entries, created if needed
+  # max_bytes: bound on the total size of the entries
+  def __init__(self, cache_dir, max_bytes=default_max_bytes):
+    self.cache_dir = cache_dir
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir, exist_ok=True)
+
+  def _entry_file(self, key):
+    return os.path.join(self.cache_dir, key + '.npz')
+
+  # returns the arrays of an entry as a dict, or None if it is not cached
+  # an entry that cannot be read (truncated or corrupt, e.g. after a crash or a full disk) counts as a
+  # miss and is deleted, so it is written again
+  def get(self, key):
+    filename = self._entry_file(key)
+    try:
+      with np.load(filename) as data:
+        arrays = dict((name, data[name]) for name in data.files)
+    except (IOError, OSError):
+      self.misses += 1
+      return None
+    except (zipfile.BadZipFile, ValueError, EOFError, KeyError):
+      try:
+        os.remove(filename)
+      except OSError:
+        pass
+      self.misses += 1
+      return None
+
+    # refresh the entry for eviction; it may already be gone, or the cache may be read-only
+    try:
+      os.utime(filename)
+    except OSError:
+      pass
+
+    self.hits += 1
+    return arrays
+
+  # stores the arrays of an entry, then evicts old entries if the cache is over its size
+  def put(self, key, arrays):
+    with self._lock():
+      fd, temp_file = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+      try:
+        with os.fdopen(fd, 'wb') as f:
+          np.savez(f, **arrays)
+        os.replace(temp_file, self._entry_file(key))
+      except:
+        os.remove(temp_file)
+        raise
+      self._evict()
+
+  # returns a context manager holding the cache's exclusive lock
+  def _lock(self):
+    return _FileLock(os.path.join(self.cache_dir, '.lock'))
+
+  # removes least recently used entries until the cache fits in max_bytes
+  # must be called with the lock held
+  def _evict(self):
+    entries = []
+    for name in os.listdir(self.cache_dir):
+      if not name.endswith('.npz'):
+        continue
+      try:
+        stat = os.stat(os.path.join(self.cache_dir, name))
+      except OSError:
+        continue
+      entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for mtime, size, name in entries)
+    for mtime, size, name in sorted(entries):
+      if total <= self.max_bytes:
+        break
+      try:
+        os.remove(os.path.join(self.cache_dir, name))
+      except OSError:
+        pass
+      total -= size
+
+  # returns the number of entries and their total size in bytes
+  def usage(self):
+    sizes = [os.path.getsize(os.path.join(self.cache_dir, name))
+             for name in os.listdir(self.cache_dir) if name.endswith('.npz')]
+    return len(sizes), sum(sizes)
+
+  # removes every entry
+  def clear(self):
+    with self._lock():
+      for name in os.listdir(self.cache_dir):
+        if name.endswith('.npz'):
+          os.remove(os.path.join(self.cache_dir, name))
+
+  # fills in a World from the cache: grids, regions, points, distance map, path, and metrics
+  # returns True or False as World.__call__ would, or None if the world is not cached
+  # a world with seed 0 or None is a fresh random draw (ObstacleMap does not seed the generator), so it
+  # is never loaded or stored
+  def load_world(self, world):
+    if not world.seed:
+      return None
+    arrays = self.get(world_key(world.params()))
+    if arrays is None:
+      return None
+
+    from gen_world_ca import JackalMap
+    world.obstacle_map = arrays['obstacle_map'].tolist()
+    world.jackal_map = arrays['jackal_map'].tolist()
+    world.jmap_gen = JackalMap.from_cspace(world.obstacle_map, world.jackal_map)
+    world.start_region = arrays['start_region'].tolist()
+    world.end_region = arrays['end_region'].tolist()
+
+    status = int(arrays['status'])
+    if status == NOT_CONNECTED:
+      return False
+
+    world.start = tuple(arrays['start'].tolist())
+    world.goal = tuple(arrays['goal'].tolist())
+    world.dist_map = arrays['dist_map'].tolist()
+    if status == NO_PATH:
+      world.path = None
+      return False
+
+    world.path = [tuple(point) for point in arrays['path'].tolist()]
+    world.metrics = arrays['metrics'].tolist()
+    return True
+
+  # stores a World after World.__call__, whatever stage it stopped at
+  def store_world(self, world):
+    if not world.seed:
+      return
+    arrays = {
+      'obstacle_map': np.asarray(world.obstacle_map, dtype=np.uint8),
+      'jackal_map': np.asarray(world.jackal_map, dtype=np.uint8),
+      'start_region': np.asarray(world.start_region, dtype=np.uint8),
+      'end_region': np.asarray(world.end_region, dtype=np.uint8),
+    }
+    if world.dist_map is None:
+      arrays['status'] = np.asarray(NOT_CONNECTED)
+    else:
+      arrays['start'] = np.asarray(world.start)
+      arrays['goal'] = np.asarray(world.goal)
+      arrays['dist_map'] = np.asarray(world.dist_map)
+      if not world.path:
+        arrays['status'] = np.asarray(NO_PATH)
+      else:
+        arrays['status'] = np.asarray(DONE)
+        arrays['path'] = np.asarray(world.path)
+        arrays['metrics'] = np.asarray(world.metrics, dtype=np.float64)
+
+    self.put(world_key(world.params()), arrays)
+    # the C-space is also stored by content, for c_space.py to reuse
+    self.put(cspace_key(world.obstacle_map, world.robot_radius), {'cspace': arrays['jackal_map']})
+
+  # returns the C-space of an occupancy grid as a uint8 array, inflating it only if it is not cached
+  def cspace(self, grid, robot_radius):
+    key = cspace_key(grid, robot_radius)
+    arrays = self.get(key)
+    if arrays is not None:
+      return arrays['cspace']
+
+    cspace_grid = grid_ops.inflate(as_array(grid), robot_radius)
+    self.put(key, {'cspace': cspace_grid})
+    return cspace_grid
+
+
+# exclusive fcntl lock on a file, shared by every process using the same cache folder
+class _FileLock:
+  def __init__(self, filename):
+    self.filename = filename
+    self.f = None
+
+  def __enter__(self):
+    self.f = open(self.filename, 'a')
+    fcntl.flock(self.f, fcntl.LOCK_EX)
+    return self
+
+  def __exit__(self, *exc):
+    fcntl.flock(self.f, fcntl.LOCK_UN)
+    self.f.close()
+    self.f = None
@@ -1,15 +1,62 @@
+import gzip
+import os
+import re
+import shutil
+import tempfile
+from array import array
+
 import numpy as np
-# define boilerplate code needed to write to .world file
-with open('./world-boilerplate/world_boiler_start.txt') as f:
-      world_boiler_start = f.read()
-with open('./world-boilerplate/world_boiler_mid.txt') as f:
-      world_boiler_mid = f.read()
-with open('./world-boilerplate/world_boiler_end.txt') as f:
-      world_boiler_end = f.read()
-with open('./world-boilerplate/cylinder_define.txt') as f:
-      cylinder_define = f.read()
-with open('./world-boilerplate/cylinder_place.txt') as f:
-      cylinder_place = f.read()
+
+from obstacle_index import OBSTACLE, WALL, ObstacleIndex
+from occupancy import as_rows
+
+# folder with the boilerplate code needed to write to .world file
+boilerplate_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'world-boilerplate')
+_boilerplate = {}
+
+# returns the contents of world-boilerplate/<name>.txt, read the first time it is needed
+def boilerplate(name):
+  if name not in _boilerplate:
+    with open(os.path.join(boilerplate_dir, name + '.txt')) as f:
+      _boilerplate[name] = f.read()
+
+  return _boilerplate[name]
+
+# returns template with the conversion specifiers at the given positions filled in with values,
+# and every other specifier left for a later % operation
+# fixed: dict of specifier position to value
+def prerender(template, fixed):
+  parts = re.split(r'(%[-+ #0-9.]*[a-zA-Z%])', template)
+  result = []
+  position = 0
+  for n, part in enumerate(parts):
+    if n % 2 == 0:
+      result.append(part.replace('%', '%%'))
+    elif part == '%%':
+      result.append(part)
+    else:
+      result.append((part % fixed[position]).replace('%', '%%') if position in fixed else part)
+      position += 1
+
+  return ''.join(result)
+
+# returns the (r_shift, c_shift) of the Gazebo world of a map with the given number of rows
+# r_shift places the map's rows; c_shift is the column offset of the robot's start, not of the cells
+def world_shifts(rows, cyl_radius):
+  return -(rows - 1) * cyl_radius * 2, 1.95
+
+# returns the Gazebo (x, y) of map cell (0, 0) in a world written by WorldWriter, so that cell (r, c)
+# is at (x + r * 2 * cyl_radius, y + c * 2 * cyl_radius)
+# the obstacle field starts at the first column past the containment walls, found with the same
+# steps as the writers, so the positions match the .world file exactly
+def field_origin(rows, cyl_radius, contain_wall_length):
+  r_shift, c_shift = world_shifts(rows, cyl_radius)
+  c_lower = cyl_radius
+  c_upper = cyl_radius + contain_wall_length
+  c_coord = c_lower + cyl_radius * 2
+  while c_coord <= c_upper:
+    c_coord += cyl_radius * 2
+  return r_shift - cyl_radius, c_coord
 
 wall_rgb = [0.152, 0.379, 0.720]
 obs_rgb = [0.648, 0.192, 0.192]
@@ -18,12 +65,12 @@ class WorldWriter():
 
   def __init__(self, filename, map, cyl_radius, contain_wall_length):
     self.file = open(filename, "w")
-    self.map = map
+    self.map = as_rows(map)
     self.num_cylinders = 0
     self.cylinder_list = []
+    self.kinds = []
     self.cyl_radius = cyl_radius
-    self.r_shift = -(len(self.map) - 1) * self.cyl_radius * 2
-    self.c_shift = 1.95
+    self.r_shift, self.c_shift = world_shifts(len(self.map), self.cyl_radius)
     self.contain_wall_length = contain_wall_length
 
   def __call__(self):
@@ -88,23 +135,24 @@ class WorldWriter():
     return True
 
   def _write_starter_boiler(self):
-    self.file.write(world_boiler_start)
+    self.file.write(boilerplate('world_boiler_start'))
 
   def _create_cyl(self, pos_x, pos_y, pos_z, rot_a, rot_b, rot_c, radius, rgb):
-    self.file.write(cylinder_define % (
+    self.file.write(boilerplate('cylinder_define') % (
         self.num_cylinders, pos_x, pos_y, pos_z, rot_a, rot_b, rot_c, radius, radius, rgb[0], rgb[1], rgb[2], rgb[0], rgb[1], rgb[2]
     ))
     self.file.write('\n')
     
     self.cylinder_list.append([pos_x, pos_y, pos_z, rot_a, rot_b, rot_c])
+    self.kinds.append(WALL if rgb == wall_rgb else OBSTACLE)
     self.num_cylinders += 1
 
   def _write_mid_boiler(self):
-      self.file.write(world_boiler_mid)
+      self.file.write(boilerplate('world_boiler_mid'))
 
   def _place_cylinders(self):
     for i in range(self.num_cylinders):
-      self.file.write(cylinder_place % (
+      self.file.write(boilerplate('cylinder_place') % (
           i, self.cylinder_list[i][0], self.cylinder_list[i][1], self.cylinder_list[i][2], 
           self.cylinder_list[i][3], self.cylinder_list[i][4], self.cylinder_list[i][5], 
           self.cylinder_list[i][0], self.cylinder_list[i][1], self.cylinder_list[i][2], 
@@ -113,10 +161,158 @@ class WorldWriter():
       self.file.write('\n')
 
   def _write_end_boiler(self):
-    self.file.write(world_boiler_end)
+    self.file.write(boilerplate('world_boiler_end'))
 
   def _close(self):
     self.file.close()
 
   def get_shifts(self):
-    return self.r_shift, self.c_shift
\ No newline at end of file
+    return self.r_shift, self.c_shift
+
+  # returns the Gazebo (x, y) of map cell (0, 0) (see field_origin)
+  def get_field_origin(self):
+    return field_origin(len(self.map), self.cyl_radius, self.contain_wall_length)
+
+  # returns an ObstacleIndex of the cylinders written, for radius and nearest-obstacle queries
+  def get_index(self):
+    return ObstacleIndex.from_cylinder_list(self.cylinder_list, self.cyl_radius, self.kinds)
+
+
+# class to write the same .world file as WorldWriter, with memory that does not grow with the map
+# the map is read one row at a time (it may be a list of lists, an array, a memory-mapped array, or
+# an OccupancyGrid), and each cylinder's define and place blocks are written as soon as it is found,
+# to two spooled temporary files that only move to disk once they outgrow spool_size; the output is
+# put together from the boilerplate and the two files at the end, gzipped if compress is set
+# if index_file is given, an ObstacleIndex of the cylinders is saved to it as well; the cylinder centers
+# and kinds are spooled the same way while the map is read, and only loaded to build the index at the end
+class StreamingWorldWriter():
+
+  def __init__(self, filename, map, cyl_radius, contain_wall_length, compress=False, spool_size=1 << 22, index_file=None):
+    self.filename = filename
+    self.map = map
+    self.rows = len(map)
+    self.num_cylinders = 0
+    self.cyl_radius = cyl_radius
+    self.r_shift, self.c_shift = world_shifts(self.rows, self.cyl_radius)
+    self.contain_wall_length = contain_wall_length
+    self.compress = compress
+    self.spool_size = spool_size
+    self.index_file = index_file
+    self.index = None
+
+    # the define block only changes in the cylinder number and pose for a given radius and color
+    self.define = {}
+    for name, rgb in [('wall', wall_rgb), ('obs', obs_rgb)]:
+      fixed = dict(zip(range(7, 15), [cyl_radius, cyl_radius] + list(rgb) + list(rgb)))
+      self.define[name] = prerender(boilerplate('cylinder_define'), fixed) + '\n'
+    self.place = boilerplate('cylinder_place') + '\n'
+
+  def __call__(self):
+    self.define_file = tempfile.SpooledTemporaryFile(max_size=self.spool_size, mode='w+')
+    self.place_file = tempfile.SpooledTemporaryFile(max_size=self.spool_size, mode='w+')
+    self.centers_file = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+    self.kinds_file = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+    try:
+      self._write_cylinders()
+      self._merge()
+      if self.index_file is not None:
+        self.index = self._build_index()
+    finally:
+      for f in [self.define_file, self.place_file, self.centers_file, self.kinds_file]:
+        f.close()
+
+    if self.index is not None:
+      self.index.save(self.index_file)
+
+    contain_wall_cylinders = self.contain_wall_length / (self.cyl_radius * 2)
+    return int(contain_wall_cylinders)
+
+  # writes the containment walls and the obstacle field, in the same order as WorldWriter
+  def _write_cylinders(self):
+    c_lower = self.cyl_radius
+    c_upper = self.cyl_radius + self.contain_wall_length
+    r_lower = -self.cyl_radius
+    r_upper = self.r_shift - self.cyl_radius
+
+    # create the back containment wall
+    r_coord = r_lower
+    while r_coord >= r_upper:
+      self._create_cyl(r_coord, c_lower, 'wall')
+      r_coord -= self.cyl_radius * 2
+
+    # create the upper and lower containment walls
+    c_coord = c_lower + self.cyl_radius * 2
+    while c_coord <= c_upper:
+      self._create_cyl(r_lower, c_coord, 'wall')
+      self._create_cyl(r_upper, c_coord, 'wall')
+      c_coord += self.cyl_radius * 2
+
+    # obstacle field, keeping only the previous, current and next rows
+    c_lower = c_coord
+    prev_row, row = None, self._row(0)
+    for r in range(self.rows):
+      next_row = self._row(r + 1) if r + 1 < self.rows else None
+      color = 'wall' if r == 0 or r == self.rows - 1 else 'obs'
+      for c in np.nonzero(row & ~self._surrounded(prev_row, row, next_row))[0]:
+        self._create_cyl(r_upper + r * self.cyl_radius * 2, c_lower + int(c) * self.cyl_radius * 2, color)
+      prev_row, row = row, next_row
+
+  def _row(self, r):
+    return np.asarray(self.map[r], dtype=bool)
+
+  # returns which cells of row have all 8 neighbors filled, like WorldWriter._neighbors_filled
+  @staticmethod
+  def _surrounded(prev_row, row, next_row):
+    surrounded = np.zeros(len(row), dtype=bool)
+    if prev_row is None or next_row is None or len(row) < 3:
+      return surrounded
+
+    column = prev_row & row & next_row
+    surrounded[1:-1] = column[:-2] & column[1:-1] & column[2:]
+    return surrounded
+
+  def _create_cyl(self, pos_x, pos_y, color):
+    pose = (pos_x, pos_y, 0, 0, 0, 0)
+    self.define_file.write(self.define[color] % ((self.num_cylinders,) + pose))
+    self.place_file.write(self.place % ((self.num_cylinders,) + pose + pose))
+    self.num_cylinders += 1
+    if self.index_file is not None:
+      self.centers_file.write(array('d', (pos_x, pos_y)).tobytes())
+      self.kinds_file.write(bytes([WALL if color == 'wall' else OBSTACLE]))
+
+  # writes the output file from the boilerplate and the two spooled sections
+  def _merge(self):
+    if self.compress:
+      out = gzip.open(self.filename, 'wt')
+    else:
+      out = open(self.filename, 'w')
+
+    with out:
+      out.write(boilerplate('world_boiler_start'))
+      self.define_file.seek(0)
+      shutil.copyfileobj(self.define_file, out)
+      out.write(boilerplate('world_boiler_mid'))
+      self.place_file.seek(0)
+      shutil.copyfileobj(self.place_file, out)
+      out.write(boilerplate('world_boiler_end'))
+
+  def get_shifts(self):
+    return self.r_shift, self.c_shift
+
+  # returns the Gazebo (x, y) of map cell (0, 0) (see field_origin)
+  def get_field_origin(self):
+    return field_origin(self.rows, self.cyl_radius, self.contain_wall_length)
+
+  # reads the spooled cylinder centers and kinds back into an ObstacleIndex
+  def _build_index(self):
+    self.centers_file.seek(0)
+    self.kinds_file.seek(0)
+    return ObstacleIndex(np.frombuffer(self.centers_file.read(), dtype=np.float64), self.cyl_radius,
+                         np.frombuffer(self.kinds_file.read(), dtype=np.uint8))
+
+  # returns the ObstacleIndex of the cylinders written; needs index_file, as the centers are only
+  # spooled then
+  def get_index(self):
+    if self.index is None:
+      raise Exception('StreamingWorldWriter only builds the obstacle index when index_file is given')
+    return self.index
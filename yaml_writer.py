@@ -1,13 +1,16 @@
+from map_export import yaml_text
+
+# class to write the map_server .yaml file of a world, pointing at its map_pgm_<iteration>.pgm
+# rows and cyl_radius set the resolution and origin (see map_export.py); the defaults are the
+# original 30 row map with 0.075 m cylinders
 class YamlWriter():
-  
-  def __init__(self, filename, iteration):
-    self.file = open(filename, "w")
-    self.iteration = iteration
-    self.yaml_temp ='image: map_pgm_%d.pgm\nresolution: 0.15\norigin: [-4.5, 0.0, 0]\noccupied_thresh: 0.50\nfree_thresh: 0.50\nnegate: 0'
 
-    
+  def __init__(self, filename, iteration, rows=30, cyl_radius=0.075):
+    self.filename = filename
+    self.iteration = iteration
+    self.rows = rows
+    self.cyl_radius = cyl_radius
 
   def write(self):
-    self.file.write(self.yaml_temp % self.iteration)
-  
-
+    with open(self.filename, "w") as f:
+      f.write(yaml_text('map_pgm_%d.pgm' % self.iteration, self.rows, self.cyl_radius))